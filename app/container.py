@@ -0,0 +1,209 @@
+from contextlib import asynccontextmanager
+from loguru import logger
+from pydantic import BaseModel, PositiveFloat
+import asyncio
+import threading
+import time
+import cv2
+import numpy as np
+from app.detectors.circle_detector import CircleDetector, CircleDetectorConfig
+from app.detectors.engine import DetectionEngine, DetectionEngineConfig
+from app.hub.capture_hub import CaptureHub
+from app.hub.mosaic import MosaicHub, MosaicConfig
+from app.models import SessionLocal, dispose_engine
+from app.observer.notifier import ConsoleNotifier
+from app.observer.observer import DispatchConfig
+from app.repository.dedup import DeduplicatingRepository, DedupConfig
+from app.repository.frame_archive import FrameArchive, FrameArchiveConfig
+from app.repository.movement_repository import InMemoryMovementRepository
+from app.repository.persistence_queue import WriteBehindRepository, PersistenceConfig
+from app.repository.sql_repository import SqlMovementRepository
+from app.utils.log_broadcaster import LogBroadcaster
+
+class StartupConfig(BaseModel):
+    """Запуск и остановка приложения"""
+    prewarm: bool = False  # Создать БД, пул детекции и прогреть cv2/HoughCircles при старте
+    budget_seconds: PositiveFloat = 2.0  # Допустимое время от импорта app.main до готовности
+    log_file: str = "movement_repository.log"
+    error_log_file: str = "app_errors.log"
+    log_history: int = 500  # Сообщений в истории /log_stream
+
+# Ресурсы в порядке остановки: сначала источники кадров, затем хранилища
+SHUTDOWN_ORDER = ["capture_hub", "detection_engine", "repository", "frame_archive"]
+
+# Контейнер ресурсов приложения: каждый ресурс создается при первом обращении
+class AppContainer:
+    def __init__(self, startup: StartupConfig = None, circle: CircleDetectorConfig = None,
+                 engine: DetectionEngineConfig = None, persistence: PersistenceConfig = None,
+                 dedup: DedupConfig = None, frame_archive: FrameArchiveConfig = None,
+                 mosaic: MosaicConfig = None, session_factory=SessionLocal):
+        self.startup_config = startup or StartupConfig()
+        self.circle_config = circle or CircleDetectorConfig()
+        self.engine_config = engine or DetectionEngineConfig()
+        self.persistence_config = persistence or PersistenceConfig()
+        self.dedup_config = dedup or DedupConfig()
+        self.frame_archive_config = frame_archive or FrameArchiveConfig()
+        self.mosaic_config = mosaic or MosaicConfig()
+        self.session_factory = session_factory
+        self.startup_seconds = None
+        self._resources = {}
+        self._closers = {}
+        self._log_handlers = []
+        self._lock = threading.RLock()
+        self._closed = False
+
+    def _get(self, name: str, factory, close=None):
+        if name in self._resources:
+            return self._resources[name]
+        with self._lock:
+            if name not in self._resources:
+                if self._closed:
+                    raise RuntimeError(f"Application is shut down, cannot start {name}")
+                started = time.perf_counter()
+                resource = factory()
+                self._resources[name] = resource
+                if close is not None and resource is not None:
+                    self._closers[name] = close
+                logger.info(f"Resource {name} started in {time.perf_counter() - started:.3f} s")
+            return self._resources[name]
+
+    def peek(self, name: str):
+        """Ресурс, если он уже создан (для метрик: обращение не запускает ресурс)"""
+        return self._resources.get(name)
+
+    @property
+    def frame_archive(self) -> FrameArchive:
+        return self._get("frame_archive", lambda: FrameArchive(self.frame_archive_config),
+                         lambda archive: archive.close())
+
+    def _create_repository(self):
+        storage = SqlMovementRepository(session_factory=self.session_factory, frame_archive=self.frame_archive)
+        # Запись кадров и изображений в БД выполняется фоновым потоком
+        self.write_behind = WriteBehindRepository(storage, self.persistence_config)
+        # Почти одинаковые обрезки одного объекта не сохраняются повторно
+        return DeduplicatingRepository(self.write_behind, self.dedup_config)
+
+    @property
+    def repository(self) -> DeduplicatingRepository:
+        # При остановке дописываются все принятые обнаружения (close закрывает и очередь записи)
+        return self._get("repository", self._create_repository, lambda repository: repository.close())
+
+    @property
+    def detection_engine(self):
+        # Пул процессов детекции (workers=0 - детекция в пуле потоков сервера, ресурс None)
+        return self._get(
+            "detection_engine",
+            lambda: DetectionEngine(self.engine_config, self.circle_config) if self.engine_config.workers else None,
+            lambda engine: engine.shutdown(),
+        )
+
+    @property
+    def capture_hub(self) -> CaptureHub:
+        # Хаб захвата: один видеопоток и один детектор на источник для всех зрителей
+        return self._get("capture_hub", lambda: CaptureHub(detector_factory=self.create_detector))
+
+    @property
+    def mosaic_hub(self) -> MosaicHub:
+        # Общие кадры-сетки нескольких источников для /mosaic_feed
+        return self._get("mosaic_hub", lambda: MosaicHub(self.capture_hub, self.mosaic_config))
+
+    @property
+    def log_broadcaster(self) -> LogBroadcaster:
+        def create():
+            broadcaster = LogBroadcaster(history_size=self.startup_config.log_history)
+            self._log_handlers.append(logger.add(broadcaster.sink, level="INFO"))
+            return broadcaster
+        return self._get("log_broadcaster", create)
+
+    def create_detector(self, stream_id):
+        # Детектор нового источника хаба с общим репозиторием
+        if self.detection_engine is not None:
+            detector = self.detection_engine.create_detector(stream_id, self.repository)
+        else:
+            detector = CircleDetector(repository=self.repository, config=self.circle_config, stream_id=stream_id)
+        # Уведомления доставляются через очередь наблюдателя и не задерживают детекцию
+        detector.attach(ConsoleNotifier(), DispatchConfig())
+        return detector
+
+    def configure_logging(self):
+        # Файловые журналы подключаются при старте приложения, а не при импорте
+        config = self.startup_config
+        self._log_handlers.append(
+            logger.add(config.log_file, rotation="1 MB", level="INFO", backtrace=True, diagnose=True))
+        self._log_handlers.append(logger.add(config.error_log_file, rotation="1 MB", level="ERROR"))
+
+    def prewarm(self):
+        """Создание БД и пула детекции, первый вызов HoughCircles до первого зрителя"""
+        self.repository.count()
+        self.detection_engine
+        frame = np.zeros((240, 320, 3), dtype=np.uint8)
+        cv2.circle(frame, (160, 120), 60, (255, 255, 255), 3)
+        detector = CircleDetector(repository=InMemoryMovementRepository(), config=self.circle_config)
+        detector.detect_circles(frame)
+
+    async def start(self, import_started: float = None):
+        started = time.perf_counter()
+        self.configure_logging()
+        self.log_broadcaster
+        if self.startup_config.prewarm:
+            await asyncio.to_thread(self.prewarm)
+        self.startup_seconds = time.perf_counter() - (import_started or started)
+        message = f"Application started in {self.startup_seconds:.3f} s"
+        if self.startup_seconds > self.startup_config.budget_seconds:
+            logger.warning(f"{message}, budget {self.startup_config.budget_seconds} s exceeded")
+        else:
+            logger.info(message)
+
+    async def aclose(self):
+        # Мозаики держат подписки на источники, поэтому останавливаются первыми
+        for name in ("mosaic_hub", "capture_hub"):
+            hub = self.peek(name)
+            if hub is not None:
+                await hub.close()
+        await asyncio.to_thread(self.close)
+
+    def close(self):
+        """Остановка созданных ресурсов; повторный вызов ничего не делает"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for name in SHUTDOWN_ORDER:
+            close = self._closers.get(name)
+            if close is not None:
+                try:
+                    close(self._resources[name])
+                except Exception as e:
+                    logger.error(f"Error stopping {name}: {e}")
+        if "repository" in self._resources and self.session_factory is SessionLocal:
+            dispose_engine()
+        logger.info("Application resources stopped")
+        for handler_id in self._log_handlers:
+            logger.remove(handler_id)
+        self._log_handlers = []
+
+    def lifespan(self, import_started: float = None):
+        """Lifespan для FastAPI: запуск при старте сервера, остановка при завершении"""
+        @asynccontextmanager
+        async def lifespan(app):
+            await self.start(import_started)
+            try:
+                yield
+            finally:
+                await self.aclose()
+        return lifespan
+
+"""
+AppContainer заменяет глобальные объекты, которые app.main создавал
+при импорте.
+- Импорт модуля не открывает БД, не создает каталоги и журналы:
+репозиторий (SQLite, очередь записи, дедупликация), архив кадров,
+пул процессов детекции и хаб захвата создаются при первом обращении.
+- Lifespan FastAPI подключает журналы и рассылку логов, при
+prewarm=True заранее создает БД и пул детекции и выполняет первый вызов
+HoughCircles. Время от импорта до готовности сравнивается с
+budget_seconds.
+- При завершении ресурсы останавливаются по порядку: мозаики, источники
+кадров, пул детекции, репозиторий (все принятые обнаружения
+дописываются), архив кадров, рассылка и журналы.
+"""
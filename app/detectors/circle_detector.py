@@ -1,8 +1,12 @@
 from app.repository.movement_repository import MovementRepository, Movement
 from datetime import datetime
-from app.observer.observer import Subject
+from app.observer.observer import Subject, DetectionEvent
+from app.detectors.motion_filter import MotionFilter
+from app.detectors.tracker import CircleTracker
+from app.utils.metrics import stream_label, DETECTIONS, SAVES
 from loguru import logger
-from pydantic import BaseModel, PositiveInt, PositiveFloat, NonNegativeFloat
+from pydantic import BaseModel, Field, PositiveInt, PositiveFloat, NonNegativeFloat, NonNegativeInt
+from typing import Optional
 import cv2
 import numpy as np
 import pytz
@@ -19,6 +23,19 @@ def sharpen_image(image):
        sharpened = cv2.filter2D(image, -1, kernel)
        return sharpened
 
+# Подготовка серого кадра для HoughCircles: уменьшение до scale и медианный фильтр
+def preprocess_gray(gray, scale=1.0):
+    if scale >= 1:
+        return cv2.medianBlur(gray, 5)
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.medianBlur(small, 5 if scale >= 0.75 else 3)
+
+# Отрисовка найденных кругов и их центров на кадре
+def draw_circles(frame, circles):
+    for (x, y, radius) in np.uint16(np.around(circles[0, :])):
+        cv2.circle(frame, (x, y), radius, (0, 255, 0), 2)  
+        cv2.circle(frame, (x, y), 2, (0, 0, 255), 3)       
+
 # Создаем Pydantic модель для валидации конфигурации
 class CircleDetectorConfig(BaseModel):
     """Конфигурация детектора кругов с валидацией"""
@@ -30,11 +47,31 @@ class CircleDetectorConfig(BaseModel):
     max_radius: PositiveInt = 10000
     min_delay: NonNegativeFloat = 0
     save_delay: NonNegativeFloat = 2    
+    # Масштаб кадра для поиска кругов (1.0 - полное разрешение)
+    detection_scale: float = Field(default=1.0, gt=0, le=1)
+    # Порог HoughCircles на уменьшенном кадре (None - param2). Число голосов
+    # зависит от масштаба, поэтому порог подбирается по bench_detection
+    detection_param2: Optional[PositiveInt] = None
+    # Уточнение найденных кругов в полном разрешении внутри небольших ROI
+    refine: bool = False
+    # Фильтр движения: HoughCircles запускается только при изменениях в кадре
+    motion_filter: bool = False
+    motion_threshold: float = Field(default=0.01, ge=0, le=1)
+    motion_pixel_threshold: PositiveInt = 25
+    motion_scan_interval: NonNegativeFloat = 5
+    # Сопровождение: поиск только рядом с прогнозом положения найденного круга
+    tracking: bool = False
+    track_radius_margin: float = Field(default=0.2, gt=0, lt=1)
+    track_max_misses: NonNegativeInt = 3
+    track_rescan_interval: NonNegativeFloat = 2
     
 class CircleDetector(Subject):
-    def __init__(self, repository: MovementRepository, config: CircleDetectorConfig):
+    def __init__(self, repository: MovementRepository, config: CircleDetectorConfig = None,
+                 stream_id=None):
         super().__init__()
+        config = config or CircleDetectorConfig()
         self.config = config
+        self.stream_id = stream_id  # Источник кадров, передается в DetectionEvent
 
         # Инициализация параметров из валидированного конфига
         self.dp = config.dp  # Разрешение активации в пространстве параметров
@@ -52,34 +89,168 @@ class CircleDetector(Subject):
         self.save_delay = config.save_delay    
         self.last_save_time = 0  # Время последнего сохранения
         self.is_saving = False  # Флаг для отслеживания процесса сохранения
+        self.detection_scale = config.detection_scale
+        self.refine = config.refine
+        self.last_circles = None  # Результат поиска на предыдущем кадре
+        self.drawn_circles = None
+        self.motion_filter = None
+        if config.motion_filter:
+            self.motion_filter = MotionFilter(
+                pixel_threshold=config.motion_pixel_threshold,
+                min_changed=config.motion_threshold,
+                scan_interval=config.motion_scan_interval
+            )
+        self.tracker = None
+        self.last_object_ids = []  # Идентификаторы треков для кругов последнего кадра
+        self.last_rescan_time = 0
+        if config.tracking:
+            self.tracker = CircleTracker(max_misses=config.track_max_misses)
 
-    def process_frame(self, frame):
-        #logging.debug("Processing frame")
-        current_time = time.time()  # Получаем текущее время
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.medianBlur(gray, 5) 
-        circles = cv2.HoughCircles(
+    def _threshold(self, scale=1.0):
+        # Число голосов аккумулятора меняется с масштабом не пропорционально:
+        # уменьшение сглаживает шум и границы, поэтому порог для уменьшенного
+        # кадра задается отдельно (detection_param2), а не пересчитывается
+        if scale >= 1 or self.config.detection_param2 is None:
+            return self.param2
+        return self.config.detection_param2
+
+    def _hough(self, gray, scale=1.0):
+        # Параметры в пикселях масштабируются вместе с кадром
+        return cv2.HoughCircles(
             gray,
             cv2.HOUGH_GRADIENT,
             dp=self.dp,
-            minDist=self.min_dist,
+            minDist=max(1.0, self.min_dist * scale),
+            param1=self.param1,
+            param2=self._threshold(scale),
+            minRadius=max(1, round(self.min_radius * scale)),
+            maxRadius=max(2, round(self.max_radius * scale))
+        )
+
+    def _search_roi(self, image, x, y, radius, margin=0.15, scale=1.0):
+        # Поиск одного круга в окрестности (x, y) с суженным диапазоном радиусов
+        pad = int(radius * (1 + margin)) + 4
+        x_start, y_start = max(0, int(x) - pad), max(0, int(y) - pad)
+        roi = image[y_start:max(0, int(y) + pad), x_start:max(0, int(x) + pad)]
+        if roi.size == 0:
+            return None
+        if roi.ndim == 3:
+            roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        if scale < 1:
+            roi = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        roi = cv2.medianBlur(roi, 5 if scale >= 0.75 else 3)
+        found = cv2.HoughCircles(
+            roi,
+            cv2.HOUGH_GRADIENT,
+            dp=self.dp,
+            minDist=max(roi.shape),
             param1=self.param1,
-            param2=self.param2,
-            minRadius=self.min_radius,
-            maxRadius=self.max_radius
+            param2=self._threshold(scale),
+            minRadius=max(1, int(radius * (1 - margin) * scale)),
+            maxRadius=int(radius * (1 + margin) * scale) + 1
         )
+        if found is None:
+            return None
+        rx, ry, rr = found[0, 0] / scale
+        return rx + x_start, ry + y_start, rr
+
+    def find_circles(self, prepared, scale=1.0):
+        """Поиск на кадре из preprocess_gray; результат в координатах исходного кадра"""
+        circles = self._hough(prepared, scale)
+        if circles is None or scale >= 1:
+            return circles
+        return (circles / scale).astype(np.float32)
+
+    def detect_circles(self, frame):
+        """Поиск кругов; результат в координатах исходного кадра (как у HoughCircles)"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        scale = self.detection_scale
+        # На уменьшенном кадре аккумулятор Hough меньше в 1/scale^2 раз
+        circles = self.find_circles(preprocess_gray(gray, scale), scale)
+        if circles is None or scale >= 1:
+            return circles
+        if self.refine:
+            for candidate in circles[0]:
+                refined = self._search_roi(gray, *candidate)
+                if refined is not None:
+                    candidate[:] = refined
+        return circles
+
+    def _gated_detect(self, frame, current_time):
+        if self.motion_filter is None:
+            return self.detect_circles(frame)
+        changed, region = self.motion_filter.check(frame, current_time)
+        # Пока объект в кадре, ищем круги на каждом кадре (нужно для save_delay)
+        if self.last_circles is not None:
+            return self.detect_circles(frame)
+        if not changed:
+            return None
+        if region is None:
+            return self.detect_circles(frame)
+        x0, y0, x1, y1 = region
+        circles = self.detect_circles(frame[y0:y1, x0:x1])
+        if circles is not None:
+            circles[..., 0] += x0
+            circles[..., 1] += y0
+        return circles
+
+    def _tracked_detect(self, frame, current_time):
+        # Полный поиск, если треков нет или пора искать новые объекты
+        if not self.tracker.tracks or current_time - self.last_rescan_time >= self.config.track_rescan_interval:
+            self.last_rescan_time = current_time
+            circles = self._gated_detect(frame, current_time)
+            self.last_object_ids = self.tracker.update(
+                None if circles is None else circles[0], current_time
+            )
+            return circles
+
+        found, ids = [], []
+        for track in list(self.tracker.tracks):
+            x, y = track.predict(current_time)
+            circle = self._search_roi(
+                frame, x, y, track.radius,
+                margin=self.config.track_radius_margin, scale=self.detection_scale
+            )
+            if circle is None:
+                self.tracker.miss(track)
+                continue
+            track.update(*circle, current_time)
+            found.append(circle)
+            ids.append(track.track_id)
+        self.last_object_ids = ids
+        if not found:
+            return None
+        return np.array([found], dtype=np.float32)
+
+    def process_frame(self, frame):
+        #logging.debug("Processing frame")
+        current_time = time.time()  # Получаем текущее время
+        if self.tracker is None:
+            circles = self._gated_detect(frame, current_time)
+        else:
+            circles = self._tracked_detect(frame, current_time)
+        self.last_circles = circles if circles is not None and len(circles[0]) > 0 else None
+        self.drawn_circles = None  # Круги, нарисованные на этом кадре
 
         if circles is not None and len(circles[0]) > 0:                        
             #logging.debug(f"Circles detected: {circles}")
             if (current_time - self.last_detection_time) >= self.min_delay:
-                for (x, y, radius) in np.uint16(np.around(circles[0, :])):
-                    cv2.circle(frame, (x, y), radius, (0, 255, 0), 2)  
-                    cv2.circle(frame, (x, y), 2, (0, 0, 255), 3)       
+                draw_circles(frame, circles)
+                self.drawn_circles = circles
+                # Для обрезки берем последний круг (int, чтобы не было переполнения uint16)
+                x, y, radius = (int(v) for v in np.around(circles[0, -1]))
                 message = "Circle detected in frame"                
-                self.notify(message)
+                event = DetectionEvent(
+                    message, timestamp=datetime.now(moscow_tz), circles=circles[0],
+                    stream_id=self.stream_id, object_ids=self.last_object_ids
+                )
+                self.notify(event)
+                DETECTIONS.inc(stream=stream_label(self.stream_id))
                 movement = Movement(
-                    timestamp=datetime.now(moscow_tz), 
-                    description=message
+                    timestamp=event.timestamp, 
+                    description=message,
+                    object_id=self.last_object_ids[-1] if self.last_object_ids else None,
+                    stream_id=self.stream_id
                 )   
                 logger.info(f"Circles detected: {circles}")             
 
@@ -105,11 +276,16 @@ class CircleDetector(Subject):
                     self.repository.add_movement(movement)
                     self.repository.save_frame(movement)
                     self.repository.save_image_to_db(movement)
+                    SAVES.inc(stream=stream_label(self.stream_id))
                     self.is_saving = False  # Завершаем процесс сохранения
                     self.last_detection_time = current_time
             
         return frame
 
+    def close(self):
+        # Освобождение ресурсов детектора (переопределяется у удаленных детекторов)
+        self.close_observers()
+
 '''
 Класс CircleDetector:
 
@@ -127,6 +303,28 @@ class CircleDetector(Subject):
    кругов для обнаружения (min_radius=70 - детектирует круг 0,15м на расстоянии 1,3м).
    - min_delay: минимальная задержка между детектированиями в секундах.
    - save_delay: задержка перед сохранением кадра для стабилизации изображения
+   - detection_scale: масштаб кадра для поиска кругов. При значении 
+   меньше 1 HoughCircles работает на уменьшенном кадре, а найденные 
+   круги пересчитываются в координаты исходного кадра. Пиксельные 
+   параметры (min_dist, радиусы) масштабируются автоматически, порог 
+   param2 - нет: на уменьшенном кадре голосов за тот же круг может быть 
+   больше (шум сглажен), поэтому набор найденных кругов зависит от 
+   масштаба. Порог для уменьшенного кадра задается detection_param2 
+   и подбирается с помощью app.tools.bench_detection.
+   - refine: уточнение найденных кругов в полном разрешении внутри 
+   небольших областей вокруг каждого кандидата.
+   - motion_filter: включает MotionFilter перед HoughCircles. Поиск 
+   выполняется только на кадрах (и в областях), где доля изменившихся 
+   пикселей не меньше motion_threshold (изменение яркости больше 
+   motion_pixel_threshold), а также раз в motion_scan_interval секунд. 
+   Пока круг в кадре, поиск идет на каждом кадре.
+   - tracking: режим сопровождения. После обнаружения круга 
+   CircleTracker прогнозирует его положение, и HoughCircles запускается 
+   только в окрестности прогноза с диапазоном радиусов 
+   ±track_radius_margin. Трек теряется после track_max_misses промахов, 
+   тогда выполняется полный поиск; раз в track_rescan_interval секунд 
+   полный поиск ищет новые объекты. Идентификатор трека сохраняется 
+   в Movement.object_id.
 
 
 2. Медианный фильтр:
@@ -141,7 +339,9 @@ class CircleDetector(Subject):
 
 4. Уведомление:
    - Если хотя бы один круг был обнаружен, вызывается метод 
-   notify, чтобы уведомить наблюдателей о данном событии.
+   notify, чтобы уведомить наблюдателей о данном событии. 
+   Наблюдатели получают DetectionEvent: время, круги (x, y, радиус), 
+   идентификатор потока и треков; str(event) - текст сообщения.
 
 Класс CircleDetector обнаруживает круги 
 в кадрах видео с использованием методов 
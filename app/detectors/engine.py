@@ -0,0 +1,376 @@
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Literal
+from loguru import logger
+from pydantic import BaseModel, NonNegativeInt, PositiveInt, PositiveFloat
+import multiprocessing
+import queue
+import threading
+import itertools
+from app.detectors.circle_detector import CircleDetector, CircleDetectorConfig, draw_circles
+from app.detectors.frame_pool import SharedFramePool, FrameHandle
+from app.observer.observer import Subject, Observer
+from app.repository.movement_repository import MovementRepository, Movement
+from app.utils.metrics import stream_label, DETECTIONS, SAVES
+
+class DetectionEngineConfig(BaseModel):
+    """Конфигурация пула процессов детекции"""
+    workers: NonNegativeInt = 0  # 0 - детекция в процессе сервера (пул потоков)
+    max_pending: PositiveInt = 2  # Кадров в обработке на один процесс
+    overflow: Literal["block", "drop"] = "block"  # Поведение при отставании процессов
+    result_timeout: PositiveFloat = 10  # Ожидание результата и свободного слота процесса
+    shared_memory: bool = True  # Передача кадров через SharedFramePool вместо pickle
+    watchdog_interval: PositiveFloat = 1  # Период проверки, что процесс-обработчик жив
+    join_timeout: PositiveFloat = 5  # Ожидание завершения процесса при остановке
+
+# Процесс-обработчик завершился или остановлен, не вернув результат
+class WorkerLostError(RuntimeError):
+    pass
+
+# Результат обработки кадра в процессе-обработчике
+class DetectionResult:
+    def __init__(self, circles=None, movements=None, messages=None, error=None):
+        self.circles = circles  # Круги для отрисовки (как у HoughCircles) или None
+        self.movements = movements or []  # Движения для сохранения в репозитории
+        self.messages = messages or []  # DetectionEvent для наблюдателей
+        self.error = error
+
+# Репозиторий процесса-обработчика: только собирает движения для передачи серверу
+class CollectingRepository(MovementRepository):
+    def __init__(self):
+        self.movements = []
+
+    def add_movement(self, movement: Movement):
+        self.movements.append(movement)
+
+    def get_movements(self):
+        return self.movements
+
+    def save_frame(self, movement: Movement):
+        pass
+
+    def save_image_to_db(self, movement: Movement):
+        pass
+
+class CollectingObserver(Observer):
+    def __init__(self):
+        self.messages = []
+
+    def update(self, message: str):
+        self.messages.append(message)
+
+def _attach_pool(pools, stream_id, handle: FrameHandle, slots: int):
+    # Сегмент потока подключается один раз; при смене размера кадра - заново
+    pool = pools.get(stream_id)
+    if pool is None or pool.name != handle.name:
+        if pool is not None:
+            pool.close()
+        pool = pools[stream_id] = SharedFramePool.attach(handle, slots)
+    return pool
+
+def _worker_main(tasks, results, config_data, pool_slots):
+    # Детекторы процесса по идентификатору потока: состояние (треки, фон) между кадрами
+    config = CircleDetectorConfig(**config_data)
+    detectors = {}
+    pools = {}  # stream_id -> SharedFramePool
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        command, stream_id, task_id, frame = task
+        if command == "close":
+            detectors.pop(stream_id, None)
+            pool = pools.pop(stream_id, None)
+            if pool is not None:
+                pool.close()
+            continue
+        try:
+            if isinstance(frame, FrameHandle):
+                # Кадр читается из общей памяти без копирования
+                frame = _attach_pool(pools, stream_id, frame, pool_slots).view(frame)
+            if stream_id not in detectors:
+                detector = CircleDetector(
+                    repository=CollectingRepository(), config=config, stream_id=stream_id
+                )
+                detector.attach(CollectingObserver())
+                detectors[stream_id] = detector
+            detector = detectors[stream_id]
+            detector.process_frame(frame)
+            observer = detector._observers[0]
+            result = DetectionResult(
+                circles=detector.drawn_circles,
+                movements=detector.repository.movements,
+                messages=observer.messages
+            )
+            detector.repository.movements = []
+            observer.messages = []
+        except Exception as e:
+            result = DetectionResult(error=str(e))
+        frame = None  # Ссылка на слот не должна пережить задачу
+        results.put((task_id, result))
+    for pool in pools.values():
+        pool.close()
+
+# Процесс-обработчик и очереди для обмена с ним
+class DetectionWorker:
+    def __init__(self, context, index, config: CircleDetectorConfig, max_pending: int,
+                 watchdog_interval: float = 1):
+        self.index = index
+        self.context = context
+        self.config_data = config.model_dump()
+        self.watchdog_interval = watchdog_interval
+        self.pending = {}  # task_id -> Future
+        self.lock = threading.Lock()  # Очереди и pending меняются при перезапуске процесса
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.streams = 0  # Число закрепленных потоков
+        self.pool_slots = max_pending + 1  # Слотов SharedFramePool на поток
+        self.restarts = 0
+        self.stopping = False
+        self._start_process()
+        self.reader = threading.Thread(target=self._read_results, daemon=True)
+        self.reader.start()
+
+    def _start_process(self):
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+        self.process = self.context.Process(
+            target=_worker_main, args=(self.tasks, self.results, self.config_data, self.pool_slots),
+            daemon=True, name=f"detection-worker-{self.index}"
+        )
+        self.process.start()
+
+    def submit(self, task_id, stream_id, frame) -> Future:
+        # Слот уже занят вызывающим
+        future = Future()
+        with self.lock:
+            if self.stopping:
+                self.slots.release()
+                future.set_exception(WorkerLostError("Detection engine is stopped"))
+                return future
+            self.pending[task_id] = future
+            self.tasks.put(("process", stream_id, task_id, frame))
+        return future
+
+    def _complete(self, task_id, result):
+        with self.lock:
+            future = self.pending.pop(task_id, None)
+        if future is not None:
+            # Слот освобождается только для задачи, которая еще ожидает результат
+            self.slots.release()
+            future.set_result(result)
+
+    def fail_pending(self, reason: str):
+        """Ошибка всем ожидающим задачам и освобождение их слотов"""
+        with self.lock:
+            futures, self.pending = list(self.pending.values()), {}
+        self._fail(futures, reason)
+
+    def _fail(self, futures, reason: str):
+        for future in futures:
+            self.slots.release()
+            future.set_exception(WorkerLostError(reason))
+
+    def _read_results(self):
+        while True:
+            try:
+                item = self.results.get(timeout=self.watchdog_interval)
+            except queue.Empty:
+                if not self.stopping and not self.process.is_alive():
+                    self._restart()
+                continue
+            except (EOFError, OSError):
+                if self.stopping:
+                    break
+                self._restart()
+                continue
+            if item is None:
+                break
+            self._complete(*item)
+
+    def _restart(self):
+        # Процесс завершился: задачи в нем потеряны, детекторы потоков создаются заново
+        exitcode = self.process.exitcode
+        while True:
+            try:
+                item = self.results.get_nowait()  # Результаты, отправленные до завершения
+            except (queue.Empty, EOFError, OSError):
+                break
+            if item is not None:
+                self._complete(*item)
+        with self.lock:
+            old_tasks, old_results = self.tasks, self.results
+            futures, self.pending = list(self.pending.values()), {}
+            self._start_process()
+            self.restarts += 1
+        self._fail(futures, f"Detection worker {self.index} exited with code {exitcode}")
+        for channel in (old_tasks, old_results):
+            channel.cancel_join_thread()
+            channel.close()
+        logger.error(f"Detection worker {self.index} exited with code {exitcode}, restarted")
+
+    def kill(self):
+        """Остановка зависшего процесса; поток чтения результатов перезапустит его"""
+        if self.process.is_alive():
+            self.process.kill()
+
+    def stop(self, timeout: float):
+        with self.lock:
+            self.stopping = True
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            logger.warning(f"Detection worker {self.index} did not stop in {timeout} s, terminating")
+            self.process.terminate()
+            self.process.join(timeout=1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.fail_pending("Detection engine is stopped")
+        self.results.put(None)
+        self.reader.join(timeout=timeout)
+
+# Движок детекции: пул процессов, поток закреплен за одним процессом
+class DetectionEngine:
+    def __init__(self, config: DetectionEngineConfig, detector_config: CircleDetectorConfig):
+        self.config = config
+        context = multiprocessing.get_context("spawn")
+        self.workers = [
+            DetectionWorker(context, index, detector_config, config.max_pending, config.watchdog_interval)
+            for index in range(config.workers)
+        ]
+        self._task_ids = itertools.count()
+        self.dropped_frames = 0
+        logger.info(f"Detection engine started with {config.workers} workers")
+
+    def create_detector(self, stream_id, repository: MovementRepository) -> "EngineDetector":
+        # Закрепляем поток за наименее загруженным процессом
+        worker = min(self.workers, key=lambda w: w.streams)
+        worker.streams += 1
+        return EngineDetector(self, worker, stream_id, repository)
+
+    def submit(self, worker: DetectionWorker, stream_id, frame):
+        """Future с DetectionResult или None, если кадр отброшен из-за отставания;
+        frame - массив или FrameHandle"""
+        if self.config.overflow == "drop":
+            if not worker.slots.acquire(blocking=False):
+                self.dropped_frames += 1
+                return None
+        elif not worker.slots.acquire(timeout=self.config.result_timeout):
+            # Процесс не возвращает результаты: захват не ждет бесконечно
+            self.dropped_frames += 1
+            logger.warning(f"Detection worker {worker.index} is not responding, frame skipped")
+            return None
+        return worker.submit(next(self._task_ids), stream_id, frame)
+
+    def release(self, worker: DetectionWorker, stream_id):
+        worker.streams -= 1
+        worker.tasks.put(("close", stream_id, None, None))
+
+    def shutdown(self):
+        for worker in self.workers:
+            with worker.lock:
+                worker.stopping = True
+                worker.tasks.put(None)
+        # Процессы, не завершившиеся за join_timeout, останавливаются принудительно
+        for worker in self.workers:
+            worker.stop(self.config.join_timeout)
+        logger.info("Detection engine stopped")
+
+# Детектор на стороне сервера: кадры обрабатываются в процессе движка
+class EngineDetector(Subject):
+    def __init__(self, engine: DetectionEngine, worker: DetectionWorker, stream_id,
+                 repository: MovementRepository):
+        super().__init__()
+        self.engine = engine
+        self.worker = worker
+        self.stream_id = stream_id
+        self.repository = repository
+        self.pool = None  # SharedFramePool потока, создается по размеру первого кадра
+        self.drawn_circles = None  # Круги, нарисованные на последнем кадре (как у CircleDetector)
+
+    def _share(self, frame):
+        # Кадр копируется в слот общей памяти; если слотов нет - передается как есть
+        if not self.engine.config.shared_memory:
+            return frame
+        if self.pool is None or not self.pool.matches(frame):
+            if self.pool is not None:
+                self.pool.close()
+            self.pool = SharedFramePool(frame.shape, frame.dtype, self.worker.pool_slots)
+        handle = self.pool.put(frame)
+        return frame if handle is None else handle
+
+    def process_frame(self, frame):
+        payload = self._share(frame)
+        future = self.engine.submit(self.worker, self.stream_id, payload)
+        if isinstance(payload, FrameHandle):
+            # Слот освобождается, когда процесс вернул результат (или кадр отброшен)
+            if future is None:
+                self.pool.release(payload)
+            else:
+                pool = self.pool
+                future.add_done_callback(lambda _: pool.release(payload))
+        if future is None:
+            self.drawn_circles = None
+            return frame  # Кадр показывается без детекции
+        try:
+            result = future.result(timeout=self.engine.config.result_timeout)
+        except FutureTimeoutError:
+            # Процесс завис: он перезапускается, источник продолжает работу
+            logger.error(f"Detection worker {self.worker.index} did not respond in "
+                         f"{self.engine.config.result_timeout} s, restarting")
+            self.worker.kill()
+            return self._skip(frame)
+        except WorkerLostError as e:
+            logger.warning(f"Frame skipped: {e}")
+            return self._skip(frame)
+        if result.error is not None:
+            raise RuntimeError(f"Detection worker error: {result.error}")
+        self.drawn_circles = result.circles
+        if result.circles is not None:
+            draw_circles(frame, result.circles)
+        # Метрики процессов движка не видны серверу, поэтому считаем по результату
+        label = stream_label(self.stream_id)
+        for message in result.messages:
+            self.notify(message)
+            DETECTIONS.inc(stream=label)
+        for movement in result.movements:
+            self.repository.add_movement(movement)
+            self.repository.save_frame(movement)
+            self.repository.save_image_to_db(movement)
+            SAVES.inc(stream=label)
+        return frame
+
+    def _skip(self, frame):
+        self.engine.dropped_frames += 1
+        self.drawn_circles = None
+        return frame
+
+    def close(self):
+        self.engine.release(self.worker, self.stream_id)
+        self.close_observers()
+        if self.pool is not None:
+            # Процесс мог еще не отключиться: после unlink его отображение остается действительным
+            self.pool.close()
+            self.pool = None
+
+"""
+DetectionEngine выносит CircleDetector в пул процессов, чтобы детекция
+на многих камерах не упиралась в GIL одного процесса uvicorn.
+- Каждый поток закрепляется за одним процессом, поэтому состояние
+детектора (фоновая модель, треки, задержки сохранения) сохраняется.
+- Процесс возвращает не кадр, а круги для отрисовки, уведомления
+и движения с обрезанными кадрами; отрисовка, уведомление наблюдателей
+и сохранение в репозиторий выполняются на стороне сервера.
+- Не более max_pending кадров в обработке на процесс: при отставании
+процессов захват ждет (block) или кадр показывается без детекции (drop).
+При workers=0 детекция выполняется как раньше, в пуле потоков.
+- Поток чтения результатов раз в watchdog_interval проверяет, что
+процесс жив. Если процесс завершился, ожидающие кадры получают
+WorkerLostError, их слоты освобождаются, а процесс запускается заново
+с теми же закрепленными потоками. Процесс, не ответивший за
+result_timeout, останавливается и перезапускается; кадр показывается
+без детекции, источник продолжает работу.
+- shutdown() принудительно останавливает процессы, которые не
+завершились за join_timeout, и завершает ожидающие задачи ошибкой.
+- При shared_memory=True кадр один раз копируется в SharedFramePool
+потока, а в процесс передается FrameHandle: кадр не сериализуется
+через pickle и не копируется в канал между процессами.
+"""
@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+
+# Дешевый фильтр движения: фоновая модель по скользящему среднему на маленьком кадре
+class MotionFilter:
+    def __init__(self, width: int = 160, alpha: float = 0.05, pixel_threshold: int = 25,
+                 min_changed: float = 0.01, scan_interval: float = 5.0, padding: float = 0.1):
+        self.width = width
+        self.alpha = alpha  # Скорость обновления фона
+        self.pixel_threshold = pixel_threshold  # Порог изменения яркости пикселя
+        self.min_changed = min_changed  # Минимальная доля изменившихся пикселей
+        self.scan_interval = scan_interval  # Период принудительного полного поиска, сек
+        self.padding = padding  # Расширение области изменений (доля кадра)
+        self.background = None
+        self.last_full_scan = 0
+        self.frames_checked = 0
+        self.frames_skipped = 0
+
+    def check(self, frame, now: float):
+        """Возвращает (есть изменения, область (x0, y0, x1, y1) или None для всего кадра)"""
+        self.frames_checked += 1
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.width / width)
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+
+        if self.background is None:
+            self.background = small.astype(np.float32)
+            self.last_full_scan = now
+            return True, None
+
+        diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+        mask = diff > self.pixel_threshold
+        cv2.accumulateWeighted(small, self.background, self.alpha)
+
+        if now - self.last_full_scan >= self.scan_interval:
+            self.last_full_scan = now
+            return True, None
+        if mask.mean() < self.min_changed:
+            self.frames_skipped += 1
+            return False, None
+
+        # Ограничивающий прямоугольник изменений в координатах исходного кадра
+        ys, xs = np.nonzero(mask)
+        pad_x, pad_y = int(self.padding * width), int(self.padding * height)
+        x0 = max(0, int(xs.min() / scale) - pad_x)
+        y0 = max(0, int(ys.min() / scale) - pad_y)
+        x1 = min(width, int((xs.max() + 1) / scale) + pad_x)
+        y1 = min(height, int((ys.max() + 1) / scale) + pad_y)
+        return True, (x0, y0, x1, y1)
+
+"""
+MotionFilter отсекает кадры без изменений до запуска HoughCircles.
+Кадр уменьшается до ширины width, сравнивается с фоновой моделью
+(скользящее среднее, cv2.accumulateWeighted), и если доля изменившихся
+пикселей меньше min_changed, поиск кругов пропускается. Раз в
+scan_interval секунд выполняется принудительный полный поиск, а при
+изменениях возвращается область, в которой их обнаружили.
+"""
@@ -0,0 +1,75 @@
+import numpy as np
+
+# Состояние одного отслеживаемого круга
+class CircleTrack:
+    def __init__(self, track_id: int, x: float, y: float, radius: float, now: float):
+        self.track_id = track_id
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.vx = 0.0  # Скорость центра, пикс/с
+        self.vy = 0.0
+        self.last_seen = now
+        self.misses = 0  # Кадры подряд без обнаружения
+
+    def predict(self, now: float):
+        dt = now - self.last_seen
+        return self.x + self.vx * dt, self.y + self.vy * dt
+
+    def update(self, x: float, y: float, radius: float, now: float, smoothing: float = 0.5):
+        dt = now - self.last_seen
+        if dt > 0:
+            # Сглаживание скорости, чтобы шум детекции не раскачивал прогноз
+            self.vx = smoothing * self.vx + (1 - smoothing) * (x - self.x) / dt
+            self.vy = smoothing * self.vy + (1 - smoothing) * (y - self.y) / dt
+        self.x, self.y, self.radius = x, y, radius
+        self.last_seen = now
+        self.misses = 0
+
+# Сопровождение кругов между кадрами со стабильными идентификаторами
+class CircleTracker:
+    def __init__(self, max_misses: int = 3):
+        self.max_misses = max_misses
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, circles, now: float, tracks=None):
+        """Сопоставление найденных кругов с треками; возвращает id для каждого круга"""
+        tracks = list(self.tracks if tracks is None else tracks)
+        ids = []
+        for x, y, radius in ([] if circles is None else np.asarray(circles).reshape(-1, 3)):
+            track = self._nearest(tracks, x, y, now)
+            if track is None:
+                track = CircleTrack(self._next_id, x, y, radius, now)
+                self._next_id += 1
+                self.tracks.append(track)
+            else:
+                tracks.remove(track)
+                track.update(x, y, radius, now)
+            ids.append(track.track_id)
+        for track in tracks:
+            self.miss(track)
+        return ids
+
+    def miss(self, track: CircleTrack):
+        track.misses += 1
+        if track.misses > self.max_misses:
+            self.tracks.remove(track)
+
+    @staticmethod
+    def _nearest(tracks, x, y, now):
+        best, best_distance = None, None
+        for track in tracks:
+            px, py = track.predict(now)
+            distance = np.hypot(x - px, y - py)
+            if distance <= track.radius and (best is None or distance < best_distance):
+                best, best_distance = track, distance
+        return best
+
+"""
+CircleTracker хранит состояние найденных кругов (центр, радиус,
+скорость) и прогнозирует их положение на следующем кадре. Найденный
+круг сопоставляется с ближайшим треком в пределах его радиуса, иначе
+создается новый трек с новым идентификатором. Трек удаляется после
+max_misses кадров подряд без обнаружения.
+"""
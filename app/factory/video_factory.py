@@ -13,7 +13,7 @@ class WebcamHandler(VideoStreamHandler):
         self.source = source
 
     def get_stream(self):
-        return VideoStream(self.source)
+        return VideoStream(self.source, threaded=True)
 
 # Обработчик RTSP-потока
 class RTSPHandler(VideoStreamHandler):
@@ -21,7 +21,7 @@ class RTSPHandler(VideoStreamHandler):
         self.url = url
 
     def get_stream(self):
-        return VideoStream(self.url)
+        return VideoStream(self.url, threaded=True)
 
 # Фабрика для создания обработчиков видеопотока
 class VideoStreamHandlerFactory:
@@ -39,5 +39,7 @@ class VideoStreamHandlerFactory:
 """
 Factory Pattern используется для создания различных обработчиков 
 видеопотока без изменения клиентского кода.
+Потоки открываются в режиме фонового захвата (threaded=True):
+детектор всегда получает самый свежий кадр, а устаревшие отбрасываются.
 """
 
@@ -0,0 +1 @@
+#__init__.py
\ No newline at end of file
@@ -0,0 +1,230 @@
+import asyncio
+import time
+import cv2
+from loguru import logger
+from app.factory.video_factory import VideoStreamHandlerFactory
+from app.hub.frame_cache import EncodedFrameCache, DEFAULT_JPEG_QUALITY
+from app.hub.flow_control import FlowController, AdaptiveStreamConfig
+from app.video import VideoStream
+from app.utils.metrics import (
+    stream_label, GRAB_SECONDS, DETECT_SECONDS, SEND_SECONDS, FRAMES_PROCESSED, FRAMES_DROPPED
+)
+
+# Обработанный кадр источника (после публикации не изменяется)
+class ProcessedFrame:
+    def __init__(self, sequence: int, image, raw=None, circles=None):
+        self.sequence = sequence
+        self.image = image  # Кадр с нарисованными кругами
+        self.raw = raw  # Копия до отрисовки (только если ее запросил зритель)
+        self.circles = circles  # Круги, нарисованные на image (как у HoughCircles), или None
+        self.hashes = {}  # Хеши содержимого, вычисленные зрителями
+
+# Подписчик (зритель) на кадры одного источника
+class Subscriber:
+    def __init__(self, source, maxsize: int = 1):
+        self.source = source
+        # Почтовый ящик на один кадр: пока зритель отправляет кадр, новый заменяет ожидающий
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.flow = None  # FlowController при адаптивной частоте и качестве
+        self.raw = False  # Зрителю нужны кадры без отрисовки кругов
+        self.skipped = 0
+        self.ended = False
+
+    def put(self, item):
+        # Медленный зритель теряет старые кадры, но не тормозит источник
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.skipped += 1
+            FRAMES_DROPPED.inc(stream=self.source.label, reason="subscriber")
+        self.queue.put_nowait(item)
+
+    def finish(self):
+        # Сигнал окончания не вытесняет последний кадр из почтового ящика
+        self.ended = True
+        if self.queue.empty():
+            self.queue.put_nowait(None)
+
+    async def frames(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:  # Источник остановлен
+                break
+            yield item
+            if self.ended and self.queue.empty():
+                break
+
+    async def encoded_frames(self, quality: int = DEFAULT_JPEG_QUALITY,
+                             max_width: int = None, fps: float = None,
+                             adaptive: AdaptiveStreamConfig = None):
+        # adaptive - частота и качество снижаются, если канал зрителя не успевает
+        if adaptive is not None:
+            self.flow = FlowController(quality, fps, adaptive)
+        last_sent = 0
+        async for frame in self.frames():
+            if self.flow is not None:
+                quality, fps = self.flow.quality, self.flow.fps
+            # Ограничение частоты кадров для зрителя: лишние кадры пропускаем
+            now = time.monotonic()
+            if fps and now - last_sent < 1.0 / fps:
+                continue
+            encoded = await self.source.cache.get(
+                frame.sequence, frame.image, quality, max_width
+            )
+            if encoded is None:
+                continue
+            last_sent = now
+            yield encoded
+
+    def report_send(self, seconds: float):
+        # Время отправки кадра клиенту (измеряет транспорт)
+        SEND_SECONDS.observe(seconds, stream=self.source.label)
+        if self.flow is not None:
+            self.flow.report_send(seconds, self.source.frame_interval)
+
+    def close(self):
+        self.source.hub.unsubscribe(self)
+
+# Источник: один видеопоток и один детектор на все подключения
+class CaptureSource:
+    def __init__(self, hub, key, video, detector):
+        self.hub = hub
+        self.key = key
+        self.label = stream_label(key)  # Метка потока в метриках
+        self.video = video
+        self.detector = detector
+        self.subscribers = set()
+        self.sequence = 0  # Номер последнего опубликованного кадра
+        self.frame_interval = None  # Сглаженный интервал между кадрами, сек
+        self.cache = EncodedFrameCache(stream=self.label)
+        self.closed = False
+        self.released = asyncio.Event()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def publish(self, item):
+        for subscriber in list(self.subscribers):
+            subscriber.put(item)
+
+    async def _read(self):
+        # VideoStream ждет кадр без потока пула, другие источники читаются в пуле потоков
+        if isinstance(self.video, VideoStream):
+            return await self.video.get_frame_async()
+        return await asyncio.to_thread(self.video.get_frame)
+
+    async def _run(self):
+        last_grabbed = None
+        try:
+            while self.subscribers:
+                # Ожидание кадра не блокирует event loop
+                started = time.perf_counter()
+                frame = await self._read()
+                if frame is None:
+                    break
+                grabbed = time.perf_counter()
+                GRAB_SECONDS.observe(grabbed - started, stream=self.label)
+                # Отображение кадра зеркально
+                flipped_frame = cv2.flip(frame, 1)
+                # Копия до отрисовки кругов - только для зрителей, которые рисуют их сами
+                raw = flipped_frame.copy() if any(s.raw for s in list(self.subscribers)) else None
+                # Обработка кадра детектором
+                processed_frame = await asyncio.to_thread(self.detector.process_frame, flipped_frame)
+                circles = getattr(self.detector, "drawn_circles", None)
+                DETECT_SECONDS.observe(time.perf_counter() - grabbed, stream=self.label)
+                FRAMES_PROCESSED.inc(stream=self.label)
+                if last_grabbed is not None:
+                    interval = grabbed - last_grabbed
+                    self.frame_interval = interval if self.frame_interval is None else (
+                        0.1 * interval + 0.9 * self.frame_interval)
+                last_grabbed = grabbed
+                # Кодирование выполняется по запросу зрителей через кэш
+                self.sequence += 1
+                self.publish(ProcessedFrame(self.sequence, processed_frame, raw, circles))
+        except Exception as e:
+            logger.error(f"Error during video processing: {e}")
+        finally:
+            await self._shutdown()
+
+    async def _shutdown(self):
+        self.closed = True
+        for subscriber in list(self.subscribers):
+            subscriber.finish()
+        try:
+            # Остановка фонового захвата может ждать чтения кадра
+            await asyncio.to_thread(self.video.release)
+            self.detector.close()
+        finally:
+            self.hub._remove(self)
+            self.released.set()
+            logger.info(f"Capture source {self.key} stopped")
+
+# Хаб захвата: источники по ключу (stream_type, url)
+class CaptureHub:
+    def __init__(self, detector_factory):
+        self.detector_factory = detector_factory
+        self.sources = {}
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, stream_type: str, url: str = None) -> Subscriber:
+        key = (stream_type, url)
+        async with self._lock:
+            source = self.sources.get(key)
+            if source is not None and source.closed:
+                # Веб-камеру нельзя открыть повторно, пока она не освобождена
+                await source.released.wait()
+                source = None
+            if source is None:
+                # Ошибки фабрики и открытия потока (ValueError) пробрасываются вызывающему
+                handler = VideoStreamHandlerFactory.create_handler(
+                    stream_type=stream_type, url=url
+                )
+                video = await asyncio.to_thread(handler.get_stream)
+                source = CaptureSource(self, key, video, self.detector_factory(key))
+                self.sources[key] = source
+                logger.info(f"Capture source {key} started")
+            subscriber = Subscriber(source)
+            source.subscribers.add(subscriber)
+            if source.task is None:
+                source.start()
+            return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        # Источник остановится сам, когда уйдет последний зритель
+        subscriber.source.subscribers.discard(subscriber)
+
+    async def close(self):
+        """Остановка всех источников при завершении приложения"""
+        sources = list(self.sources.values())
+        for source in sources:
+            # Цикл захвата завершится после текущего кадра, когда зрителей не осталось
+            for subscriber in list(source.subscribers):
+                subscriber.finish()
+            source.subscribers.clear()
+        await asyncio.gather(*(source.released.wait() for source in sources if source.task is not None))
+
+    def stats(self):
+        # Состояние источников для метрик: зрители и потерянные кадры захвата
+        return [
+            {
+                "stream": source.label,
+                "subscribers": len(source.subscribers),
+                "video_dropped_frames": getattr(source.video, "dropped_frames", 0),
+            }
+            for source in list(self.sources.values())
+        ]
+
+    def _remove(self, source: CaptureSource):
+        if self.sources.get(source.key) is source:
+            del self.sources[source.key]
+
+"""
+CaptureHub держит по одному VideoStream и одному CircleDetector на
+каждый источник (stream_type, url). Кадр читается и обрабатывается
+детектором один раз, после чего раздается всем подписчикам; JPEG-варианты
+кодируются через EncodedFrameCache источника. Источник закрывается, когда отключается последний зритель,
+поэтому нагрузка растет с числом камер, а не с числом зрителей.
+У каждого зрителя почтовый ящик на один кадр: медленный канал пропускает
+кадры, но не задерживает захват и детекцию. FlowController снижает
+качество и частоту кадров зрителя по измеренному времени отправки.
+"""
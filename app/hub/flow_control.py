@@ -0,0 +1,75 @@
+from pydantic import BaseModel, Field, PositiveFloat, PositiveInt
+
+class AdaptiveStreamConfig(BaseModel):
+    """Параметры подстройки потока под канал зрителя"""
+    min_fps: PositiveFloat = 1  # Нижняя граница частоты кадров
+    min_quality: int = Field(40, ge=10, le=100)  # Нижняя граница качества JPEG
+    quality_step: PositiveInt = 10
+    fps_step: float = Field(0.75, gt=0, lt=1)  # Множитель частоты при замедлении
+    slow_ratio: float = Field(0.8, gt=0, le=1)  # Отправка дольше этой доли интервала - канал не успевает
+    fast_ratio: float = Field(0.3, gt=0, lt=1)  # Отправка короче этой доли - можно повышать
+    smoothing: float = Field(0.3, gt=0, le=1)  # Коэффициент сглаживания времени отправки
+    cooldown_frames: PositiveInt = 5  # Кадров между изменениями
+
+# Управление частотой и качеством кадров одного зрителя по времени отправки
+class FlowController:
+    def __init__(self, quality: int, fps: float = None, config: AdaptiveStreamConfig = None):
+        self.config = config or AdaptiveStreamConfig()
+        self.requested_quality = quality
+        self.requested_fps = fps  # None - частота источника
+        self.quality = quality
+        self.fps = fps
+        self.send_time = None  # Сглаженное время отправки кадра, сек
+        self._frames_since_change = 0
+
+    def report_send(self, seconds: float, source_interval: float = None):
+        """Учет времени отправки кадра; source_interval - интервал кадров источника"""
+        alpha = self.config.smoothing
+        self.send_time = seconds if self.send_time is None else alpha * seconds + (1 - alpha) * self.send_time
+        self._frames_since_change += 1
+        if self._frames_since_change < self.config.cooldown_frames:
+            return
+        budget = 1.0 / self.fps if self.fps else source_interval
+        if not budget:
+            return
+        if self.send_time > self.config.slow_ratio * budget:
+            self._step_down(budget)
+        elif self.send_time < self.config.fast_ratio * budget:
+            self._step_up(source_interval)
+
+    def _step_down(self, budget):
+        # Сначала снижаем качество (кадр меньше), затем частоту
+        if self.quality > self.config.min_quality:
+            self.quality = max(self.config.min_quality, self.quality - self.config.quality_step)
+        else:
+            # Не выше частоты, которую канал выдерживает при текущем времени отправки
+            fps = max(self.config.min_fps, min(self.config.fps_step / budget,
+                                               self.config.slow_ratio / self.send_time))
+            if self.fps is not None and fps >= self.fps:
+                return
+            self.fps = fps
+        self._frames_since_change = 0
+
+    def _step_up(self, source_interval=None):
+        # Восстановление в обратном порядке: частота, затем качество
+        if self.fps is not None and self.fps != self.requested_fps:
+            fps = self.fps / self.config.fps_step
+            limit = self.requested_fps or (1.0 / source_interval if source_interval else None)
+            if limit is None or fps >= limit:
+                fps = self.requested_fps
+            self.fps = fps
+        elif self.quality < self.requested_quality:
+            self.quality = min(self.requested_quality, self.quality + self.config.quality_step)
+        else:
+            return
+        self._frames_since_change = 0
+
+"""
+FlowController подстраивает поток под канал конкретного зрителя.
+Время отправки кадра сглаживается и сравнивается с интервалом между
+кадрами (1/fps или интервал кадров источника): если канал не успевает,
+сначала снижается качество JPEG шагами quality_step до min_quality,
+затем частота кадров до min_fps; на быстром канале параметры
+возвращаются к запрошенным. Изменения не чаще раза в cooldown_frames
+кадров, чтобы поток не колебался.
+"""
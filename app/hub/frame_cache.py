@@ -0,0 +1,84 @@
+from collections import OrderedDict
+import asyncio
+import time
+import cv2
+from app.utils.metrics import ENCODE_SECONDS
+
+DEFAULT_JPEG_QUALITY = 95  # Качество cv2.imencode по умолчанию
+
+# Закодированный вариант кадра, общий для всех зрителей
+class EncodedFrame:
+    def __init__(self, sequence: int, data: bytes, width: int, height: int):
+        self.sequence = sequence
+        self.data = data  # JPEG
+        self.width = width
+        self.height = height
+        self._multipart = None
+
+    def multipart(self) -> bytes:
+        # Часть multipart/x-mixed-replace собирается один раз на вариант
+        if self._multipart is None:
+            self._multipart = (b'--frame\r\n'
+                               b'Content-Type: image/jpeg\r\n\r\n'
+                               + self.data + b'\r\n')
+        return self._multipart
+
+def target_size(image, max_width: int = None):
+    height, width = image.shape[:2]
+    if max_width is None or width <= max_width:
+        return width, height
+    return max_width, max(1, round(height * max_width / width))
+
+def encode_jpeg(image, quality: int = DEFAULT_JPEG_QUALITY, max_width: int = None):
+    width, height = target_size(image, max_width)
+    if width != image.shape[1]:
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ret:
+        return None
+    return buffer.tobytes(), width, height
+
+# Кэш вариантов по ключу (sequence, quality, width): каждый вариант кодируется один раз
+class EncodedFrameCache:
+    def __init__(self, max_entries: int = 16, stream: str = None):
+        self.max_entries = max_entries
+        self.stream = stream  # Метка потока в метриках
+        self._entries = OrderedDict()
+        self.encodes = 0  # Число фактических кодирований
+        self.hits = 0
+
+    async def get(self, sequence: int, image, quality: int = DEFAULT_JPEG_QUALITY,
+                  max_width: int = None, variant: str = "overlay"):
+        # variant различает кадр с кругами и кадр без отрисовки (raw) с одним номером
+        width, _ = target_size(image, max_width)
+        key = (sequence, quality, width, variant)
+        task = self._entries.get(key)
+        if task is not None:
+            self.hits += 1
+        else:
+            # Кодирование идет отдельной задачей: отключение зрителя ее не отменяет,
+            # а остальные зрители ждут тот же результат
+            task = asyncio.ensure_future(
+                asyncio.to_thread(self._encode, sequence, image, quality, max_width)
+            )
+            self._entries[key] = task
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.encodes += 1
+        return await asyncio.shield(task)
+
+    def _encode(self, sequence, image, quality, max_width):
+        started = time.perf_counter()
+        result = encode_jpeg(image, quality, max_width)
+        ENCODE_SECONDS.observe(time.perf_counter() - started, stream=self.stream)
+        if result is None:
+            return None
+        return EncodedFrame(sequence, *result)
+
+"""
+EncodedFrameCache хранит JPEG-варианты последних кадров источника.
+Ключ (номер кадра, качество, ширина, вариант) гарантирует, что одинаковый вариант
+кодируется один раз, а все зрители получают один и тот же объект bytes
+без копирования. Зритель может запросить более низкое качество и
+меньшую ширину кадра для медленных каналов.
+"""
@@ -0,0 +1,218 @@
+import asyncio
+import math
+import time
+import cv2
+import numpy as np
+from loguru import logger
+from pydantic import BaseModel, PositiveFloat, PositiveInt, conint
+from app.hub.capture_hub import Subscriber
+from app.hub.frame_cache import EncodedFrame, encode_jpeg
+from app.utils.metrics import stream_label, ENCODE_SECONDS
+
+MOSAIC_LABEL = "mosaic"  # Метка мозаики в метриках
+
+class MosaicConfig(BaseModel):
+    """Общий кадр нескольких камер: размер ячейки, частота и качество"""
+    fps: PositiveFloat = 10  # Частота сборки и кодирования общего кадра
+    tile_width: PositiveInt = 480
+    tile_height: PositiveInt = 270
+    quality: conint(ge=10, le=100) = 80
+    max_sources: PositiveInt = 16
+    labels: bool = True  # Подпись источника в углу ячейки
+
+def grid_shape(count: int, columns: int = None):
+    # Почти квадратная сетка: 9 камер - 3x3, 16 - 4x4
+    columns = min(count, columns or math.ceil(math.sqrt(count)))
+    return math.ceil(count / columns), columns
+
+def fit_tile(height: int, width: int, tile_width: int, tile_height: int):
+    # Размер кадра в ячейке с сохранением пропорций и смещение для центрирования
+    scale = min(tile_width / width, tile_height / height)
+    fit_width, fit_height = max(1, round(width * scale)), max(1, round(height * scale))
+    return (tile_width - fit_width) // 2, (tile_height - fit_height) // 2, fit_width, fit_height
+
+# Мозаика: подписка на каждый источник хаба и один общий кадр для всех зрителей
+class Mosaic:
+    def __init__(self, hub, key, sources, columns: int = None, config: MosaicConfig = None):
+        self.hub = hub
+        self.key = key
+        self.sources = list(sources)
+        self.config = config or MosaicConfig()
+        self.label = MOSAIC_LABEL
+        self.rows, self.columns = grid_shape(len(self.sources), columns)
+        # Холст выделяется один раз; ячейки обновляются на месте
+        self.canvas = np.zeros(
+            (self.rows * self.config.tile_height, self.columns * self.config.tile_width, 3), dtype=np.uint8
+        )
+        self.latest = [None] * len(self.sources)  # Последний обработанный кадр каждого источника
+        self._drawn = [0] * len(self.sources)  # Номер кадра, нарисованного в ячейке
+        self._fits = [None] * len(self.sources)
+        self.inputs = []
+        self.subscribers = set()
+        self.frame_interval = 1.0 / self.config.fps
+        self.sequence = 0
+        self.encodes = 0
+        self.closed = False
+        self.released = asyncio.Event()
+        self.task = None
+
+    async def open(self):
+        # Источники открываются через хаб захвата: детекция не дублируется с /video_feed
+        try:
+            for stream_type, url in self.sources:
+                self.inputs.append(await self.hub.capture_hub.subscribe(stream_type=stream_type, url=url))
+        except Exception:
+            self._close_inputs()
+            raise
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def publish(self, item):
+        for subscriber in list(self.subscribers):
+            subscriber.put(item)
+
+    async def _read(self, index: int, subscriber: Subscriber):
+        async for frame in subscriber.frames():
+            self.latest[index] = frame
+
+    def compose(self, frames) -> bool:
+        """Перерисовка ячеек, в которых появился новый кадр; True, если холст изменился"""
+        config = self.config
+        changed = False
+        for index, frame in enumerate(frames):
+            if frame is None or frame.sequence == self._drawn[index]:
+                continue
+            row, column = divmod(index, self.columns)
+            top, left = row * config.tile_height, column * config.tile_width
+            height, width = frame.image.shape[:2]
+            x, y, fit_width, fit_height = fit_tile(height, width, config.tile_width, config.tile_height)
+            if self._fits[index] != (x, y, fit_width, fit_height):
+                # Размер кадра источника изменился: очищаем поля ячейки
+                self.canvas[top:top + config.tile_height, left:left + config.tile_width] = 0
+                self._fits[index] = (x, y, fit_width, fit_height)
+            tile = self.canvas[top + y:top + y + fit_height, left + x:left + x + fit_width]
+            # Уменьшение сразу в область холста, без промежуточного кадра
+            cv2.resize(frame.image, (fit_width, fit_height), dst=tile, interpolation=cv2.INTER_AREA)
+            if config.labels:
+                cv2.putText(self.canvas, stream_label(self.sources[index]), (left + 8, top + 20),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+            self._drawn[index] = frame.sequence
+            changed = True
+        return changed
+
+    def _encode(self):
+        started = time.perf_counter()
+        result = encode_jpeg(self.canvas, self.config.quality)
+        ENCODE_SECONDS.observe(time.perf_counter() - started, stream=self.label)
+        self.encodes += 1
+        if result is None:
+            return None
+        self.sequence += 1
+        return EncodedFrame(self.sequence, *result)
+
+    async def _tick(self):
+        # Сборка и кодирование выполняются один раз за такт для всех зрителей
+        if await asyncio.to_thread(self.compose, list(self.latest)):
+            encoded = await asyncio.to_thread(self._encode)
+            if encoded is not None:
+                self.publish(encoded)
+
+    async def _run(self):
+        readers = [asyncio.create_task(self._read(index, subscriber))
+                   for index, subscriber in enumerate(self.inputs)]
+        try:
+            next_tick = time.monotonic()
+            while self.subscribers and not all(reader.done() for reader in readers):
+                await self._tick()
+                next_tick += self.frame_interval
+                delay = next_tick - time.monotonic()
+                if delay < 0:
+                    next_tick = time.monotonic()  # Сборка не успевает: без накопления тактов
+                await asyncio.sleep(max(0.0, delay))
+            if self.subscribers:
+                await self._tick()  # Последние кадры остановленных источников
+        except Exception as e:
+            logger.error(f"Error during mosaic composition: {e}")
+        finally:
+            for reader in readers:
+                reader.cancel()
+            self._shutdown()
+
+    def _close_inputs(self):
+        for subscriber in self.inputs:
+            subscriber.close()
+        self.inputs = []
+
+    def _shutdown(self):
+        self.closed = True
+        for subscriber in list(self.subscribers):
+            subscriber.finish()
+        self._close_inputs()
+        self.hub._remove(self)
+        self.released.set()
+        logger.info(f"Mosaic of {len(self.sources)} sources stopped")
+
+# Мозаики по набору источников: зрители одинаковой стены получают один поток
+class MosaicHub:
+    def __init__(self, capture_hub, config: MosaicConfig = None):
+        self.capture_hub = capture_hub
+        self.config = config or MosaicConfig()
+        self.mosaics = {}
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, sources, columns: int = None) -> Subscriber:
+        """sources - [(stream_type, url), ...]; кадры подписчика - EncodedFrame общего холста"""
+        sources = [tuple(source) for source in sources]
+        if not sources:
+            raise ValueError("Mosaic requires at least one stream")
+        if len(sources) > self.config.max_sources:
+            raise ValueError(f"Mosaic supports at most {self.config.max_sources} streams")
+        key = (tuple(sources), columns)
+        async with self._lock:
+            mosaic = self.mosaics.get(key)
+            if mosaic is not None and mosaic.closed:
+                await mosaic.released.wait()
+                mosaic = None
+            if mosaic is None:
+                mosaic = Mosaic(self, key, sources, columns, self.config)
+                await mosaic.open()
+                self.mosaics[key] = mosaic
+                logger.info(f"Mosaic of {len(sources)} sources started")
+            subscriber = Subscriber(mosaic)
+            mosaic.subscribers.add(subscriber)
+            if mosaic.task is None:
+                mosaic.start()
+            return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        # Мозаика остановится сама, когда уйдет последний зритель
+        subscriber.source.subscribers.discard(subscriber)
+
+    async def close(self):
+        """Остановка всех мозаик при завершении приложения"""
+        mosaics = list(self.mosaics.values())
+        for mosaic in mosaics:
+            for subscriber in list(mosaic.subscribers):
+                subscriber.finish()
+            mosaic.subscribers.clear()
+        await asyncio.gather(*(mosaic.released.wait() for mosaic in mosaics if mosaic.task is not None))
+
+    def _remove(self, mosaic: Mosaic):
+        if self.mosaics.get(mosaic.key) is mosaic:
+            del self.mosaics[mosaic.key]
+
+"""
+MosaicHub собирает обработанные кадры нескольких источников CaptureHub
+в один кадр-сетку для /mosaic_feed.
+- Холст выделяется один раз на мозаику; новый кадр источника уменьшается
+сразу в свою ячейку (с сохранением пропорций), остальные ячейки не
+перерисовываются.
+- С частотой fps холст кодируется в JPEG один раз, если хотя бы одна
+ячейка изменилась, и раздается всем зрителям через почтовые ящики
+Subscriber. Стоимость кодирования и трафик зрителя не зависят от числа
+камер на стене.
+- Мозаика подписывается на источники через хаб захвата, поэтому кадр
+каждой камеры читается и обрабатывается детектором один раз, даже
+если он одновременно открыт в /video_feed.
+"""
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import struct
+import time
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, PositiveInt
+from starlette.websockets import WebSocket
+from app.hub.capture_hub import ProcessedFrame, Subscriber
+from app.hub.frame_cache import DEFAULT_JPEG_QUALITY, EncodedFrameCache
+from app.repository.dedup import dhash, hamming
+from app.utils.metrics import FRAMES_DROPPED
+
+HEADER_LENGTH = struct.Struct(">I")  # Длина JSON-заголовка в начале сообщения
+
+class WebSocketStreamConfig(BaseModel):
+    """Передача кадров по WebSocket с подтверждениями и пропуском неизменных кадров"""
+    window: PositiveInt = 2  # Кадров без подтверждения, после которых отправка приостанавливается
+    hash_size: PositiveInt = 16  # Сторона перцептивного хеша кадра (hash_size^2 бит)
+    max_distance: NonNegativeInt = 0  # Расстояние Хэмминга, при котором кадр считается неизменным
+    keyframe_interval: PositiveFloat = 10  # Неизменный кадр все равно отправляется раз в столько секунд
+
+def pack_frame(header: dict, data: bytes) -> bytes:
+    # Бинарное сообщение: длина заголовка (4 байта), заголовок JSON, JPEG
+    encoded = json.dumps(header, separators=(",", ":")).encode()
+    return HEADER_LENGTH.pack(len(encoded)) + encoded + data
+
+def unpack_frame(message: bytes):
+    (length,) = HEADER_LENGTH.unpack_from(message)
+    start = HEADER_LENGTH.size
+    return json.loads(message[start:start + length]), message[start + length:]
+
+def circle_list(circles):
+    # Круги HoughCircles (1, N, 3) в список [[x, y, r], ...]
+    if circles is None:
+        return []
+    return [[round(float(x), 1), round(float(y), 1), round(float(r), 1)] for x, y, r in circles[0]]
+
+def content_hash(frame: ProcessedFrame, image, variant: str, hash_size: int) -> int:
+    # Хеш считается один раз на кадр и вариант для всех зрителей
+    key = (variant, hash_size)
+    if key not in frame.hashes:
+        frame.hashes[key] = dhash(image, hash_size)
+    return frame.hashes[key]
+
+# Состояние зрителя WebSocket: номера кадров, подтверждения и последний отправленный кадр
+class FrameSession:
+    def __init__(self, config: WebSocketStreamConfig = None, quality: int = DEFAULT_JPEG_QUALITY,
+                 max_width: int = None, overlay: bool = True):
+        self.config = config or WebSocketStreamConfig()
+        self.quality = quality
+        self.max_width = max_width
+        self.overlay = overlay  # False - кадры без кругов, круги рисует клиент
+        self.sequence = 0  # Номер последнего отправленного кадра
+        self.acked = 0
+        self.unchanged = 0  # Кадров, не отправленных из-за совпадения содержимого
+        self._suppressed = 0  # Из них после последнего отправленного
+        self._last_hash = None
+        self._last_circles = None
+        self._last_sent = None
+
+    @property
+    def in_flight(self) -> int:
+        return self.sequence - self.acked
+
+    def can_send(self) -> bool:
+        return self.in_flight < self.config.window
+
+    def ack(self, sequence: int):
+        self.acked = max(self.acked, min(sequence, self.sequence))
+
+    def image_for(self, frame: ProcessedFrame):
+        # Кадр без отрисовки, если зритель рисует круги сам и копия есть
+        if not self.overlay and frame.raw is not None:
+            return frame.raw, "raw"
+        return frame.image, "overlay"
+
+    async def message(self, frame: ProcessedFrame, cache: EncodedFrameCache):
+        """Сообщение для отправки или None, если кадр не изменился с последнего отправленного"""
+        now = time.monotonic()
+        image, variant = self.image_for(frame)
+        value = await asyncio.to_thread(content_hash, frame, image, variant, self.config.hash_size)
+        circles = circle_list(frame.circles)
+        if (self._last_hash is not None and circles == self._last_circles
+                and hamming(value, self._last_hash) <= self.config.max_distance
+                and now - self._last_sent < self.config.keyframe_interval):
+            self.unchanged += 1
+            self._suppressed += 1
+            return None
+        encoded = await cache.get(frame.sequence, image, self.quality, self.max_width, variant)
+        if encoded is None:
+            return None
+        # Круги в координатах отправленного (возможно, уменьшенного) кадра
+        scale = encoded.width / image.shape[1]
+        self.sequence += 1
+        header = {
+            "seq": self.sequence,
+            "frame": frame.sequence,
+            "width": encoded.width,
+            "height": encoded.height,
+            "overlay": variant == "overlay" and frame.circles is not None,
+            "circles": [[round(v * scale, 1) for v in circle] for circle in circles],
+            "unchanged": self._suppressed,
+        }
+        self._suppressed = 0
+        self._last_hash, self._last_circles, self._last_sent = value, circles, now
+        return pack_frame(header, encoded.data)
+
+async def serve_websocket(websocket: WebSocket, subscriber: Subscriber, session: FrameSession):
+    """Отправка кадров источника, пока клиент подключен и источник работает"""
+    label = subscriber.source.label
+    acked = asyncio.Event()
+
+    async def receive_acks():
+        # Клиент подтверждает кадры сообщениями {"ack": seq}
+        while True:
+            message = await websocket.receive_json()
+            if "ack" in message:
+                session.ack(int(message["ack"]))
+                acked.set()
+
+    receiver = asyncio.create_task(receive_acks())
+    try:
+        async for frame in subscriber.frames():
+            if receiver.done():
+                break
+            if not session.can_send():
+                # Окно заполнено: ждем подтверждения, новые кадры тем временем заменяются в почтовом ящике
+                while not session.can_send() and not receiver.done():
+                    acked.clear()
+                    waiter = asyncio.ensure_future(acked.wait())
+                    await asyncio.wait([waiter, receiver], return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+                if receiver.done():
+                    break
+                if not subscriber.queue.empty():
+                    FRAMES_DROPPED.inc(stream=label, reason="window")
+                    continue  # Есть более новый кадр
+            message = await session.message(frame, subscriber.source.cache)
+            if message is None:
+                FRAMES_DROPPED.inc(stream=label, reason="unchanged")
+                continue
+            started = time.perf_counter()
+            await websocket.send_bytes(message)
+            subscriber.report_send(time.perf_counter() - started)
+    finally:
+        receiver.cancel()
+        if receiver.done() and not receiver.cancelled():
+            receiver.exception()  # Отключение клиента - штатное завершение
+
+"""
+Транспорт кадров по WebSocket (/ws/video_feed) вместо multipart/x-mixed-replace.
+- Каждое бинарное сообщение: 4 байта длины, JSON-заголовок (номер
+кадра seq, размер, круги детекции в координатах кадра, число
+пропущенных неизменных кадров) и JPEG.
+- Клиент подтверждает кадры сообщениями {"ack": seq}; без подтверждения
+на сервере находится не больше window кадров, а на время ожидания
+новые кадры заменяют старые в почтовом ящике зрителя.
+- Кадр не отправляется, если его перцептивный хеш и круги совпадают с
+последним отправленным (раз в keyframe_interval кадр отправляется
+все равно): на статичной сцене трафик почти нулевой.
+- overlay=false - кадры без нарисованных кругов (копия до отрисовки
+делается только для таких зрителей), круги рисует браузер по заголовку.
+"""
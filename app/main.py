@@ -1,42 +1,80 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
+import time
+IMPORT_STARTED = time.perf_counter()  # Начало импорта: время старта считается от него
+
+from fastapi import FastAPI, HTTPException, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, PlainTextResponse, Response
 from starlette.responses import StreamingResponse
-from app.factory.video_factory import VideoStreamHandlerFactory
-from app.detectors.circle_detector import CircleDetector, CircleDetectorConfig
-from app.observer.notifier import ConsoleNotifier
-from app.repository.movement_repository import InMemoryMovementRepository
+from app.container import AppContainer
+from app.repository.movement_repository import Movement
 from app.utils.decorators import LoggingDetectorDecorator, FilterDetectorDecorator
+from app.hub.frame_cache import DEFAULT_JPEG_QUALITY
+from app.hub.flow_control import AdaptiveStreamConfig
+from app.hub.ws_transport import FrameSession, WebSocketStreamConfig, serve_websocket
+from app.utils.metrics import metrics
 from loguru import logger
 from fastapi.templating import Jinja2Templates
-from collections import deque
-import cv2
+from datetime import datetime
+from typing import Literal
 import asyncio
+import json
+from urllib.parse import urlencode
 
-app = FastAPI()
-global_repository = InMemoryMovementRepository()
-circle_config = CircleDetectorConfig()
+# Ресурсы приложения создаются при первом обращении, а не при импорте модуля
+container = AppContainer()
+# Ресурсы останавливаются в lifespan при завершении сервера
+app = FastAPI(lifespan=container.lifespan(IMPORT_STARTED))
 templates = Jinja2Templates(directory="app/templates")
+# Подстройка частоты и качества /video_feed под канал зрителя
+adaptive_stream_config = AdaptiveStreamConfig()
+# Окно подтверждений и пропуск неизменных кадров для /ws/video_feed
+ws_stream_config = WebSocketStreamConfig()
+MOVEMENTS_PAGE_SIZE = 500  # Записей, читаемых из репозитория за один запрос
 
-# Настройка логирования
-logger.add("movement_repository.log", rotation="1 MB", level="INFO", backtrace=True, diagnose=True)
-logger.add("app_errors.log", rotation="1 MB", level="ERROR")  # Файл для ошибок
+def __getattr__(name):
+    # Совместимость: app.main.global_repository и другие ресурсы контейнера
+    resources = {
+        "global_repository": "repository",
+        "capture_hub": "capture_hub",
+        "mosaic_hub": "mosaic_hub",
+        "log_broadcaster": "log_broadcaster",
+        "frame_archive": "frame_archive",
+        "detection_engine": "detection_engine",
+    }
+    if name in resources:
+        return getattr(container, resources[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Очередь для хранения последних логов
-log_queue = asyncio.Queue(maxsize=500)  # Максимум 500 сообщений
-log_stream_active = True
+# Применение декораторов к детектору нового источника:
+# detector = LoggingDetectorDecorator(detector)
+# detector = FilterDetectorDecorator(detector, keyword="Motion")
 
-# Кастомный обработчик для loguru
-def log_handler(message):
-    try:
-        log_record = message.record
-        formatted = f"[{log_record['time']}] {log_record['message']}"
-        # Неблокирующее добавление в очередь
-        log_queue.put_nowait(formatted)
-    except asyncio.QueueFull:
-        logger.warning("Лог-очередь переполнена, сообщение отброшено")
+# Показатели, которые вычисляются при запросе /metrics (ресурсы, которые еще не созданы, не запускаются)
+def _repository_gauge(value):
+    def collect():
+        repository = container.peek("repository")
+        return [({}, value(repository))] if repository is not None else []
+    return collect
 
-# Добавляем обработчик
-logger.add(log_handler, level="INFO")
+def _hub_stats():
+    hub = container.peek("capture_hub")
+    return hub.stats() if hub is not None else []
+
+metrics.gauge("persistence_queue_depth", "Задач в очереди отложенной записи",
+              _repository_gauge(lambda repository: container.write_behind.depth()))
+metrics.gauge("persistence_dropped_tasks", "Задач записи, отброшенных при переполнении очереди",
+              _repository_gauge(lambda repository: container.write_behind.dropped))
+metrics.gauge("frame_archive_bytes", "Объем сегментов архива кадров",
+              lambda: [({}, archive.stats()["bytes"])] if (archive := container.peek("frame_archive")) else [])
+metrics.gauge("dedup_duplicates", "Обрезок, объединенных с ранее сохраненными",
+              _repository_gauge(lambda repository: repository.duplicates))
+metrics.gauge("active_subscribers", "Подключенных зрителей источника",
+              lambda: [({"stream": s["stream"]}, s["subscribers"]) for s in _hub_stats()],
+              ("stream",))
+metrics.gauge("video_dropped_frames", "Кадров, вытесненных из буфера захвата VideoStream",
+              lambda: [({"stream": s["stream"]}, s["video_dropped_frames"]) for s in _hub_stats()],
+              ("stream",))
+metrics.gauge("startup_seconds", "Время от импорта приложения до готовности",
+              lambda: [({}, container.startup_seconds)] if container.startup_seconds is not None else [])
 
 # Обработчик ошибок для HTTPException
 @app.exception_handler(HTTPException)
@@ -60,62 +98,123 @@ async def scanner_page(request: Request):
     return templates.TemplateResponse("scanner.html", {"request": request})
 
 @app.get("/video_feed")
-async def video_feed(stream_type: str = "Webcam", url: str = None):
-    # Создание обработчика видеопотока через фабрику
+async def video_feed(
+    stream_type: str = "Webcam",
+    url: str = None,
+    quality: int = Query(DEFAULT_JPEG_QUALITY, ge=10, le=100),
+    max_width: int = Query(None, ge=16),
+    fps: float = Query(None, gt=0, le=60),
+    adaptive: bool = True,
+):
+    # Подключение к общему источнику хаба (поток открывается только для первого зрителя)
     try:
-        handler = VideoStreamHandlerFactory.create_handler(
-            stream_type=stream_type, url=url
-        )
+        subscriber = await container.capture_hub.subscribe(stream_type=stream_type, url=url)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
-    
+
+    async def frame_generator():
+        flow_config = adaptive_stream_config if adaptive else None
+        try:
+            async for encoded in subscriber.encoded_frames(quality, max_width, fps, flow_config):
+                # Генератор продолжается после того, как кадр отправлен клиенту
+                started = time.perf_counter()
+                yield encoded.multipart()
+                subscriber.report_send(time.perf_counter() - started)
+        finally:
+            subscriber.close()
+    return StreamingResponse(
+        frame_generator(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+
+# Те же кадры по WebSocket: номера кадров, круги в заголовке, подтверждения клиента
+@app.websocket("/ws/video_feed")
+async def video_feed_ws(
+    websocket: WebSocket,
+    stream_type: str = "Webcam",
+    url: str = None,
+    quality: int = Query(DEFAULT_JPEG_QUALITY, ge=10, le=100),
+    max_width: int = Query(None, ge=16),
+    overlay: bool = True,
+):
+    await websocket.accept()
     try:
-        video = handler.get_stream()
+        subscriber = await container.capture_hub.subscribe(stream_type=stream_type, url=url)
     except ValueError as ve:
-        raise HTTPException(status_code=400, detail=str(ve))
+        await websocket.close(code=1008, reason=str(ve))
+        return
+    # Без overlay источник сохраняет копию кадра до отрисовки кругов
+    subscriber.raw = not overlay
+    session = FrameSession(ws_stream_config, quality, max_width, overlay)
+    try:
+        await serve_websocket(websocket, subscriber, session)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscriber.close()
+        logger.info(f"WebSocket viewer disconnected, sent: {session.sequence}, unchanged: {session.unchanged}")
 
-    # Инициализация детектора движения с глобальным репозиторием
-    detector = CircleDetector(repository=global_repository, config=circle_config)
+# Страница сканера с WebSocket-транспортом: круги рисуются в браузере
+@app.get("/ws_scanner", response_class=HTMLResponse)
+async def ws_scanner_page(request: Request):
+    return templates.TemplateResponse("ws_scanner.html", {"request": request})
 
-    # Применение декораторов
-    # detector = LoggingDetectorDecorator(detector)
-    # detector = FilterDetectorDecorator(detector, keyword="Motion")
-    
-    # Инициализация наблюдателей
-    console_notifier = ConsoleNotifier()
-    detector.attach(console_notifier)
+# Источник мозаики из параметра stream: "Webcam" или "RTSP:rtsp://..."
+def parse_source(value: str):
+    stream_type, _, url = value.partition(":")
+    return stream_type, url or None
+
+# Несколько камер в одном кадре-сетке: один JPEG на такт для всех зрителей
+@app.get("/mosaic_feed")
+async def mosaic_feed(
+    stream: list[str] = Query(...),
+    columns: int = Query(None, ge=1, le=16),
+):
+    try:
+        subscriber = await container.mosaic_hub.subscribe([parse_source(value) for value in stream], columns)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
 
     async def frame_generator():
-        while True:
-            frame = video.get_frame()
-            if frame is None:
-                break
-            try:
-                # Отображение кадра зеркально
-                flipped_frame = cv2.flip(frame, 1)
-                # Обработка кадра детектором
-                processed_frame = await asyncio.to_thread(detector.process_frame, flipped_frame)
-                ret, buffer = cv2.imencode('.jpg', processed_frame)
-                if not ret:
-                    continue
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' 
-                       + frame_bytes + b'\r\n')
-            except Exception as e:
-                logger.error(f"Error during video processing: {e}")
-                raise HTTPException(status_code=500, detail="Internal Server Error")
-            finally:
-                video.release
+        try:
+            async for encoded in subscriber.frames():
+                started = time.perf_counter()
+                yield encoded.multipart()
+                subscriber.report_send(time.perf_counter() - started)
+        finally:
+            subscriber.close()
     return StreamingResponse(
         frame_generator(), media_type="multipart/x-mixed-replace; boundary=frame")
 
+# Время из параметров запроса (ISO 8601); пустое значение - без фильтра
+def parse_time(value: str):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
 
 @app.get("/notifications_page", response_class=HTMLResponse)
-async def notifications_page(request: Request):
-    # Получаем данные из репозитория
-    movements = await asyncio.to_thread(global_repository.get_movements)
-    logger.info(f"Total movements found: {len(movements)}")  # Отладочный вывод
+async def notifications_page(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str = None,
+    cursor_id: int = None,
+    start: str = None,
+    end: str = None,
+):
+    # Страница новых уведомлений: курсор - время и id последней записи предыдущей страницы
+    cursor, start, end = parse_time(cursor), parse_time(start), parse_time(end)
+    if cursor is not None and (end is None or cursor < end):
+        page_end, page_end_id = cursor, cursor_id
+    else:
+        page_end, page_end_id = end, None
+    movements = await asyncio.to_thread(
+        container.repository.get_range, start, page_end, limit, 0, True, page_end_id
+    )
+    total = await asyncio.to_thread(container.repository.count, start, end)
+    logger.info(f"Total movements found: {total}")  # Отладочный вывод
     # Форматируем для шаблона
     notifications = [
         {
@@ -124,30 +223,110 @@ async def notifications_page(request: Request):
         } 
         for m in movements
     ]
+    next_page = None
+    if len(movements) == limit:
+        last = movements[-1]
+        query = {"cursor": last.timestamp.isoformat(), "limit": limit}
+        if last.movement_id is not None:
+            query["cursor_id"] = last.movement_id
+        query.update({name: value.isoformat() for name, value in (("start", start), ("end", end)) if value})
+        next_page = f"/notifications_page?{urlencode(query)}"
     
     return templates.TemplateResponse(
         "notifications.html", 
         {
             "request": request,
-            "notifications": notifications
+            "notifications": notifications,
+            "total": total,
+            "limit": limit,
+            "start": start.isoformat() if start else "",
+            "end": end.isoformat() if end else "",
+            "next_page": next_page
         }
     )       
+
+def movement_to_dict(movement: Movement):
+    return {
+        "id": movement.movement_id,
+        "timestamp": movement.timestamp.isoformat(),
+        "description": movement.description,
+        "object_id": movement.object_id
+    }
+
+# Потоковая выдача истории движений страницами из репозитория
+@app.get("/movements")
+async def get_movements(
+    start: str = None,
+    end: str = None,
+    limit: int = Query(None, ge=1),
+    format: Literal["json", "ndjson"] = "json",
+):
+    start, end = parse_time(start), parse_time(end)
+
+    async def movement_stream():
+        sent = 0
+        # Курсор (время, id) последней выданной записи: следующая страница читается
+        # по индексу без OFFSET, стоимость не растет с размером истории
+        page_start, page_start_id = start, None
+        if format == "json":
+            yield "["
+        while limit is None or sent < limit:
+            page_size = MOVEMENTS_PAGE_SIZE if limit is None else min(MOVEMENTS_PAGE_SIZE, limit - sent)
+            page = await asyncio.to_thread(
+                container.repository.get_range, page_start, end, page_size, start_id=page_start_id
+            )
+            for movement in page:
+                item = json.dumps(movement_to_dict(movement), ensure_ascii=False)
+                if format == "ndjson":
+                    yield item + "\n"
+                else:
+                    yield ("," if sent else "") + item
+                sent += 1
+            if len(page) < page_size:
+                break
+            page_start, page_start_id = page[-1].timestamp, page[-1].movement_id or 0
+        if format == "json":
+            yield "]"
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(movement_stream(), media_type=media_type)
+
+# Сохраненный кадр из архива по времени обнаружения
+@app.get("/archived_frame")
+async def archived_frame(timestamp: str, kind: Literal["color", "gray"] = "color"):
+    data = await asyncio.to_thread(container.frame_archive.read, parse_time(timestamp), kind)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Frame not found")
+    return Response(content=data, media_type="image/jpeg")
+
+# Метрики конвейера: текстовый формат Prometheus или JSON-снимок
+@app.get("/metrics")
+async def get_metrics(format: Literal["prometheus", "json"] = "prometheus"):
+    if format == "json":
+        return JSONResponse(content=metrics.snapshot())
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Эндпоинт для потоковой передачи логов
 @app.get("/log_stream")
-async def log_stream(request: Request):
+async def log_stream(request: Request, level: str = "INFO", keyword: str = None):
+    try:
+        min_level = logger.level(level.upper()).no
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown log level: {level}")
+    # EventSource передает id последнего события при переподключении
+    last_event_id = request.headers.get("last-event-id")
+    subscriber = container.log_broadcaster.subscribe(
+        min_level=min_level,
+        keyword=keyword,
+        last_event_id=last_event_id
+    )
+
     async def event_generator():
-        # Отправляем всю историю при подключении
-        history = []
-        while not log_queue.empty():
-            history.append(await log_queue.get())
-        
-        for log in history:
-            yield f"data: {log}\n\n"
-        
-        # Отправляем новые сообщения
-        while True:
-            log = await log_queue.get()
-            yield f"data: {log}\n\n"
+        try:
+            async for event in subscriber.events():
+                yield event.to_sse()
+        finally:
+            subscriber.close()
 
     return StreamingResponse(
         event_generator(),
@@ -159,11 +338,17 @@ async def log_stream(request: Request):
  в JPEG, которые можно отображать на frontend        
 - Теперь маршрут /video_feed принимает параметры stream_type и url, 
 позволяя выбрать тип потока динамически.
+- Если канал зрителя не успевает, /video_feed пропускает кадры и 
+снижает качество и частоту (adaptive=false отключает подстройку); 
+захват и детекция от этого не замедляются.
 - Observer Pattern используется для уведомления наблюдателей 
 о событиях, таких как обнаружение движения.
 - CircleDetector — субъект, который анализирует кадры и уведомляет 
 наблюдателей при обнаружении движения.
 - ConsoleNotifier — наблюдатель, который выводит уведомления в консоль.
+Он подключен с DispatchConfig: notify() только ставит DetectionEvent 
+в очередь наблюдателя, update() выполняется в отдельном потоке 
+с ограничением времени, ошибки наблюдателя не прерывают детекцию.
 - Паттерн Repository используется для хранения и управления 
 данными о детектированных движениях. Это позволяет легко менять способ 
 хранения данных (например, из памяти на базу данных) без изменения 
@@ -173,8 +358,43 @@ InMemoryMovementRepository — конкретная реализация, хра
 данные в памяти. 
 - В CircleDetector добавляется ссылка на репозиторий для сохранения 
 информации о движениях.
+- CaptureHub открывает один видеопоток и один детектор на источник 
+(stream_type, url) и раздает готовые кадры всем зрителям /video_feed.
+- DetectionEngine (при DetectionEngineConfig.workers > 0) выполняет 
+детекцию в пуле процессов, каждый источник закреплен за одним процессом.
+- /video_feed принимает quality, max_width и fps: каждый вариант JPEG 
+кодируется один раз и общий для всех зрителей (EncodedFrameCache).
+- WriteBehindRepository переносит сохранение кадров и запись в БД 
+в фоновый поток с ограниченной очередью и пакетными транзакциями.
+- DeduplicatingRepository сравнивает перцептивный хеш обрезки с недавними 
+обрезками потока: повторы одного объекта не пишутся заново, а 
+увеличивают seen_count исходного изображения.
+- Кадры сохраняются в FrameArchive: сегменты по дням с индексом 
+смещений вместо двух файлов на каждое обнаружение. Маршрут 
+/archived_frame отдает сохраненный кадр по времени обнаружения.
+- /ws/video_feed передает те же кадры по WebSocket: бинарное сообщение 
+с JSON-заголовком (номер кадра, круги) и JPEG. Клиент подтверждает 
+кадры, на сервере не больше WebSocketStreamConfig.window кадров без 
+подтверждения; кадры с неизменным содержимым не отправляются. 
+С overlay=false круги рисует браузер (страница /ws_scanner).
+- /mosaic_feed?stream=Webcam&stream=RTSP:rtsp://... собирает обработанные 
+кадры нескольких источников в один кадр-сетку (MosaicHub): каждая 
+ячейка уменьшается один раз в общий холст, холст кодируется один раз 
+за такт с частотой MosaicConfig.fps для всех зрителей.
+- Импорт модуля не создает ресурсов: БД, репозиторий, архив кадров, 
+пул детекции, хаб захвата и рассылка логов создаются контейнером 
+AppContainer при первом обращении. Lifespan подключает журналы 
+(StartupConfig.prewarm - заранее создает БД и прогревает HoughCircles), 
+проверяет время старта по budget_seconds и останавливает ресурсы 
+при завершении сервера.
+- SqlMovementRepository хранит историю движений в SQLite (WAL, индексы 
+по времени), поэтому она переживает перезапуск сервера.
 - Добавлен маршрут /movements для получения списка всех 
-детектированных движений.
+детектированных движений. Список выдается потоком (JSON-массив или 
+NDJSON) страницами из репозитория по курсору (время, id последней
+записи), с фильтром по времени start/end.
+- /notifications_page выводит историю постранично (limit и курсор 
+по времени и id записи), с фильтрами start/end.
 - Паттерн Decorator позволяет динамически добавлять новые обязанности 
 объектам. В нашем случае, мы можем использовать его для добавления 
 дополнительных функций к детектору движения, например, логирование 
@@ -186,9 +406,16 @@ InMemoryMovementRepository — конкретная реализация, хра
 
 Реализован вывод логов в реальном времени на странице сканера. 
 Для этого добавлен Server-Sent Events (SSE).
-Loguru передаёт сообщение в log_handler
-Обработчик форматирует сообщение и добавляет его в log_queue.
-Эндпоинт /log_stream читает из log_queue и отправляет клиенту.
+Loguru передаёт сообщение в log_broadcaster.sink.
+LogBroadcaster нумерует сообщение, добавляет его в историю и в очереди 
+всех подписчиков.
+Эндпоинт /log_stream подписывается на LogBroadcaster (с фильтрами level 
+и keyword, продолжение по Last-Event-ID) и отправляет записи клиенту.
+
+Маршрут /metrics отдает метрики конвейера в формате Prometheus 
+(?format=json - JSON-снимок с p50/p99): задержки получения кадра, 
+детекции, кодирования и отправки по потокам, счетчики кадров, 
+обнаружений и сохранений, глубину очереди записи и число зрителей.
 
 
 
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, Column, Integer, DateTime, String, LargeBinary
+import threading
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, DateTime, String, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -8,16 +9,100 @@ class Image(Base):
     __tablename__ = 'images'
     
     id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime, nullable=False)
-    description = Column(String, nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)
+    description = Column(String, nullable=False, index=True)
     image_data = Column(LargeBinary, nullable=False)
+    # Метаданные закодированного изображения (NULL у строк до миграции)
+    width = Column(Integer)
+    height = Column(Integer)
+    channels = Column(Integer)
+    codec = Column(String)  # jpeg, webp, png или raw
+    thumbnail = Column(LargeBinary)
+    # Число почти одинаковых обрезок, объединенных с этой записью, и время последней
+    seen_count = Column(Integer)
+    last_seen = Column(DateTime)
+
+# История обнаружений (SqlMovementRepository)
+class MovementRecord(Base):
+    __tablename__ = 'movements'
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime, nullable=False, index=True)
+    description = Column(String, nullable=False, index=True)
+    object_id = Column(Integer)
+
+# Колонки, добавленные после создания таблицы
+IMAGE_MIGRATION_COLUMNS = {
+    "width": "INTEGER",
+    "height": "INTEGER",
+    "channels": "INTEGER",
+    "codec": "VARCHAR",
+    "thumbnail": "BLOB",
+    "seen_count": "INTEGER",
+    "last_seen": "DATETIME",
+}
+
+def migrate_images_table(engine):
+    # create_all не меняет существующие таблицы, поэтому колонки добавляем сами
+    existing = {column["name"] for column in inspect(engine).get_columns("images")}
+    with engine.begin() as connection:
+        for name, column_type in IMAGE_MIGRATION_COLUMNS.items():
+            if name not in existing:
+                connection.execute(text(f"ALTER TABLE images ADD COLUMN {name} {column_type}"))
+        # Индексы для запросов по времени (в старых БД таблица создана без них)
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_images_timestamp ON images (timestamp)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_images_description ON images (description)"))
+
+def configure_sqlite(engine):
+    # WAL: чтение истории не блокируется записью; synchronous=NORMAL безопасен с WAL
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
 
 # Настройка базы данных 
 DATABASE_URL = 'sqlite:///images.db'
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    # Движок и таблицы создаются при первом обращении к БД, а не при импорте модуля
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+            configure_sqlite(engine)
+            Base.metadata.create_all(engine)
+            migrate_images_table(engine)
+            _engine = engine
+        return _engine
+
+def dispose_engine():
+    # Закрытие соединений при завершении; следующее обращение создаст движок заново
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+# Фабрика сессий с отложенным созданием движка (используется как sessionmaker)
+class LazySessionFactory:
+    def __init__(self, **options):
+        self.options = options
+        self._factory = None
+        self._engine = None
+
+    def __call__(self, **kwargs):
+        engine = get_engine()
+        if self._engine is not engine:
+            self._factory = sessionmaker(bind=engine, **self.options)
+            self._engine = engine
+        return self._factory(**kwargs)
 
-Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = LazySessionFactory(autocommit=False, autoflush=False)
 
 def get_db():
     db = SessionLocal()
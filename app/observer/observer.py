@@ -1,24 +1,133 @@
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Literal
 from loguru import logger
+from pydantic import BaseModel, PositiveInt, PositiveFloat
+import threading
+
+# Событие обнаружения: потребителям не нужно разбирать строку сообщения
+class DetectionEvent:
+    def __init__(self, message: str, timestamp, circles=(), stream_id=None, object_ids=()):
+        self.message = message
+        self.timestamp = timestamp
+        self.circles = [tuple(float(v) for v in circle) for circle in circles]  # (x, y, radius)
+        self.stream_id = stream_id
+        self.object_ids = list(object_ids)
+
+    def to_dict(self):
+        return {
+            "message": self.message,
+            "timestamp": self.timestamp.isoformat(),
+            "circles": self.circles,
+            "stream_id": None if self.stream_id is None else str(self.stream_id),
+            "object_ids": self.object_ids,
+        }
+
+    def __str__(self):
+        return self.message
 
 class Observer(ABC):
     @abstractmethod
     def update(self, message: str):
         pass
 
+class DispatchConfig(BaseModel):
+    """Асинхронная доставка событий наблюдателю"""
+    queue_size: PositiveInt = 100
+    # drop_oldest - вытеснять старые, drop_newest - отбрасывать новые,
+    # coalesce - хранить только последнее событие
+    policy: Literal["drop_oldest", "drop_newest", "coalesce"] = "drop_oldest"
+    timeout: PositiveFloat = 5  # Максимальное время update(), сек
+
+# Очередь и рабочий поток одного наблюдателя
+class ObserverDispatcher:
+    def __init__(self, observer: Observer, config: DispatchConfig):
+        self.observer = observer
+        self.config = config
+        self.queue = deque()
+        self.dropped = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"observer-{observer}")
+        self._thread.start()
+
+    def submit(self, event):
+        with self._condition:
+            if self.config.policy == "coalesce":
+                self.dropped += len(self.queue)
+                self.queue.clear()
+            elif len(self.queue) >= self.config.queue_size:
+                self.dropped += 1
+                if self.config.policy == "drop_newest":
+                    return
+                self.queue.popleft()
+            self.queue.append(event)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self.queue or self._stopped)
+                if not self.queue:
+                    return
+                event = self.queue.popleft()
+            future = self._executor.submit(self.observer.update, event)
+            try:
+                future.result(timeout=self.config.timeout)
+            except TimeoutError:
+                # Зависший update не задерживает следующие события
+                self.timeouts += 1
+                logger.warning(f"Observer {self.observer} timed out after {self.config.timeout}s")
+                self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Observer {self.observer} failed: {e}")
+
+    def close(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout=self.config.timeout)
+        self._executor.shutdown(wait=False)
+
 class Subject(ABC):
     def __init__(self):
         self._observers = []
+        self._dispatchers = {}  # id(observer) -> ObserverDispatcher
 
-    def attach(self, observer: Observer):
+    def attach(self, observer: Observer, dispatch: DispatchConfig = None):
+        # dispatch=None - синхронный вызов update(), иначе через очередь наблюдателя
         self._observers.append(observer)
+        if dispatch is not None:
+            self._dispatchers[id(observer)] = ObserverDispatcher(observer, dispatch)
         logger.info(f"Observer {observer} attached.")
 
     def detach(self, observer: Observer):
         self._observers.remove(observer)
+        dispatcher = self._dispatchers.pop(id(observer), None)
+        if dispatcher is not None:
+            dispatcher.close()
         logger.info(f"Observer {observer} detached.")
 
-    def notify(self, message: str):
-        logger.info(f"Notifying observers with message: {message}")
+    def close_observers(self):
+        # Остановка рабочих потоков асинхронных наблюдателей
+        for dispatcher in self._dispatchers.values():
+            dispatcher.close()
+        self._dispatchers.clear()
+
+    def notify(self, message):
+        logger.debug(f"Notifying observers with message: {message}")
         for observer in self._observers:
-            observer.update(message)
\ No newline at end of file
+            dispatcher = self._dispatchers.get(id(observer))
+            if dispatcher is not None:
+                dispatcher.submit(message)
+                continue
+            try:
+                observer.update(message)
+            except Exception as e:
+                logger.error(f"Observer {observer} failed: {e}")
@@ -0,0 +1,161 @@
+from collections import deque
+from typing import Literal
+from loguru import logger
+from pydantic import BaseModel, NonNegativeInt, PositiveInt, PositiveFloat
+import threading
+import cv2
+import numpy as np
+from app.repository.movement_repository import MovementRepository, Movement
+
+def _small_gray(image, width: int, height: int):
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+def dhash(image, size: int = 8) -> int:
+    """Разностный хеш: знак перепада яркости между соседними пикселями"""
+    small = _small_gray(image, size + 1, size).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def ahash(image, size: int = 8) -> int:
+    """Средний хеш: пиксели ярче среднего"""
+    small = _small_gray(image, size, size)
+    bits = (small > small.mean()).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+HASHES = {"dhash": dhash, "ahash": ahash}
+
+class DedupConfig(BaseModel):
+    """Объединение почти одинаковых обрезок одного потока"""
+    enabled: bool = True
+    method: Literal["dhash", "ahash"] = "dhash"
+    hash_size: PositiveInt = 8  # Хеш hash_size^2 бит
+    max_distance: NonNegativeInt = 6  # Расстояние Хэмминга, при котором обрезки считаются одинаковыми
+    window: PositiveFloat = 300  # Сколько секунд после последнего повтора хеш участвует в сравнении
+    max_recent: PositiveInt = 32  # Хешей в индексе на поток
+    flush_every: PositiveInt = 10  # Повторов, после которых счетчик записывается в БД
+
+# Сохраненная обрезка в индексе недавних хешей
+class RecentHash:
+    def __init__(self, value: int, movement: Movement):
+        self.value = value
+        self.movement = movement
+        self.last_seen = movement.timestamp
+        self.pending = 0  # Повторы, еще не записанные в БД
+
+# Репозиторий, который не сохраняет почти одинаковые обрезки повторно
+class DeduplicatingRepository(MovementRepository):
+    def __init__(self, repository: MovementRepository, config: DedupConfig = None):
+        self.repository = repository
+        self.config = config or DedupConfig()
+        self._hash = HASHES[self.config.method]
+        self._recent = {}  # stream_id -> deque[RecentHash]
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def add_movement(self, movement: Movement):
+        if self.config.enabled and movement.frame is not None:
+            value = self._hash(movement.frame, self.config.hash_size)
+            with self._lock:
+                entry, touches = self._match(movement, value)
+                if entry is not None:
+                    # Повтор: только счетчик и время последнего появления у исходной записи
+                    movement.duplicate_of = entry.movement
+                    entry.pending += 1
+                    entry.last_seen = movement.timestamp
+                    self.duplicates += 1
+                    if entry.pending >= self.config.flush_every:
+                        touches.append(self._take(entry))
+            self._touch(touches)
+            if entry is not None:
+                return
+        self.repository.add_movement(movement)
+
+    def _match(self, movement: Movement, value: int):
+        # Совпавшая запись индекса (или None) и счетчики вытесненных записей
+        recent = self._recent.setdefault(movement.stream_id, deque())
+        expired = []
+        # Записи без повторов дольше window больше не сравниваются
+        while recent and (movement.timestamp - recent[0].last_seen).total_seconds() > self.config.window:
+            expired.append(self._take(recent.popleft()))
+        best = min(recent, key=lambda entry: hamming(entry.value, value), default=None)
+        if best is not None and hamming(best.value, value) <= self.config.max_distance:
+            # Недавно совпавшие записи - в конце очереди
+            recent.remove(best)
+            recent.append(best)
+            return best, expired
+        recent.append(RecentHash(value, movement))
+        if len(recent) > self.config.max_recent:
+            expired.append(self._take(recent.popleft()))
+        return None, expired
+
+    @staticmethod
+    def _take(entry: RecentHash):
+        touch = (entry.movement, entry.last_seen, entry.pending)
+        entry.pending = 0
+        return touch
+
+    def _touch(self, touches):
+        touches = [touch for touch in touches if touch[2]]
+        if touches and hasattr(self.repository, "touch_images"):
+            self.repository.touch_images(touches)
+
+    def save_frame(self, movement: Movement, save_dir="saved_frames"):
+        if movement.duplicate_of is None:
+            self.repository.save_frame(movement, save_dir)
+
+    def save_image_to_db(self, movement: Movement):
+        if movement.duplicate_of is None:
+            self.repository.save_image_to_db(movement)
+
+    def get_movements(self):
+        return self.repository.get_movements()
+
+    def get_range(self, *args, **kwargs):
+        return self.repository.get_range(*args, **kwargs)
+
+    def latest(self, n: int):
+        return self.repository.latest(n)
+
+    def count(self, *args, **kwargs):
+        return self.repository.count(*args, **kwargs)
+
+    def clear_movements(self):
+        with self._lock:
+            self._recent.clear()
+        self.repository.clear_movements()
+
+    def flush_duplicates(self):
+        # Запись накопленных счетчиков повторов
+        with self._lock:
+            touches = [self._take(entry) for recent in self._recent.values() for entry in recent]
+        self._touch(touches)
+
+    def flush(self):
+        self.flush_duplicates()
+        if hasattr(self.repository, "flush"):
+            self.repository.flush()
+
+    def close(self):
+        self.flush_duplicates()
+        logger.info(f"Deduplication stopped, duplicates merged: {self.duplicates}")
+        if hasattr(self.repository, "close"):
+            self.repository.close()
+
+"""
+DeduplicatingRepository убирает повторное сохранение одного и того же
+объекта, пока он остается в кадре.
+- Для обрезки считается перцептивный хеш (dHash или aHash) по
+уменьшенному серому изображению и сравнивается с недавними хешами
+того же потока по расстоянию Хэмминга.
+- Почти одинаковая обрезка не пишется в saved_frames, movements и
+images: у исходной строки images увеличивается seen_count и
+обновляется last_seen (раз в flush_every повторов, при вытеснении
+хеша из индекса и при закрытии).
+- Хеш участвует в сравнении, пока повторы идут не реже чем раз
+в window секунд; индекс ограничен max_recent записями на поток.
+"""
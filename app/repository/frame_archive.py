@@ -0,0 +1,239 @@
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+from loguru import logger
+from pydantic import BaseModel, PositiveInt, PositiveFloat
+import mmap
+import os
+import threading
+import cv2
+import numpy as np
+from app.repository.image_codec import encode_image
+
+# Запись индекса сегмента: время кадра, смещение и длина JPEG, вид кадра
+INDEX_DTYPE = np.dtype([("timestamp", "<f8"), ("offset", "<u8"), ("length", "<u4"), ("kind", "u1")])
+KINDS = {"color": 0, "gray": 1}
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+class FrameArchiveConfig(BaseModel):
+    """Хранение сохраненных кадров в сегментах вместо отдельных файлов"""
+    root: str = "frame_archive"
+    rotate: Literal["day", "size"] = "day"  # Новый сегмент на каждый день или только по размеру
+    max_segment_bytes: PositiveInt = 256 * 1024 * 1024  # Размер сегмента, после которого он закрывается
+    retention_days: Optional[PositiveFloat] = None  # Сегменты старше удаляются (None - хранить все)
+    quality: PositiveInt = 95  # Качество JPEG (как у cv2.imwrite по умолчанию)
+
+def _time_key(timestamp: datetime) -> float:
+    return timestamp.timestamp()
+
+# Сегмент: файл с кадрами подряд и индекс записей фиксированного размера
+class Segment:
+    def __init__(self, root: str, name: str):
+        self.name = name
+        self.path = os.path.join(root, name + SEGMENT_SUFFIX)
+        self.index_path = os.path.join(root, name + INDEX_SUFFIX)
+        self.size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        records = np.fromfile(self.index_path, dtype=INDEX_DTYPE) if os.path.exists(self.index_path) \
+            else np.empty(0, INDEX_DTYPE)
+        # Записи индекса без данных (обрыв при записи) отбрасываются
+        complete = records["offset"] + records["length"] <= self.size
+        if not complete.all():
+            records = records[complete]
+            records.tofile(self.index_path)
+        self._records = records
+        self._pending = []  # Записи, добавленные после загрузки индекса
+        self._map = None
+
+    def records(self):
+        # Индекс, отсортированный по времени (кадры могут приходить не по порядку)
+        if self._pending:
+            added = np.array(self._pending, dtype=INDEX_DTYPE)
+            self._records = np.concatenate([self._records, added])
+            self._records.sort(order="timestamp", kind="stable")
+            self._pending = []
+        return self._records
+
+    def add(self, record):
+        self._pending.append(record)
+
+    def time_range(self):
+        records = self.records()
+        if not len(records):
+            return None
+        return float(records["timestamp"][0]), float(records["timestamp"][-1])
+
+    def read(self, offset: int, length: int) -> bytes:
+        # Чтение через mmap; отображение пересоздается, когда активный сегмент вырос
+        if self._map is None or len(self._map) < offset + length:
+            self.unmap()
+            with open(self.path, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[offset:offset + length]
+
+    def unmap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+# Архив кадров: дописывание в сегменты, индекс смещений, чтение через mmap
+class FrameArchive:
+    def __init__(self, config: FrameArchiveConfig = None):
+        self.config = config or FrameArchiveConfig()
+        self._lock = threading.Lock()
+        self._segments = []  # Сегменты по порядку создания, последний - активный
+        self._data_file = None
+        self._index_file = None
+        self._day = None
+        if os.path.isdir(self.config.root):
+            names = sorted(
+                name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.config.root)
+                if name.endswith(SEGMENT_SUFFIX)
+            )
+            self._segments = [Segment(self.config.root, name) for name in names]
+        self.apply_retention()
+
+    def _segment_name(self, timestamp: datetime) -> str:
+        # Имена сортируются в порядке создания: день и номер сегмента
+        prefix = timestamp.strftime("%Y-%m-%d") if self.config.rotate == "day" else "segment"
+        numbers = [int(s.name.rsplit("_", 1)[1]) for s in self._segments if s.name.startswith(prefix + "_")]
+        return f"{prefix}_{max(numbers, default=-1) + 1:06d}"
+
+    def _active(self, timestamp: datetime, length: int):
+        segment = self._segments[-1] if self._segments and self._data_file is not None else None
+        day = timestamp.date() if self.config.rotate == "day" else None
+        if segment is not None and day == self._day and (
+                segment.size == 0 or segment.size + length <= self.config.max_segment_bytes):
+            return segment
+        self._close_files()
+        os.makedirs(self.config.root, exist_ok=True)
+        segment = Segment(self.config.root, self._segment_name(timestamp))
+        self._segments.append(segment)
+        self._data_file = open(segment.path, "ab")
+        self._index_file = open(segment.index_path, "ab")
+        self._day = day
+        logger.info(f"Frame archive segment opened: {segment.path}")
+        self._remove_expired()
+        return segment
+
+    def append(self, timestamp: datetime, data: bytes, kind: str = "color"):
+        """Дописывание закодированного кадра в активный сегмент"""
+        with self._lock:
+            segment = self._active(timestamp, len(data))
+            offset = segment.size
+            self._data_file.write(data)
+            self._data_file.flush()
+            # Запись индекса после данных: при обрыве индекс не ссылается на неполный кадр
+            record = (_time_key(timestamp), offset, len(data), KINDS[kind])
+            self._index_file.write(np.array([record], dtype=INDEX_DTYPE).tobytes())
+            self._index_file.flush()
+            segment.size += len(data)
+            segment.add(record)
+        return segment.name, offset, len(data)
+
+    def append_frame(self, timestamp: datetime, frame, kind: str = "color"):
+        return self.append(timestamp, encode_image(frame, "jpeg", self.config.quality), kind)
+
+    def _find(self, timestamp: datetime, kind: str):
+        key = _time_key(timestamp)
+        for segment in reversed(self._segments):
+            records = segment.records()
+            timestamps = records["timestamp"]
+            position = int(np.searchsorted(timestamps, key, side="left"))
+            while position < len(records) and timestamps[position] == key:
+                if records["kind"][position] == KINDS[kind]:
+                    return segment, records[position]
+                position += 1
+        return None, None
+
+    def contains(self, timestamp: datetime, kind: str = "color") -> bool:
+        with self._lock:
+            return self._find(timestamp, kind)[0] is not None
+
+    def read(self, timestamp: datetime, kind: str = "color"):
+        """JPEG кадра с заданным временем или None"""
+        with self._lock:
+            segment, record = self._find(timestamp, kind)
+            if segment is None:
+                return None
+            return segment.read(int(record["offset"]), int(record["length"]))
+
+    def load(self, timestamp: datetime, kind: str = "color"):
+        """Декодированный кадр с заданным временем или None"""
+        data = self.read(timestamp, kind)
+        if data is None:
+            return None
+        flags = cv2.IMREAD_GRAYSCALE if kind == "gray" else cv2.IMREAD_COLOR
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+    def timestamps(self, start: datetime = None, end: datetime = None, kind: str = "color"):
+        """Время кадров в интервале [start, end) по возрастанию"""
+        low = -np.inf if start is None else _time_key(start)
+        high = np.inf if end is None else _time_key(end)
+        keys = []
+        with self._lock:
+            for segment in self._segments:
+                records = segment.records()
+                selected = records[(records["kind"] == KINDS[kind])]
+                keys.extend(selected["timestamp"][(selected["timestamp"] >= low) & (selected["timestamp"] < high)])
+        return [datetime.fromtimestamp(key) for key in sorted(keys)]
+
+    def apply_retention(self, now: datetime = None):
+        """Удаление закрытых сегментов, все кадры которых старше retention_days"""
+        with self._lock:
+            return self._remove_expired(now)
+
+    def _remove_expired(self, now: datetime = None):
+        if self.config.retention_days is None:
+            return 0
+        oldest_allowed = _time_key((now or datetime.now()) - timedelta(days=self.config.retention_days))
+        active = self._segments[-1] if self._data_file is not None else None
+        removed = 0
+        for segment in list(self._segments):
+            time_range = segment.time_range()
+            if segment is active or (time_range is not None and time_range[1] >= oldest_allowed):
+                continue
+            segment.unmap()
+            for path in (segment.path, segment.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._segments.remove(segment)
+            removed += 1
+        if removed:
+            logger.info(f"Frame archive retention removed segments: {removed}")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "bytes": sum(segment.size for segment in self._segments),
+                "frames": sum(len(segment.records()) for segment in self._segments),
+            }
+
+    def _close_files(self):
+        for file in (self._data_file, self._index_file):
+            if file is not None:
+                file.close()
+        self._data_file = self._index_file = None
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+            for segment in self._segments:
+                segment.unmap()
+
+"""
+FrameArchive заменяет отдельные файлы frame_<время>.jpg в saved_frames.
+- Закодированные кадры дописываются в активный сегмент (.seg), для
+каждого кадра в индекс (.idx) добавляется запись фиксированного размера:
+время, смещение, длина и вид кадра (цветной или серый).
+- Новый сегмент начинается каждый день (rotate="day") и при достижении
+max_segment_bytes, поэтому число файлов растет на два в день, а не на
+два на каждое обнаружение.
+- Индекс загружается при открытии архива; записи без данных после
+обрыва записи отбрасываются. Чтение кадра - бинарный поиск по времени
+и срез отображения сегмента в память (mmap).
+- apply_retention() удаляет закрытые сегменты старше retention_days
+(вызывается при открытии архива и при переходе на новый сегмент).
+Перенос существующего каталога saved_frames: app.tools.compact_frames.
+"""
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+# Расширения и параметры качества OpenCV для поддерживаемых кодеков
+CODECS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+    "png": (".png", None),
+}
+RAW_CODEC = "raw"  # Несжатые пиксели (строки, записанные до перехода на кодеки)
+
+def encode_image(frame, codec: str = "jpeg", quality: int = 90) -> bytes:
+    if codec not in CODECS:
+        raise ValueError(f"Unknown image codec: {codec}")
+    extension, quality_flag = CODECS[codec]
+    params = [quality_flag, quality] if quality_flag is not None else [cv2.IMWRITE_PNG_COMPRESSION, 3]
+    ret, buffer = cv2.imencode(extension, frame, params)
+    if not ret:
+        raise ValueError(f"Cannot encode image as {codec}")
+    return buffer.tobytes()
+
+def make_thumbnail(frame, size: int = 96, quality: int = 80) -> bytes:
+    # Миниатюра по большей стороне для списков и предпросмотра
+    height, width = frame.shape[:2]
+    scale = min(1.0, size / max(height, width))
+    if scale < 1:
+        frame = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    return encode_image(frame, "jpeg", quality)
+
+def image_shape(frame):
+    height, width = frame.shape[:2]
+    channels = 1 if frame.ndim == 2 else frame.shape[2]
+    return width, height, channels
+
+def decode_image(data: bytes, codec: str = "jpeg", width: int = None, height: int = None,
+                 channels: int = 3):
+    """Декодирование изображения из БД в ndarray (BGR или оттенки серого)"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if codec == RAW_CODEC:
+        if width is None or height is None:
+            raise ValueError("Raw image requires width and height")
+        shape = (height, width) if channels == 1 else (height, width, channels)
+        return buffer.reshape(shape)
+    flags = cv2.IMREAD_GRAYSCALE if channels == 1 else cv2.IMREAD_COLOR
+    return cv2.imdecode(buffer, flags)
+
+def guess_raw_shape(size: int, channels: int = 3):
+    # Старые строки хранили квадратную обрезку BGR без размеров
+    side = int(round((size / channels) ** 0.5))
+    if side * side * channels == size:
+        return side, side
+    return None
+
+"""
+Кодирование изображений для таблицы images: вместо несжатых пикселей
+хранится JPEG/WebP/PNG с размерами, числом каналов и кодеком, а также
+небольшая JPEG-миниатюра. decode_image восстанавливает ndarray по
+сохраненным метаданным (в том числе для старых строк с кодеком raw).
+"""
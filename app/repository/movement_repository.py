@@ -1,17 +1,29 @@
 # movement_repository.py
+from collections import OrderedDict
 from datetime import datetime
 from loguru import logger
+import bisect
 import os
+import threading
+import time
 import cv2
 from abc import ABC, abstractmethod
-from app.models import get_db, Image  # Импортируем необходимые функции и классы
+from app.models import SessionLocal, Image  # Импортируем необходимые функции и классы
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from app.repository.image_codec import encode_image, make_thumbnail, image_shape
 
 class Movement:
-    def __init__(self, timestamp: datetime, description: str, frame=None):
+    def __init__(self, timestamp: datetime, description: str, frame=None, object_id: int = None,
+                 movement_id: int = None, stream_id=None):
         self.timestamp = timestamp
         self.description = description
         self.frame = frame  # Сохраняем необработанный кадр
+        self.object_id = object_id  # Идентификатор трека (режим сопровождения)
+        self.movement_id = movement_id  # Идентификатор записи в репозитории
+        self.stream_id = stream_id  # Источник кадра (ключ хаба)
+        self.image_id = None  # Идентификатор строки images после save_image_to_db
+        self.duplicate_of = None  # Ранее сохраненное движение, если обрезка почти такая же
 
 class MovementRepository(ABC):
     @abstractmethod
@@ -22,22 +34,67 @@ class MovementRepository(ABC):
     def get_movements(self):
         pass
 
-class InMemoryMovementRepository(MovementRepository):
-    def __init__(self):
-        self.movements = []
+    def add_movements(self, movements):
+        # Пакетное добавление; реализации с транзакциями переопределяют
+        for movement in movements:
+            self.add_movement(movement)
 
-    def add_movement(self, movement: Movement):
-        self.movements.append(movement)
-        logger.info(f"Movement added: {movement.timestamp}, Description: {movement.description}")
+    # Запросы по времени: start включительно, end не включительно.
+    # end_id - ключ курсора (end, end_id): записи ровно в end с movement_id < end_id
+    # тоже входят в выдачу; start_id - курсор (start, start_id): из записей ровно в start
+    # входят только записи с movement_id > start_id.
+    # Порядок - по времени, при равном времени по movement_id.
+    # Реализация по умолчанию перебирает get_movements()
+    def get_range(self, start: datetime = None, end: datetime = None, limit: int = None,
+                  offset: int = 0, descending: bool = False, end_id: int = None, start_id: int = None):
+        movements = sorted(
+            (m for m in self.get_movements()
+             if (start is None or m.timestamp > start or (
+                 m.timestamp == start and (start_id is None or (m.movement_id or 0) > start_id))) and (
+                 end is None or m.timestamp < end
+                 or (end_id is not None and m.timestamp == end and (m.movement_id or 0) < end_id))),
+            key=lambda m: (m.timestamp, m.movement_id or 0), reverse=descending
+        )
+        return movements[offset:None if limit is None else offset + limit]
+
+    def latest(self, n: int):
+        return self.get_range(limit=n, descending=True)
+
+    def count(self, start: datetime = None, end: datetime = None):
+        return len(self.get_range(start, end))
+
+# Строка таблицы images с закодированным изображением и метаданными
+def make_image_row(movement: Movement, codec="jpeg", quality=90, thumbnail_size=96):
+    width, height, channels = image_shape(movement.frame)
+    return Image(
+        timestamp=movement.timestamp,
+        description=movement.description,
+        image_data=encode_image(movement.frame, codec, quality),
+        width=width,
+        height=height,
+        channels=channels,
+        codec=codec,
+        thumbnail=make_thumbnail(movement.frame, thumbnail_size) if thumbnail_size else None,
+        seen_count=1,
+        last_seen=movement.timestamp
+    )
+
+# Общая часть репозиториев: файлы кадров и изображения в таблице images
+class ImageStorageRepository(MovementRepository):
+    def __init__(self, image_codec="jpeg", image_quality=90, thumbnail_size=96,
+                 session_factory=SessionLocal, frame_archive=None):
+        # Формат изображений в БД (thumbnail_size=0 - без миниатюр)
+        self.image_codec = image_codec
+        self.image_quality = image_quality
+        self.thumbnail_size = thumbnail_size
+        self.session_factory = session_factory
+        # FrameArchive: кадры дописываются в сегменты архива вместо файлов в save_dir
+        self.frame_archive = frame_archive
 
-    def get_movements(self):
-        logger.info("Retrieving movements.")
-        return self.movements
-    
-    def clear_movements(self):
-        self.movements = []
-    
     def save_frame(self, movement: Movement, save_dir="saved_frames"):
+        if self.frame_archive is not None:
+            self.archive_frame(movement)
+            return
         try:
             if not os.path.exists(save_dir):
                 os.makedirs(save_dir)  # Создаем директорию, если не существует
@@ -61,18 +118,189 @@ class InMemoryMovementRepository(MovementRepository):
             logger.info(f"Saved gray frame: {gray_frame_filename}")
         except Exception as e:
             logger.error(f"Error saving frame: {e}")
+
+    def archive_frame(self, movement: Movement):
+        try:
+            gray_frame = cv2.cvtColor(movement.frame, cv2.COLOR_BGR2GRAY)
+            self.frame_archive.append_frame(movement.timestamp, movement.frame, "color")
+            self.frame_archive.append_frame(movement.timestamp, gray_frame, "gray")
+            logger.info(f"Archived frame: {movement.timestamp.isoformat()}")
+        except Exception as e:
+            logger.error(f"Error archiving frame: {e}")
     
     def save_image_to_db(self, movement: Movement):
+        self.save_images_to_db([movement])
+
+    def save_images_to_db(self, movements):
+        # Пакетная запись: одна сессия и одна транзакция на все изображения
+        db: Session = self.session_factory()
         try:
-            db: Session = next(get_db())
-            db_image = Image(timestamp=movement.timestamp, description=movement.description, image_data=movement.frame.tobytes())
-            db.add(db_image)
+            db_images = [
+                make_image_row(movement, self.image_codec, self.image_quality, self.thumbnail_size)
+                for movement in movements
+            ]
+            db.add_all(db_images)
+            db.flush()  # Идентификаторы известны до commit, без повторных SELECT
+            image_ids = [image.id for image in db_images]
             db.commit()
-            db.refresh(db_image)
-            logger.info(f"Image saved to database with ID: {db_image.id}")
+            for movement, image_id in zip(movements, image_ids):
+                movement.image_id = image_id
+            logger.info(f"Images saved to database with IDs: {image_ids}")
         except Exception as e:
+            db.rollback()
             logger.error(f"Error saving to the db: {e}")
+        finally:
+            db.close()
+
+    def touch_images(self, touches):
+        """Учет повторов: [(movement, last_seen, count), ...] для уже записанных изображений"""
+        touches = [touch for touch in touches if touch[0].image_id is not None]
+        if not touches:
+            return
+        db: Session = self.session_factory()
+        try:
+            for movement, last_seen, count in touches:
+                db.query(Image).filter(Image.id == movement.image_id).update({
+                    Image.seen_count: func.coalesce(Image.seen_count, 1) + count,
+                    Image.last_seen: last_seen,
+                }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error updating images: {e}")
+        finally:
+            db.close()
+
+def _time_key(timestamp: datetime) -> float:
+    # Единый ключ сортировки для наивных (локальное время) и aware меток
+    return timestamp.timestamp()
+
+class InMemoryMovementRepository(ImageStorageRepository):
+    def __init__(self, max_count: int = 10000, max_age: float = None,
+                 max_frame_bytes: int = 256 * 1024 * 1024, **image_options):
+        super().__init__(**image_options)
+        # Ограничения кольцевого буфера: число записей, возраст (сек), объем кадров
+        self.max_count = max_count
+        self.max_age = max_age
+        self.max_frame_bytes = max_frame_bytes
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        # Индекс, отсортированный по времени; записи до _head уже вытеснены
+        self._keys = []
+        self._entries = []
+        self._head = 0
+        self._frames = OrderedDict()  # movement_id -> кадр, хранится отдельно от метаданных
+        self.frame_bytes = 0
+        self.evicted = 0
+        self._next_id = 1
+
+    def add_movement(self, movement: Movement):
+        # В индексе хранится копия метаданных; кадр - в отдельном хранилище
+        entry = Movement(
+            timestamp=movement.timestamp,
+            description=movement.description,
+            object_id=movement.object_id
+        )
+        with self._lock:
+            entry.movement_id = movement.movement_id = self._next_id
+            self._next_id += 1
+            key = _time_key(entry.timestamp)
+            if not self._keys or key >= self._keys[-1]:
+                self._keys.append(key)
+                self._entries.append(entry)
+            else:
+                position = bisect.bisect_right(self._keys, key, lo=self._head)
+                self._keys.insert(position, key)
+                self._entries.insert(position, entry)
+            if movement.frame is not None:
+                self._frames[entry.movement_id] = movement.frame
+                self.frame_bytes += movement.frame.nbytes
+            self._evict()
+        logger.info(f"Movement added: {movement.timestamp}, Description: {movement.description}")
+
+    def _evict(self):
+        oldest_allowed = None if self.max_age is None else time.time() - self.max_age
+        while self._head < len(self._keys) and (
+            len(self._keys) - self._head > self.max_count
+            or (oldest_allowed is not None and self._keys[self._head] < oldest_allowed)
+        ):
+            entry = self._entries[self._head]
+            self._entries[self._head] = None
+            self._head += 1
+            self.evicted += 1
+            self._drop_frame(entry.movement_id)
+        # Кадры вытесняются раньше метаданных, если превышен объем
+        while self.frame_bytes > self.max_frame_bytes and self._frames:
+            self._drop_frame(next(iter(self._frames)))
+        # Сжатие списков, когда вытесненных записей больше половины
+        if self._head > 1024 and self._head * 2 > len(self._keys):
+            del self._keys[:self._head]
+            del self._entries[:self._head]
+            self._head = 0
+
+    def _drop_frame(self, movement_id):
+        frame = self._frames.pop(movement_id, None)
+        if frame is not None:
+            self.frame_bytes -= frame.nbytes
+
+    def get_frame(self, movement_id: int):
+        """Кадр записи или None, если он уже вытеснен"""
+        with self._lock:
+            return self._frames.get(movement_id)
 
+    def get_movements(self):
+        logger.info("Retrieving movements.")
+        return self.get_range()
+
+    def _bounds(self, start: datetime = None, end: datetime = None, end_id: int = None, start_id: int = None):
+        low = self._head if start is None else bisect.bisect_left(self._keys, _time_key(start), lo=self._head)
+        high = len(self._keys) if end is None else bisect.bisect_left(self._keys, _time_key(end), lo=self._head)
+        if start is not None and start_id is not None:
+            key = _time_key(start)
+            while low < len(self._keys) and self._keys[low] == key and self._entries[low].movement_id <= start_id:
+                low += 1
+        if end is not None and end_id is not None:
+            # Записи с одинаковым временем идут в порядке movement_id
+            key = _time_key(end)
+            while high < len(self._keys) and self._keys[high] == key and self._entries[high].movement_id < end_id:
+                high += 1
+        return low, max(low, high)
+
+    def get_range(self, start: datetime = None, end: datetime = None, limit: int = None,
+                  offset: int = 0, descending: bool = False, end_id: int = None, start_id: int = None):
+        # Границы интервала находятся бинарным поиском, копируется только срез
+        with self._lock:
+            low, high = self._bounds(start, end, end_id, start_id)
+            if descending:
+                high -= offset
+                low = low if limit is None else max(low, high - limit)
+                return self._entries[low:high][::-1]
+            low += offset
+            high = high if limit is None else min(high, low + limit)
+            return self._entries[low:high]
+
+    def latest(self, n: int):
+        return self.get_range(limit=n, descending=True)
+
+    def count(self, start: datetime = None, end: datetime = None):
+        with self._lock:
+            low, high = self._bounds(start, end)
+            return high - low
+
+    def stats(self):
+        with self._lock:
+            return {
+                "movements": len(self._keys) - self._head,
+                "frames": len(self._frames),
+                "frame_bytes": self.frame_bytes,
+                "evicted": self.evicted,
+            }
+    
+    def clear_movements(self):
+        with self._lock:
+            self._clear()
 
 # Создание глобального репозитория
 #global_repository = InMemoryMovementRepository()
\ No newline at end of file
@@ -0,0 +1,323 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Literal
+from loguru import logger
+from pydantic import BaseModel, PositiveInt, PositiveFloat
+import glob
+import os
+import queue
+import threading
+import uuid
+import weakref
+import numpy as np
+from app.repository.movement_repository import MovementRepository, Movement
+
+class PersistenceConfig(BaseModel):
+    """Конфигурация отложенной записи кадров и изображений"""
+    max_queue: PositiveInt = 256  # Максимум задач в очереди записи
+    batch_size: PositiveInt = 32  # Изображений в одной транзакции БД
+    encode_workers: PositiveInt = 2  # Потоков для кодирования и записи JPEG
+    overflow: Literal["drop", "block", "spill"] = "block"
+    block_timeout: PositiveFloat = 5  # Ожидание места в очереди для overflow="block"
+    spill_dir: str = "persistence_spill"  # Каталог для overflow="spill"
+    retry_interval: PositiveFloat = 1  # Пауза перед повторной записью движений после ошибки
+
+# Репозиторий с отложенной записью: save_frame и save_image_to_db выполняются
+# фоновым потоком, детектор не ждет диска и commit SQLite
+class WriteBehindRepository(MovementRepository):
+    def __init__(self, repository: MovementRepository, config: PersistenceConfig = None):
+        self.repository = repository
+        self.config = config or PersistenceConfig()
+        self.queue = queue.Queue(maxsize=self.config.max_queue)
+        self.dropped = 0
+        self.spilled = 0
+        self._spill_lock = threading.Lock()
+        # Файл на диске -> исходное движение: image_id после записи попадает в объект,
+        # на который ссылаются дедупликация и детектор
+        self._spill_sources = weakref.WeakValueDictionary()
+        self._spill_sources_lock = threading.Lock()
+        self._deferred_touches = []  # Повторы изображений, которые еще лежат в spill_dir
+        self._encoders = ThreadPoolExecutor(
+            max_workers=self.config.encode_workers, thread_name_prefix="frame-writer"
+        )
+        # Движения пишутся фоновым потоком пакетами (add_movements); чтение
+        # истории сначала дописывает накопленные движения. Буфер ограничен
+        # max_queue, при переполнении действует та же политика overflow
+        self._movements = []
+        self._movements_lock = threading.Condition()
+        self._movement_writes = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, daemon=True, name="persistence-writer")
+        self._writer.start()
+
+    def add_movement(self, movement: Movement):
+        if self._closed:
+            raise RuntimeError("Persistence queue is closed")
+        limit = self.config.max_queue
+        with self._movements_lock:
+            if self.config.overflow == "block":
+                self._movements_lock.wait_for(lambda: len(self._movements) < limit, self.config.block_timeout)
+            accepted = len(self._movements) < limit
+            if accepted:
+                wake = not self._movements
+                self._movements.append(movement)
+        if not accepted:
+            if self.config.overflow == "spill":
+                self._spill(("movement", movement, None))
+            else:
+                self.dropped += 1
+                logger.warning("Persistence queue is full, movement task dropped")
+            return
+        if wake:
+            # Пробуждение фонового потока; если очередь полна, он и так занят
+            # и запишет движения вместе со следующим пакетом
+            try:
+                self.queue.put_nowait(("movements", None, None))
+            except queue.Full:
+                pass
+
+    def _write_movements(self):
+        """Накопленные движения одной транзакцией; True, если буфер записан"""
+        with self._movement_writes:
+            with self._movements_lock:
+                movements, self._movements = self._movements, []
+            if not movements:
+                return True
+            try:
+                self.repository.add_movements(movements)
+            except Exception as e:
+                # Пакет возвращается в начало буфера и записывается повторно, порядок сохраняется
+                with self._movements_lock:
+                    self._movements[:0] = movements
+                logger.error(f"Error saving {len(movements)} movements, will retry: {e}")
+                return False
+            with self._movements_lock:
+                self._movements_lock.notify_all()
+            return True
+
+    def depth(self) -> int:
+        """Задач в очереди и движений, ожидающих записи"""
+        with self._movements_lock:
+            return self.queue.qsize() + len(self._movements)
+
+    def get_movements(self):
+        self._write_movements()
+        return self.repository.get_movements()
+
+    def clear_movements(self):
+        self._write_movements()
+        self.repository.clear_movements()
+
+    def get_range(self, *args, **kwargs):
+        self._write_movements()
+        return self.repository.get_range(*args, **kwargs)
+
+    def latest(self, n: int):
+        self._write_movements()
+        return self.repository.latest(n)
+
+    def count(self, *args, **kwargs):
+        self._write_movements()
+        return self.repository.count(*args, **kwargs)
+
+    def save_frame(self, movement: Movement, save_dir="saved_frames"):
+        self._enqueue(("frame", movement, save_dir))
+
+    def save_image_to_db(self, movement: Movement):
+        self._enqueue(("db", movement, None))
+
+    def touch_images(self, touches):
+        # Выполняется после записи изображений, поставленных в очередь раньше
+        for movement, last_seen, count in touches:
+            self._enqueue(("touch", movement, (last_seen, count)))
+
+    def _enqueue(self, item):
+        if self._closed:
+            raise RuntimeError("Persistence queue is closed")
+        try:
+            if self.config.overflow == "block":
+                self.queue.put(item, timeout=self.config.block_timeout)
+            else:
+                self.queue.put_nowait(item)
+        except queue.Full:
+            if self.config.overflow == "spill" and item[0] != "touch":
+                self._spill(item)
+            else:
+                self.dropped += 1
+                logger.warning(f"Persistence queue is full, {item[0]} task dropped")
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.config.retry_interval)
+            except queue.Empty:
+                # Повтор записи движений, если предыдущая попытка не удалась
+                self._write_movements()
+                continue
+            if item is None:
+                self.queue.task_done()
+                break
+            batch = [item]
+            # Забираем все, что накопилось, но не больше batch_size
+            while len(batch) < self.config.batch_size:
+                try:
+                    next_item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_item is None:
+                    self.queue.put(None)  # Остановка после записи текущего пакета
+                    self.queue.task_done()
+                    break
+                batch.append(next_item)
+            try:
+                self._write(batch)
+            except Exception as e:
+                # Ошибка пакета не останавливает фоновый поток
+                logger.error(f"Error writing persistence batch: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if self.queue.empty():
+                try:
+                    self._drain_spill()
+                except Exception as e:
+                    logger.error(f"Error writing spilled tasks: {e}")
+
+    def _write(self, batch):
+        self._write_movements()
+        movements = [item[1] for item in batch if item[0] == "movement"]
+        if movements:
+            self.repository.add_movements(movements)
+        frames = [item for item in batch if item[0] == "frame"]
+        images = [item[1] for item in batch if item[0] == "db"]
+        touches = self._ready_touches([(movement, *extra) for kind, movement, extra in batch if kind == "touch"])
+        # Кадры кодируются параллельно (cv2.imwrite отпускает GIL), пока идет запись в БД
+        futures = [
+            self._encoders.submit(self.repository.save_frame, movement, save_dir)
+            for _, movement, save_dir in frames
+        ]
+        if images:
+            self.repository.save_images_to_db(images)
+        if touches:
+            self.repository.touch_images(touches)
+        wait(futures)
+
+    def _ready_touches(self, touches):
+        # Повтор изображения, сохраненного на диск, откладывается до его записи:
+        # без image_id репозиторий пропустил бы счетчик
+        with self._spill_sources_lock:
+            pending = {id(movement) for movement in self._spill_sources.values()}
+            ready = []
+            for touch in touches:
+                if touch[0].image_id is None and id(touch[0]) in pending:
+                    self._deferred_touches.append(touch)
+                else:
+                    ready.append(touch)
+        return ready
+
+    def _spill(self, item):
+        # Задача сохраняется на диск и будет записана, когда очередь освободится
+        kind, movement, save_dir = item
+        os.makedirs(self.config.spill_dir, exist_ok=True)
+        path = os.path.join(self.config.spill_dir, f"{kind}_{uuid.uuid4().hex}.npz")
+        # Файл появляется под именем *.npz только целиком: поток записи не читает его недописанным
+        # Движение может быть без кадра: массив frame тогда не сохраняется
+        frame = {} if movement.frame is None else {"frame": movement.frame}
+        with open(path + ".part", "wb") as file:
+            np.savez(
+                file, timestamp=movement.timestamp.isoformat(),
+                description=movement.description, save_dir=save_dir or "",
+                object_id=-1 if movement.object_id is None else movement.object_id, **frame
+            )
+        with self._spill_sources_lock:
+            self._spill_sources[path] = movement
+        os.replace(path + ".part", path)
+        self.spilled += 1
+
+    def _drain_spill(self):
+        with self._spill_lock:
+            paths = sorted(glob.glob(os.path.join(self.config.spill_dir, "*.npz")))
+            for start in range(0, len(paths), self.config.batch_size):
+                batch = []
+                for path in paths[start:start + self.config.batch_size]:
+                    with np.load(path) as data:
+                        save_dir = str(data["save_dir"]) or None
+                        with self._spill_sources_lock:
+                            movement = self._spill_sources.get(path)
+                        if movement is None:
+                            # Исходного объекта уже нет (или файл остался от прошлого запуска)
+                            object_id = int(data["object_id"])
+                            movement = Movement(
+                                timestamp=datetime.fromisoformat(str(data["timestamp"])),
+                                description=str(data["description"]),
+                                frame=data["frame"] if "frame" in data else None,
+                                object_id=None if object_id < 0 else object_id
+                            )
+                    kind = os.path.basename(path).split("_", 1)[0]
+                    batch.append((kind, movement, save_dir))
+                self._write(batch)
+                with self._spill_sources_lock:
+                    for path in paths[start:start + self.config.batch_size]:
+                        os.remove(path)
+                        self._spill_sources.pop(path, None)
+            self._write_deferred_touches()
+
+    def _write_deferred_touches(self):
+        with self._spill_sources_lock:
+            touches, self._deferred_touches = self._deferred_touches, []
+        touches = self._ready_touches(touches)
+        if touches:
+            self.repository.touch_images(touches)
+
+    def _spill_movements(self):
+        # БД недоступна при остановке: движения остаются в spill_dir до следующего запуска
+        with self._movements_lock:
+            movements, self._movements = self._movements, []
+        if self.config.overflow != "spill":
+            self.dropped += len(movements)
+            logger.error(f"Database unavailable on close, {len(movements)} movements lost")
+            return
+        for movement in movements:
+            self._spill(("movement", movement, None))
+
+    def flush(self):
+        """Дождаться записи всех задач из очереди и с диска"""
+        self.queue.join()
+        self._drain_spill()
+        self._write_movements()
+
+    def close(self):
+        # Корректное завершение: все принятые задачи записываются до остановки
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(None)
+        self._writer.join()
+        self._drain_spill()
+        if not self._write_movements():
+            self._spill_movements()
+        self._encoders.shutdown(wait=True)
+        logger.info(f"Persistence queue closed, dropped: {self.dropped}, spilled: {self.spilled}")
+
+"""
+WriteBehindRepository оборачивает репозиторий и переносит запись движений
+(add_movement), кадров (save_frame) и изображений в БД (save_image_to_db)
+в фоновый поток.
+- Движения накапливаются в памяти и пишутся пакетом (add_movements)
+фоновым потоком; запросы истории сначала дописывают накопленные
+движения, поэтому добавленное движение сразу видно в выдаче. Буфер
+движений ограничен max_queue с той же политикой переполнения; пакет,
+который не удалось записать, возвращается в буфер и записывается
+повторно (раз в retry_interval и при следующем flush).
+- Очередь ограничена max_queue; при переполнении задача отбрасывается
+(drop), ожидает места (block) или сохраняется в spill_dir (spill)
+и записывается позже.
+- Фоновый поток собирает пакеты до batch_size задач: изображения
+пишутся в БД одной транзакцией (save_images_to_db), JPEG кодируются
+параллельно в пуле потоков.
+- Задача из spill_dir записывается для исходного объекта движения,
+поэтому image_id доходит до дедупликации; повторы изображения,
+которое еще лежит на диске, применяются после его записи.
+- flush() дожидается записи всех задач, close() вызывается при
+завершении приложения, чтобы не потерять обнаружения.
+"""
@@ -0,0 +1,110 @@
+from contextlib import contextmanager
+from datetime import datetime
+from loguru import logger
+from sqlalchemy import and_, func, or_
+from app.models import SessionLocal, MovementRecord
+from app.repository.movement_repository import ImageStorageRepository, Movement
+
+def _to_movement(record: MovementRecord) -> Movement:
+    return Movement(
+        timestamp=record.timestamp,
+        description=record.description,
+        object_id=record.object_id,
+        movement_id=record.id
+    )
+
+# Репозиторий движений в SQLite: история переживает перезапуск сервера
+class SqlMovementRepository(ImageStorageRepository):
+    def __init__(self, session_factory=SessionLocal, **image_options):
+        super().__init__(session_factory=session_factory, **image_options)
+
+    @contextmanager
+    def _session(self):
+        # Одна сессия на операцию: commit при успехе, rollback при ошибке, всегда close
+        db = self.session_factory()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def add_movement(self, movement: Movement):
+        self.add_movements([movement])
+
+    def add_movements(self, movements):
+        # Пакетная вставка одной транзакцией
+        with self._session() as db:
+            records = [
+                MovementRecord(
+                    timestamp=movement.timestamp,
+                    description=movement.description,
+                    object_id=movement.object_id
+                )
+                for movement in movements
+            ]
+            db.add_all(records)
+            db.flush()  # Идентификаторы известны до commit, как в save_images_to_db
+            ids = [record.id for record in records]
+        for movement, movement_id in zip(movements, ids):
+            movement.movement_id = movement_id
+        # Одна строка журнала на пакет, а не на каждую запись
+        if movements:
+            logger.info(f"Movements added: {len(movements)}, last: {movements[-1].timestamp}")
+
+    def get_movements(self):
+        logger.info("Retrieving movements.")
+        return self.get_range()
+
+    def _filtered(self, db, start: datetime = None, end: datetime = None, end_id: int = None,
+                  start_id: int = None):
+        query = db.query(MovementRecord)
+        if start is not None and start_id is not None:
+            # Курсор (start, start_id): продолжение после последней выданной записи
+            query = query.filter(or_(
+                MovementRecord.timestamp > start,
+                and_(MovementRecord.timestamp == start, MovementRecord.id > start_id)
+            ))
+        elif start is not None:
+            query = query.filter(MovementRecord.timestamp >= start)
+        if end is not None and end_id is not None:
+            # Курсор (end, end_id): записи с тем же временем и меньшим id не пропускаются
+            query = query.filter(or_(
+                MovementRecord.timestamp < end,
+                and_(MovementRecord.timestamp == end, MovementRecord.id < end_id)
+            ))
+        elif end is not None:
+            query = query.filter(MovementRecord.timestamp < end)
+        return query
+
+    def get_range(self, start: datetime = None, end: datetime = None, limit: int = None,
+                  offset: int = 0, descending: bool = False, end_id: int = None, start_id: int = None):
+        if descending:
+            order = (MovementRecord.timestamp.desc(), MovementRecord.id.desc())
+        else:
+            order = (MovementRecord.timestamp, MovementRecord.id)
+        with self._session() as db:
+            query = self._filtered(db, start, end, end_id, start_id).order_by(*order)
+            if offset:
+                query = query.offset(offset)
+            if limit is not None:
+                query = query.limit(limit)
+            return [_to_movement(record) for record in query]
+
+    def count(self, start: datetime = None, end: datetime = None):
+        with self._session() as db:
+            return self._filtered(db, start, end).with_entities(func.count(MovementRecord.id)).scalar()
+
+    def clear_movements(self):
+        with self._session() as db:
+            db.query(MovementRecord).delete()
+
+"""
+SqlMovementRepository хранит историю обнаружений в таблице movements
+(индексы по timestamp и description) и выполняет запросы по интервалу
+времени, с limit/offset и подсчетом на стороне SQLite. Каждая операция
+открывает и закрывает свою сессию; движок SQLite работает в режиме WAL
+(configure_sqlite), поэтому чтение истории не блокируется записью.
+"""
@@ -0,0 +1,60 @@
+import argparse
+from loguru import logger
+from app.models import SessionLocal, Image
+from app.repository.image_codec import RAW_CODEC, decode_image, encode_image, guess_raw_shape, make_thumbnail
+
+def backfill_images(codec="jpeg", quality=90, thumbnail_size=96, batch_size=100):
+    """Перекодирование строк images без метаданных (несжатые пиксели BGR)"""
+    converted = skipped = 0
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(Image)
+                .filter(Image.codec.is_(None), Image.id > last_id)
+                .order_by(Image.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for row in rows:
+                last_id = row.id
+                shape = guess_raw_shape(len(row.image_data))
+                if shape is None:
+                    # Размер неизвестен: помечаем как raw, чтобы не обрабатывать повторно
+                    row.codec = RAW_CODEC
+                    skipped += 1
+                    continue
+                width, height = shape
+                frame = decode_image(row.image_data, RAW_CODEC, width, height, 3)
+                row.image_data = encode_image(frame, codec, quality)
+                row.width, row.height, row.channels, row.codec = width, height, 3, codec
+                row.thumbnail = make_thumbnail(frame, thumbnail_size) if thumbnail_size else None
+                converted += 1
+            db.commit()
+        finally:
+            db.close()
+    logger.info(f"Images backfill finished, converted: {converted}, unknown shape: {skipped}")
+    return converted, skipped
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перекодирование старых изображений в таблице images")
+    parser.add_argument("--codec", default="jpeg", choices=["jpeg", "webp", "png"])
+    parser.add_argument("--quality", type=int, default=90)
+    parser.add_argument("--thumbnail-size", type=int, default=96)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args(argv)
+    backfill_images(args.codec, args.quality, args.thumbnail_size, args.batch_size)
+
+if __name__ == "__main__":
+    main()
+
+"""
+Миграция данных таблицы images:
+python -m app.tools.backfill_images --codec jpeg --quality 90
+Колонки добавляются автоматически (migrate_images_table), а этот
+инструмент перекодирует строки, записанные до перехода на кодеки.
+Строки, размер которых определить нельзя, получают кодек raw.
+"""
@@ -0,0 +1,234 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+import cv2
+from loguru import logger
+from app.detectors.circle_detector import CircleDetector, CircleDetectorConfig, sharpen_image
+from app.repository.movement_repository import InMemoryMovementRepository, MovementRepository, Movement
+
+# Фрагмент видеофайла для одного процесса: кадры [start, end), end=None - до конца файла
+class VideoChunk:
+    def __init__(self, path: str, start: int, end: Optional[int], fps: float):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.fps = fps
+
+def probe_video(path: str):
+    """Число кадров (0, если контейнер его не сообщает) и частота кадров видеофайла"""
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video file: {path}")
+        frames = max(0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    finally:
+        capture.release()
+    return frames, fps
+
+def split_video(path: str, chunk_seconds: float = 60):
+    frames, fps = probe_video(path)
+    if frames <= 0:
+        # Число кадров неизвестно (VFR, нет индекса): файл читается одним фрагментом подряд
+        logger.warning(f"Frame count of {path} is unknown, reading it sequentially")
+        return [VideoChunk(path, 0, None, fps)]
+    chunk_frames = max(1, int(chunk_seconds * fps))
+    chunks = [VideoChunk(path, start, min(frames, start + chunk_frames), fps)
+              for start in range(0, frames, chunk_frames)]
+    # Число кадров может быть оценкой: последний фрагмент читается до конца файла
+    chunks[-1].end = None
+    return chunks
+
+def seek(capture, path: str, start: int):
+    """Переход к кадру start; если контейнер не поддерживает точный переход - чтение с начала"""
+    if start == 0:
+        return capture
+    capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+    if int(capture.get(cv2.CAP_PROP_POS_FRAMES)) == start:
+        return capture
+    logger.warning(f"Inaccurate seek in {path}, skipping {start} frames sequentially")
+    capture.release()
+    capture = cv2.VideoCapture(path)
+    for _ in range(start):
+        if not capture.grab():
+            break
+    return capture
+
+def crop_circle(frame, x, y, radius):
+    # Обрезка как в CircleDetector.process_frame: 2.5 радиуса вокруг круга
+    half = int(2.5 * radius) // 2
+    x, y = int(x), int(y)
+    cropped = frame[max(0, y - half):min(frame.shape[0], y + half),
+                    max(0, x - half):min(frame.shape[1], x + half)]
+    return sharpen_image(cropped.copy())
+
+def analyze_chunk(chunk: VideoChunk, config_data: dict, sample_every: int = 1, with_frames: bool = False):
+    """Поиск кругов во фрагменте без отрисовки и кодирования:
+    (прочитано кадров, обнаружения, пройдено кадров файла)"""
+    detector = CircleDetector(repository=InMemoryMovementRepository(),
+                              config=CircleDetectorConfig(**config_data))
+    capture = cv2.VideoCapture(chunk.path)
+    detections = []
+    frames_read = 0
+    position = chunk.start  # Следующий непрочитанный кадр
+    indices = itertools.count(chunk.start) if chunk.end is None else range(chunk.start, chunk.end)
+    try:
+        capture = seek(capture, chunk.path, chunk.start)
+        for index in indices:
+            # Номер кадра считается от начала файла, поэтому выборка не зависит от деления на фрагменты
+            if index % sample_every:
+                if not capture.grab():  # Пропуск без декодирования
+                    break
+                position = index + 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            position = index + 1
+            frames_read += 1
+            circles = detector.detect_circles(frame)
+            if circles is None or len(circles[0]) == 0:
+                continue
+            detection = {
+                "video": chunk.path,
+                "frame": index,
+                "time": round(index / chunk.fps, 3),
+                "circles": [[round(float(v), 1) for v in circle] for circle in circles[0]],
+            }
+            if with_frames:
+                detection["crop"] = crop_circle(frame, *circles[0, -1])
+            detections.append(detection)
+    finally:
+        capture.release()
+    if chunk.end is not None and position < chunk.end:
+        # Файл закончился раньше, чем сообщил контейнер
+        logger.warning(f"{chunk.path}: chunk [{chunk.start}, {chunk.end}) ended at frame {position}")
+    return frames_read, detections, position - chunk.start
+
+def iter_detections(paths, config: CircleDetectorConfig = None, workers: int = None,
+                    chunk_seconds: float = 60, sample_every: int = 1, with_frames: bool = False,
+                    stats: dict = None):
+    """Обнаружения по всем файлам в порядке времени; workers=0 - в текущем процессе"""
+    config_data = (config or CircleDetectorConfig()).model_dump()
+    workers = os.cpu_count() if workers is None else workers
+    chunks = [chunk for path in paths for chunk in split_video(path, chunk_seconds)]
+    stats = stats if stats is not None else {}
+    # Длительность считается по кадрам, которые действительно пройдены
+    stats.update(chunks=len(chunks), frames_read=0, video_seconds=0.0)
+    if workers == 0:
+        for chunk in chunks:
+            frames_read, detections, covered = analyze_chunk(chunk, config_data, sample_every, with_frames)
+            stats["frames_read"] += frames_read
+            stats["video_seconds"] += covered / chunk.fps
+            yield from detections
+        return
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(analyze_chunk, chunk, config_data, sample_every, with_frames)
+                   for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            frames_read, detections, covered = future.result()
+            stats["frames_read"] += frames_read
+            stats["video_seconds"] += covered / chunk.fps
+            yield from detections
+
+def recording_start(path: str):
+    # Время начала записи: время изменения файла минус длительность
+    frames, fps = probe_video(path)
+    return datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=frames / fps)
+
+def analyze_videos(paths, config: CircleDetectorConfig = None, workers: int = None,
+                   chunk_seconds: float = 60, sample_every: int = 1, output=None,
+                   repository: MovementRepository = None, start_times: dict = None):
+    """Пакетный анализ файлов: обнаружения пишутся в JSONL (output) и/или в репозиторий"""
+    start_times = dict(start_times or {})
+    for path in paths:
+        start_times.setdefault(path, recording_start(path))
+    stats = {}
+    detections_count = 0
+    started = time.perf_counter()
+    for detection in iter_detections(paths, config, workers, chunk_seconds, sample_every,
+                                     with_frames=repository is not None, stats=stats):
+        detections_count += 1
+        timestamp = start_times[detection["video"]] + timedelta(seconds=detection["time"])
+        crop = detection.pop("crop", None)
+        if output is not None:
+            output.write(json.dumps({**detection, "timestamp": timestamp.isoformat()}) + "\n")
+        if repository is not None:
+            movement = Movement(timestamp=timestamp, description="Circle detected in frame", frame=crop)
+            repository.add_movement(movement)
+            repository.save_image_to_db(movement)
+    elapsed = time.perf_counter() - started
+    summary = {
+        "videos": len(paths),
+        "chunks": stats["chunks"],
+        "frames_read": stats["frames_read"],
+        "detections": detections_count,
+        "video_seconds": round(stats["video_seconds"], 1),
+        "elapsed_seconds": round(elapsed, 2),
+        "speed": round(stats["video_seconds"] / elapsed, 1) if elapsed else None,  # Во сколько раз быстрее реального времени
+    }
+    logger.info(f"Batch analysis finished: {summary}")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный поиск кругов в записанных видеофайлах")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--workers", type=int, default=None, help="Процессов (по умолчанию число ядер)")
+    parser.add_argument("--chunk-seconds", type=float, default=60)
+    parser.add_argument("--sample-every", type=int, default=1, help="Анализировать каждый N-й кадр")
+    parser.add_argument("--output", help="Файл JSONL с обнаружениями (по умолчанию stdout)")
+    parser.add_argument("--repository", action="store_true",
+                        help="Сохранять обнаружения в БД (movements и images)")
+    parser.add_argument("--config", help="JSON с параметрами CircleDetectorConfig")
+    args = parser.parse_args(argv)
+
+    config_data = {}
+    if args.config:
+        with open(args.config) as file:
+            config_data = json.load(file)
+    repository = None
+    if args.repository:
+        from app.repository.sql_repository import SqlMovementRepository
+        repository = SqlMovementRepository()
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        summary = analyze_videos(args.videos, CircleDetectorConfig(**config_data), args.workers,
+                                 args.chunk_seconds, max(1, args.sample_every), output, repository)
+    finally:
+        if args.output:
+            output.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
+
+"""
+Пакетный анализ записанного видео без /video_feed:
+python -m app.tools.batch_analyze cam1.mp4 cam2.mp4 --workers 8 --sample-every 5 --output detections.jsonl
+- Каждый файл делится на фрагменты по chunk_seconds, фрагменты
+обрабатываются параллельно в процессах (spawn); результаты выдаются
+в порядке времени.
+- Кадры не переворачиваются, не размечаются и не кодируются в JPEG:
+выполняется только CircleDetector.detect_circles (с учетом
+detection_scale и refine), координаты - в системе исходного файла.
+Фильтр движения и сопровождение работают на живых потоках и здесь
+не применяются: каждый кадр анализируется независимо.
+- Если контейнер не сообщает число кадров (VFR, нет индекса), файл
+читается одним фрагментом подряд; последний фрагмент всегда читается
+до конца файла, а переход к началу фрагмента проверяется и при
+неточном переходе заменяется последовательным чтением.
+- --sample-every N анализирует каждый N-й кадр, остальные пропускаются
+через grab() без декодирования.
+- Обнаружения пишутся в JSONL (файл, кадр, время от начала, круги,
+timestamp) и/или с --repository в БД: движение и обрезанный кадр
+в images. Время начала записи - время изменения файла минус его
+длительность (в API можно задать start_times).
+"""
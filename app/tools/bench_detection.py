@@ -0,0 +1,64 @@
+import argparse
+import json
+import time
+from app.detectors.circle_detector import CircleDetector, CircleDetectorConfig
+from app.repository.movement_repository import InMemoryMovementRepository
+from app.tools.synthetic import generate_dataset, match_circles
+
+def run_detection(dataset, config: CircleDetectorConfig):
+    """Время поиска кругов на кадр и полнота/точность относительно разметки"""
+    detector = CircleDetector(repository=InMemoryMovementRepository(), config=config)
+    true_positive = false_positive = false_negative = 0
+    started = time.perf_counter()
+    for frame, truth in dataset:
+        tp, fp, fn = match_circles(detector.detect_circles(frame), truth)
+        true_positive += tp
+        false_positive += fp
+        false_negative += fn
+    elapsed = (time.perf_counter() - started) / len(dataset)
+    return {
+        "ms_per_frame": round(elapsed * 1000, 2),
+        "fps": round(1 / elapsed, 1),
+        "recall": round(true_positive / max(1, true_positive + false_negative), 3),
+        "precision": round(true_positive / max(1, true_positive + false_positive), 3),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение HoughCircles на полном и уменьшенном кадре")
+    parser.add_argument("--resolution", default="1080p")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5, 0.25])
+    parser.add_argument("--refine", action="store_true")
+    parser.add_argument("--param2", type=int, default=None,
+                        help="param2 для полного разрешения (по умолчанию из конфигурации)")
+    parser.add_argument("--detection-param2", type=int, default=None,
+                        help="Порог для уменьшенного кадра (по умолчанию равен param2)")
+    args = parser.parse_args(argv)
+
+    dataset = generate_dataset(args.resolution, args.frames)
+    overrides = {} if args.param2 is None else {"param2": args.param2}
+    if args.detection_param2 is not None:
+        overrides["detection_param2"] = args.detection_param2
+    baseline = None
+    for scale in args.scales:
+        config = CircleDetectorConfig(detection_scale=scale, refine=args.refine, **overrides)
+        threshold = config.param2 if scale >= 1 else (config.detection_param2 or config.param2)
+        result = {"resolution": args.resolution, "scale": scale, "refine": args.refine,
+                  "param2": threshold, **run_detection(dataset, config)}
+        baseline = baseline or result["ms_per_frame"]
+        result["speedup"] = round(baseline / result["ms_per_frame"], 2)
+        print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
+
+"""
+Бенчмарк поиска кругов на синтетических кадрах:
+python -m app.tools.bench_detection --resolution 1080p --scales 1.0 0.5 0.25
+Первый масштаб в списке считается базовым для расчета ускорения.
+Полнота и точность сравниваются, а не только время: с тем же param2
+уменьшенный кадр находит другой набор кругов (720p, param2=60: recall
+0.33 на 1.0 и 1.0 на 0.5). Порог для уменьшенного кадра подбирается
+через --detection-param2, чтобы recall и precision совпали с полным
+разрешением на записях своей камеры.
+"""
@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+from loguru import logger
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.detectors.circle_detector import CircleDetector, CircleDetectorConfig, sharpen_image
+from app.models import Base, configure_sqlite
+from app.repository.movement_repository import InMemoryMovementRepository, Movement
+from app.tools.synthetic import generate_dataset, match_circles
+
+# Этапы конвейера в порядке выполнения в CaptureSource и CircleDetector
+STAGES = ["flip", "preprocess", "hough", "detect", "sharpen", "imencode", "save_frame", "save_image_to_db"]
+
+def summarize(samples):
+    """Статистика задержек этапа по замерам в секундах"""
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+        "throughput_fps": round(1000 / float(values.mean()), 1) if values.mean() > 0 else None,
+    }
+
+def time_stage(func, inputs, repeat=1):
+    # Каждый вход обрабатывается repeat раз, замеряется каждый вызов
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            started = time.perf_counter()
+            func(item)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+def crop_for(frame, truth):
+    # Обрезка как в CircleDetector.process_frame: 2.5 радиуса вокруг круга
+    height, width = frame.shape[:2]
+    x, y, radius = truth[-1] if truth else (width // 2, height // 2, height // 5)
+    half = int(2.5 * radius) // 2
+    return frame[max(0, y - half):min(height, y + half), max(0, x - half):min(width, x + half)].copy()
+
+def benchmark_pipeline(resolution="1080p", frames=20, repeat=3, config: CircleDetectorConfig = None,
+                       stages=None, workdir=None, seed=0):
+    """Задержки этапов конвейера и точность детекции на синтетическом наборе"""
+    config = config or CircleDetectorConfig()
+    stages = stages or STAGES
+    dataset = generate_dataset(resolution, frames, seed=seed)
+    images = [frame for frame, _ in dataset]
+    detector = CircleDetector(repository=InMemoryMovementRepository(), config=config)
+    grays = [cv2.medianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 5) for frame in images]
+    crops = [crop_for(frame, truth) for frame, truth in dataset]
+    start = datetime(2024, 1, 1)
+    movements = [
+        Movement(timestamp=start + timedelta(seconds=index), description="Circle detected in frame",
+                 frame=crop)
+        for index, crop in enumerate(crops)
+    ]
+
+    results = {}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        # Запись идет во временный каталог и отдельную БД, рабочая images.db не меняется
+        db_engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        configure_sqlite(db_engine)
+        Base.metadata.create_all(db_engine)
+        storage = InMemoryMovementRepository(session_factory=sessionmaker(bind=db_engine))
+        frames_dir = os.path.join(tmp, "saved_frames")
+        stage_functions = {
+            "flip": (lambda frame: cv2.flip(frame, 1), images),
+            "preprocess": (lambda frame: cv2.medianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 5), images),
+            "hough": (detector._hough, grays),
+            "detect": (detector.detect_circles, images),
+            "sharpen": (sharpen_image, crops),
+            "imencode": (lambda frame: cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95]), images),
+            "save_frame": (lambda movement: storage.save_frame(movement, save_dir=frames_dir), movements),
+            "save_image_to_db": (storage.save_image_to_db, movements),
+        }
+        logger.disable("app")  # Логирование каждого сохранения исказило бы замеры
+        try:
+            for name in stages:
+                func, inputs = stage_functions[name]
+                func(inputs[0])  # Прогрев: создание каталогов, соединение с БД
+                # Этапы записи выполняются один раз на кадр, чтобы не переписывать те же файлы
+                stage_repeat = 1 if name.startswith("save") else repeat
+                results[name] = summarize(time_stage(func, inputs, stage_repeat))
+        finally:
+            logger.enable("app")
+            db_engine.dispose()
+
+    true_positive = false_positive = false_negative = 0
+    for frame, truth in dataset:
+        tp, fp, fn = match_circles(detector.detect_circles(frame), truth)
+        true_positive += tp
+        false_positive += fp
+        false_negative += fn
+    return {
+        "resolution": resolution,
+        "frames": frames,
+        "repeat": repeat,
+        "seed": seed,
+        "config": config.model_dump(),
+        "stages": results,
+        "accuracy": {
+            "true_positive": true_positive,
+            "false_positive": false_positive,
+            "false_negative": false_negative,
+            "recall": round(true_positive / max(1, true_positive + false_negative), 3),
+            "precision": round(true_positive / max(1, true_positive + false_positive), 3),
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+    }
+
+def compare_results(current, baseline, tolerance=0.2):
+    """Регрессии относительно сохраненного результата: рост p50 больше tolerance, падение точности"""
+    regressions = []
+    for name, stats in current["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if previous and stats["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {previous['p50_ms']} -> {stats['p50_ms']} ms")
+    for metric in ("recall", "precision"):
+        previous = baseline.get("accuracy", {}).get(metric)
+        if previous is not None and current["accuracy"][metric] < previous:
+            regressions.append(f"{metric}: {previous} -> {current['accuracy'][metric]}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Задержки этапов конвейера детекции")
+    parser.add_argument("--resolutions", nargs="+", default=["480p", "720p", "1080p"])
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--detection-scale", type=float, default=None)
+    parser.add_argument("--param2", type=int, default=None,
+                        help="param2 для HoughCircles (по умолчанию из конфигурации)")
+    parser.add_argument("--output", help="Файл для результатов (JSON)")
+    parser.add_argument("--baseline", help="Результаты предыдущего запуска для поиска регрессий")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Допустимый рост p50 относительно baseline")
+    args = parser.parse_args(argv)
+
+    overrides = {name: value for name, value in
+                 (("detection_scale", args.detection_scale), ("param2", args.param2))
+                 if value is not None}
+    config = CircleDetectorConfig(**overrides)
+    runs = []
+    for resolution in args.resolutions:
+        run = benchmark_pipeline(resolution, args.frames, args.repeat, config, args.stages)
+        runs.append(run)
+        print(json.dumps({"resolution": resolution, "accuracy": run["accuracy"],
+                          **{name: stats["p50_ms"] for name, stats in run["stages"].items()}}))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"runs": runs}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = {run["resolution"]: run for run in json.load(file)["runs"]}
+        regressions = []
+        for run in runs:
+            if run["resolution"] in baseline:
+                regressions += [f"{run['resolution']} {item}"
+                                for item in compare_results(run, baseline[run["resolution"]], args.tolerance)]
+        for item in regressions:
+            print(f"REGRESSION {item}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+"""
+Бенчмарк этапов конвейера на синтетических кадрах:
+python -m app.tools.bench_pipeline --resolutions 720p 1080p --output bench.json
+Для каждого разрешения замеряются flip, предобработка (cvtColor и
+medianBlur), HoughCircles, полный поиск кругов, sharpen_image, кодирование
+JPEG, save_frame и save_image_to_db (во временный каталог и БД).
+Результат - JSON с p50/p99, пропускной способностью этапов и
+полнотой/точностью детекции относительно разметки. С --baseline
+результаты сравниваются с предыдущим запуском, при регрессии код
+возврата 1.
+"""
@@ -0,0 +1,77 @@
+import argparse
+import os
+import re
+from datetime import datetime
+from loguru import logger
+from app.repository.frame_archive import FrameArchive, FrameArchiveConfig
+
+# Имена файлов, которые пишет ImageStorageRepository.save_frame
+FRAME_NAME = re.compile(r"^frame_(?:(gray)_)?(.+)\.jpg$")
+
+def scan_saved_frames(source_dir: str):
+    """Файлы кадров каталога: [(время, вид, путь), ...] по возрастанию времени"""
+    frames = []
+    for name in os.listdir(source_dir):
+        match = FRAME_NAME.match(name)
+        if match is None:
+            continue
+        try:
+            timestamp = datetime.fromisoformat(match.group(2))
+        except ValueError:
+            continue
+        frames.append((timestamp, "gray" if match.group(1) else "color", os.path.join(source_dir, name)))
+    frames.sort(key=lambda frame: (frame[0], frame[1]))
+    return frames
+
+def migrate_saved_frames(source_dir: str, archive: FrameArchive, delete: bool = False):
+    """Перенос JPEG из source_dir в архив без перекодирования; повторный запуск пропускает перенесенные"""
+    migrated = skipped = failed = 0
+    for timestamp, kind, path in scan_saved_frames(source_dir):
+        with open(path, "rb") as file:
+            data = file.read()
+        if archive.contains(timestamp, kind):
+            skipped += 1
+        elif data:
+            archive.append(timestamp, data, kind)
+            migrated += 1
+        else:
+            failed += 1
+            continue
+        # Файл удаляется только после проверки содержимого в архиве
+        if delete and archive.read(timestamp, kind) == data:
+            os.remove(path)
+    logger.info(f"Frames migration finished, migrated: {migrated}, already archived: {skipped}, empty: {failed}")
+    return migrated, skipped, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перенос saved_frames в архив кадров")
+    parser.add_argument("--source", default="saved_frames")
+    parser.add_argument("--archive", default=FrameArchiveConfig().root)
+    parser.add_argument("--rotate", default="day", choices=["day", "size"])
+    parser.add_argument("--max-segment-mb", type=int, default=256)
+    parser.add_argument("--retention-days", type=float, default=None)
+    parser.add_argument("--delete", action="store_true", help="Удалить перенесенные файлы")
+    args = parser.parse_args(argv)
+    archive = FrameArchive(FrameArchiveConfig(
+        root=args.archive, rotate=args.rotate,
+        max_segment_bytes=args.max_segment_mb * 1024 * 1024, retention_days=args.retention_days,
+    ))
+    try:
+        migrate_saved_frames(args.source, archive, args.delete)
+        archive.apply_retention()
+    finally:
+        archive.close()
+
+if __name__ == "__main__":
+    main()
+
+"""
+Перенос каталога saved_frames в архив кадров:
+python -m app.tools.compact_frames --source saved_frames --archive frame_archive --delete
+- Файлы frame_<время>.jpg и frame_gray_<время>.jpg дописываются в
+сегменты архива по возрастанию времени без перекодирования JPEG.
+- Кадры, которые уже есть в архиве, не дублируются, поэтому перенос
+можно прервать и запустить снова.
+- С --delete исходный файл удаляется после того, как его содержимое
+прочитано из архива; с --retention-days сегменты старше срока удаляются.
+"""
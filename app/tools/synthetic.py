@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+
+# Разрешения, на которых работают камеры
+RESOLUTIONS = {
+    "480p": (640, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+def draw_gauge(frame, x, y, radius, rng):
+    # Циферблат манометра: светлый диск, темный обод, риски и стрелка
+    cv2.circle(frame, (x, y), radius, (215, 215, 215), -1, cv2.LINE_AA)
+    cv2.circle(frame, (x, y), radius, (40, 40, 40), max(2, radius // 15), cv2.LINE_AA)
+    for angle in np.linspace(0.75 * np.pi, 2.25 * np.pi, 11):
+        outer = (int(x + 0.85 * radius * np.cos(angle)), int(y + 0.85 * radius * np.sin(angle)))
+        inner = (int(x + 0.7 * radius * np.cos(angle)), int(y + 0.7 * radius * np.sin(angle)))
+        cv2.line(frame, inner, outer, (30, 30, 30), 2, cv2.LINE_AA)
+    angle = rng.uniform(0.75 * np.pi, 2.25 * np.pi)
+    tip = (int(x + 0.65 * radius * np.cos(angle)), int(y + 0.65 * radius * np.sin(angle)))
+    cv2.line(frame, (x, y), tip, (0, 0, 200), 3, cv2.LINE_AA)
+
+def make_frame(width, height, circles, noise=8.0, seed=0):
+    """Кадр с манометрами в заданных позициях (x, y, radius)"""
+    rng = np.random.default_rng(seed)
+    # Фон: градиент освещения и несколько прямоугольников (трубы, щиты)
+    gradient = np.linspace(60, 120, width, dtype=np.float32)
+    frame = np.repeat(np.tile(gradient, (height, 1))[:, :, None], 3, axis=2)
+    for _ in range(4):
+        x0, y0 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        x1, y1 = x0 + int(rng.integers(40, width // 3)), y0 + int(rng.integers(20, height // 6))
+        color = tuple(float(c) for c in rng.integers(50, 170, size=3))
+        cv2.rectangle(frame, (x0, y0), (x1, y1), color, -1)
+    for x, y, radius in circles:
+        draw_gauge(frame, int(x), int(y), int(radius), rng)
+    if noise:
+        frame += rng.normal(0, noise, frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+def random_circles(width, height, count, rng, min_radius=None, max_radius=None):
+    # Неперекрывающиеся круги, целиком лежащие в кадре
+    min_radius = min_radius or max(75, height // 8)
+    max_radius = max_radius or max(min_radius + 1, height // 4)
+    circles = []
+    for _ in range(count * 50):
+        if len(circles) == count:
+            break
+        radius = int(rng.integers(min_radius, max_radius))
+        x = int(rng.integers(radius + 5, width - radius - 5))
+        y = int(rng.integers(radius + 5, height - radius - 5))
+        if all((x - cx) ** 2 + (y - cy) ** 2 > (radius + cr + 20) ** 2 for cx, cy, cr in circles):
+            circles.append((x, y, radius))
+    return circles
+
+def generate_dataset(resolution="1080p", count=20, max_circles=2, noise=8.0, seed=0):
+    """Детерминированный набор кадров с разметкой: [(frame, [(x, y, r), ...]), ...]"""
+    width, height = RESOLUTIONS.get(resolution, resolution)
+    rng = np.random.default_rng(seed)
+    dataset = []
+    for index in range(count):
+        circles = random_circles(width, height, int(rng.integers(0, max_circles + 1)), rng)
+        dataset.append((make_frame(width, height, circles, noise, seed + index), circles))
+    return dataset
+
+def match_circles(detected, truth, tolerance=0.2):
+    """Сопоставление найденных кругов с разметкой: (true_positive, false_positive, false_negative)"""
+    detected = [] if detected is None else [tuple(c) for c in np.asarray(detected).reshape(-1, 3)]
+    unmatched = list(truth)
+    true_positive = 0
+    for x, y, radius in detected:
+        for gt in unmatched:
+            gx, gy, gr = gt
+            if (np.hypot(x - gx, y - gy) <= tolerance * gr and abs(radius - gr) <= tolerance * gr):
+                unmatched.remove(gt)
+                true_positive += 1
+                break
+    return true_positive, len(detected) - true_positive, len(unmatched)
+
+"""
+Генератор синтетических кадров для бенчмарков и подбора параметров.
+Кадры детерминированы (seed), содержат манометры известного радиуса
+и положения на фоне с градиентом, помехами и шумом. match_circles
+считает совпадения найденных кругов с разметкой для оценки
+полноты (recall) и точности (precision).
+"""
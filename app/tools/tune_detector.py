@@ -0,0 +1,232 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from pydantic import ValidationError
+from app.detectors.circle_detector import CircleDetector, CircleDetectorConfig, preprocess_gray
+from app.repository.movement_repository import InMemoryMovementRepository
+from app.tools.synthetic import generate_dataset, match_circles
+
+# Параметры HoughCircles, по которым идет перебор
+SEARCH_PARAMS = ["dp", "min_dist", "param1", "param2", "min_radius", "max_radius", "detection_scale"]
+
+def load_frames_dataset(folder: str):
+    """Каталог кадров с разметкой labels.json: {"имя файла": [[x, y, r], ...]}"""
+    with open(os.path.join(folder, "labels.json")) as file:
+        labels = json.load(file)
+    dataset = []
+    for name, circles in sorted(labels.items()):
+        frame = cv2.imread(os.path.join(folder, name))
+        if frame is None:
+            raise ValueError(f"Cannot read frame: {name}")
+        dataset.append((frame, [tuple(circle) for circle in circles]))
+    return dataset
+
+def load_clip_dataset(video: str, labels_path: str):
+    """Видеофрагмент и разметка JSONL: {"frame": номер, "circles": [[x, y, r], ...]}"""
+    labels = {}
+    with open(labels_path) as file:
+        for line in file:
+            if line.strip():
+                item = json.loads(line)
+                labels[item["frame"]] = [tuple(circle) for circle in item["circles"]]
+    capture = cv2.VideoCapture(video)
+    dataset = []
+    try:
+        index = 0
+        while index <= max(labels, default=-1):
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if index in labels:  # Используются только размеченные кадры
+                dataset.append((frame, labels[index]))
+            index += 1
+    finally:
+        capture.release()
+    return dataset
+
+def build_candidates(grid: dict, base: CircleDetectorConfig, samples: int = None, seed: int = 0):
+    """Конфигурации полного перебора или samples случайных точек сетки; недопустимые пропускаются"""
+    names = list(grid)
+    combos = list(itertools.product(*(grid[name] for name in names)))
+    if samples is not None and samples < len(combos):
+        combos = random.Random(seed).sample(combos, samples)
+    candidates = []
+    for combo in combos:
+        values = dict(zip(names, combo))
+        if values.get("min_radius", base.min_radius) >= values.get("max_radius", base.max_radius):
+            continue
+        try:
+            candidates.append(CircleDetectorConfig(**{**base.model_dump(), **values}))
+        except ValidationError:
+            continue
+    return candidates
+
+def prepare_cache(dataset, scales, cache_dir: str):
+    """Подготовленные кадры для каждого масштаба сохраняются один раз (.npy, чтение через mmap)"""
+    cache = {}
+    grays = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame, _ in dataset]
+    # Кадры разного разрешения не складываются в один массив: один .npy на размер кадра
+    groups = {}
+    for index, gray in enumerate(grays):
+        groups.setdefault(gray.shape, []).append(index)
+    for scale in sorted(set(scales)):
+        started = time.perf_counter()
+        prepared = [preprocess_gray(gray, scale) for gray in grays]
+        # Стоимость подготовки на кадр добавляется к стоимости каждой конфигурации
+        preprocess_ms = (time.perf_counter() - started) * 1000 / len(grays)
+        paths, locations = [], [None] * len(grays)
+        for group, indices in enumerate(groups.values()):
+            path = os.path.join(cache_dir, f"prepared_{scale}_{group}.npy")
+            np.save(path, np.stack([prepared[index] for index in indices]))
+            paths.append(path)
+            for position, index in enumerate(indices):
+                locations[index] = (group, position)
+        cache[scale] = {"paths": paths, "locations": locations, "preprocess_ms": preprocess_ms}
+    return cache
+
+_worker_frames = {}
+
+def _load_prepared(path):
+    # В каждом процессе файл открывается один раз; страницы общие через кэш ОС
+    if path not in _worker_frames:
+        _worker_frames[path] = np.load(path, mmap_mode="r")
+    return _worker_frames[path]
+
+def evaluate_config(config_data: dict, cache_entry: dict, truths, repeat: int = 1):
+    """Полнота, точность и стоимость кадра для одной конфигурации на подготовленных кадрах"""
+    config = CircleDetectorConfig(**config_data)
+    detector = CircleDetector(repository=InMemoryMovementRepository(), config=config)
+    frames = [_load_prepared(path) for path in cache_entry["paths"]]
+    scale = config.detection_scale
+    true_positive = false_positive = false_negative = 0
+    elapsed = 0.0
+    for index, truth in enumerate(truths):
+        group, position = cache_entry["locations"][index]
+        prepared = np.ascontiguousarray(frames[group][position])
+        for _ in range(repeat):
+            started = time.perf_counter()
+            circles = detector.find_circles(prepared, scale)
+            elapsed += time.perf_counter() - started
+        tp, fp, fn = match_circles(circles, truth)
+        true_positive += tp
+        false_positive += fp
+        false_negative += fn
+    hough_ms = elapsed * 1000 / (len(truths) * repeat)
+    return {
+        "config": {name: config_data[name] for name in SEARCH_PARAMS},
+        "recall": round(true_positive / max(1, true_positive + false_negative), 3),
+        "precision": round(true_positive / max(1, true_positive + false_positive), 3),
+        "ms_per_frame": round(cache_entry["preprocess_ms"] + hough_ms, 3),
+        "hough_ms": round(hough_ms, 3),
+    }
+
+def dominates(a, b) -> bool:
+    # a не хуже b по полноте, точности и стоимости и лучше хотя бы по одному из них
+    higher = [(a["recall"], b["recall"]), (a["precision"], b["precision"]), (b["ms_per_frame"], a["ms_per_frame"])]
+    return all(x >= y for x, y in higher) and any(x > y for x, y in higher)
+
+def pareto_front(results):
+    """Недоминируемые конфигурации (больше полнота и точность, меньше стоимость), по возрастанию стоимости"""
+    front = [r for r in results if not any(dominates(other, r) for other in results)]
+    return sorted(front, key=lambda r: (r["ms_per_frame"], -r["recall"], -r["precision"]))
+
+def tune(dataset, grid: dict, base: CircleDetectorConfig = None, samples: int = None,
+         workers: int = None, min_recall: float = 0.9, min_precision: float = 0.0,
+         repeat: int = 1, seed: int = 0):
+    """Параллельный перебор конфигураций; best - самая дешевая с recall/precision не ниже порогов"""
+    base = base or CircleDetectorConfig()
+    candidates = build_candidates(grid, base, samples, seed)
+    truths = [truth for _, truth in dataset]
+    workers = os.cpu_count() if workers is None else workers
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = prepare_cache(dataset, [c.detection_scale for c in candidates], cache_dir)
+        tasks = [(c.model_dump(), cache[c.detection_scale], truths, repeat) for c in candidates]
+        if workers == 0:
+            results = [evaluate_config(*task) for task in tasks]
+        else:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                results = list(pool.map(evaluate_config, *zip(*tasks))) if tasks else []
+        _worker_frames.clear()  # Файлы кэша удаляются вместе с каталогом
+    acceptable = [r for r in results if r["recall"] >= min_recall and r["precision"] >= min_precision]
+    best = min(acceptable, key=lambda r: r["ms_per_frame"]) if acceptable else None
+    return {
+        "candidates": len(candidates),
+        "frames": len(dataset),
+        "best": best,
+        "pareto": pareto_front(results),
+        "results": sorted(results, key=lambda r: r["ms_per_frame"]),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Подбор параметров CircleDetectorConfig по размеченным кадрам")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--frames", help="Каталог кадров с labels.json")
+    source.add_argument("--clip", help="Видеофрагмент (разметка в --labels)")
+    source.add_argument("--synthetic", help="Синтетический набор заданного разрешения (480p, 720p, 1080p)")
+    parser.add_argument("--labels", help="Разметка для --clip (JSONL)")
+    parser.add_argument("--dp", type=float, nargs="+")
+    parser.add_argument("--min-dist", type=int, nargs="+")
+    parser.add_argument("--param1", type=int, nargs="+")
+    parser.add_argument("--param2", type=int, nargs="+", default=[30, 40, 60, 100, 150])
+    parser.add_argument("--min-radius", type=int, nargs="+")
+    parser.add_argument("--max-radius", type=int, nargs="+")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1.0, 0.5, 0.25])
+    parser.add_argument("--samples", type=int, help="Случайный поиск: число точек сетки")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=1, help="Повторов замера на кадр")
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--min-precision", type=float, default=0.0)
+    parser.add_argument("--output", help="Файл для лучшей конфигурации (JSON)")
+    args = parser.parse_args(argv)
+
+    if args.frames:
+        dataset = load_frames_dataset(args.frames)
+    elif args.clip:
+        if not args.labels:
+            parser.error("--clip requires --labels")
+        dataset = load_clip_dataset(args.clip, args.labels)
+    else:
+        dataset = generate_dataset(args.synthetic, 20)
+    grid = {name: values for name, values in (
+        ("dp", args.dp), ("min_dist", args.min_dist), ("param1", args.param1), ("param2", args.param2),
+        ("min_radius", args.min_radius), ("max_radius", args.max_radius), ("detection_scale", args.scale),
+    ) if values}
+    report = tune(dataset, grid, samples=args.samples, workers=args.workers, min_recall=args.min_recall,
+                  min_precision=args.min_precision, repeat=args.repeat)
+    for result in report["pareto"]:
+        print(json.dumps(result))
+    print(json.dumps({"candidates": report["candidates"], "best": report["best"]}), file=sys.stderr)
+    if args.output and report["best"]:
+        with open(args.output, "w") as file:
+            json.dump(report["best"]["config"], file, indent=2)
+    return 0 if report["best"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+"""
+Подбор параметров HoughCircles для новой камеры без перезапуска сервера:
+python -m app.tools.tune_detector --frames labeled/ --param2 30 40 60 --scale 1 0.5 --output camera.json
+- Кадры берутся из каталога с labels.json, из видеофрагмента с
+разметкой JSONL (--clip, --labels) или генерируются (--synthetic).
+- Перебираются все сочетания заданных значений или --samples
+случайных точек сетки, конфигурации оцениваются параллельно в процессах.
+- Серые кадры после уменьшения и медианного фильтра (preprocess_gray)
+вычисляются один раз на масштаб и сохраняются в .npy (отдельный файл
+для каждого разрешения, если кадры набора разного размера); процессы читают
+их через mmap, а стоимость подготовки добавляется к стоимости кадра.
+- Выводится фронт Парето: конфигурации, которые не уступают никакой
+другой одновременно по полноте, точности и стоимости кадра;
+лучшая - самая дешевая конфигурация с recall не ниже --min-recall.
+Файл --output подходит для batch_analyze --config.
+"""
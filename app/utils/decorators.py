@@ -6,13 +6,13 @@ class DetectorDecorator(Subject, ABC):
         super().__init__()
         self._detector = detector
 
-    def attach(self, observer):
-        self._detector.attach(observer)
+    def attach(self, observer, dispatch=None):
+        self._detector.attach(observer, dispatch)
 
     def detach(self, observer):
         self._detector.detach(observer)
 
-    def notify(self, message: str):
+    def notify(self, message):
         self._detector.notify(message)
 
     @abstractmethod
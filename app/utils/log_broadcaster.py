@@ -0,0 +1,126 @@
+from collections import deque
+import asyncio
+import itertools
+import threading
+import time
+
+# Запись лога с порядковым номером; id события SSE - "<эпоха процесса>-<номер>"
+class LogEvent:
+    def __init__(self, epoch: str, sequence: int, level: str, level_no: int, text: str):
+        self.epoch = epoch
+        self.sequence = sequence
+        self.level = level
+        self.level_no = level_no
+        self.text = text
+
+    @property
+    def event_id(self) -> str:
+        return f"{self.epoch}-{self.sequence}"
+
+    def to_sse(self) -> str:
+        # Многострочные сообщения передаются несколькими строками data:
+        data = "".join(f"data: {line}\n" for line in self.text.splitlines() or [""])
+        return f"id: {self.event_id}\n{data}\n"
+
+# Подписчик: своя ограниченная очередь, при переполнении теряются старые записи
+class LogSubscriber:
+    def __init__(self, broadcaster, loop, min_level: int = 0, keyword: str = None,
+                 queue_size: int = 1000):
+        self.broadcaster = broadcaster
+        self.loop = loop
+        self.min_level = min_level
+        self.keyword = keyword
+        self.buffer = deque(maxlen=queue_size)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def matches(self, event: LogEvent) -> bool:
+        return event.level_no >= self.min_level and (
+            not self.keyword or self.keyword.lower() in event.text.lower()
+        )
+
+    def push(self, event: LogEvent):
+        # Вызывается под блокировкой вещателя из любого потока
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(event)
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass  # Цикл событий клиента уже закрыт
+
+    async def events(self):
+        while True:
+            while self.buffer:
+                yield self.buffer.popleft()
+            self._ready.clear()
+            if not self.buffer:
+                await self._ready.wait()
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+# Вещатель логов: история в кольцевом буфере и рассылка всем подписчикам
+class LogBroadcaster:
+    def __init__(self, history_size: int = 500, queue_size: int = 1000, epoch: str = None):
+        self.history = deque(maxlen=history_size)
+        self.queue_size = queue_size
+        self.subscribers = set()
+        # Номера начинаются с 1 в каждом процессе; эпоха (время запуска) отличает
+        # id событий до перезапуска сервера от новых
+        self.epoch = epoch or str(int(time.time() * 1000))
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def sink(self, message):
+        # Sink для loguru: не блокирует и не пишет в лог сам (без рекурсии)
+        record = message.record
+        self.publish(
+            record["level"].name, record["level"].no,
+            f"[{record['time']}] {record['message']}"
+        )
+
+    def publish(self, level: str, level_no: int, text: str):
+        with self._lock:
+            event = LogEvent(self.epoch, next(self._ids), level, level_no, text)
+            self.history.append(event)
+            for subscriber in self.subscribers:
+                if subscriber.matches(event):
+                    subscriber.push(event)
+
+    def last_sequence(self, last_event_id: str = None):
+        """Номер записи из Last-Event-ID этого процесса; None - id неизвестен или другой эпохи"""
+        epoch, _, sequence = (last_event_id or "").rpartition("-")
+        return int(sequence) if epoch == self.epoch and sequence.isdigit() else None
+
+    def subscribe(self, min_level: int = 0, keyword: str = None,
+                  last_event_id: str = None) -> LogSubscriber:
+        """Подписка с повтором истории после last_event_id (вся история, если id не этого процесса)"""
+        after = self.last_sequence(last_event_id)
+        subscriber = LogSubscriber(
+            self, asyncio.get_running_loop(), min_level, keyword, self.queue_size
+        )
+        with self._lock:
+            for event in self.history:
+                if (after is None or event.sequence > after) and subscriber.matches(event):
+                    subscriber.buffer.append(event)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: LogSubscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+"""
+LogBroadcaster заменяет общую очередь логов для /log_stream.
+- Каждая запись получает порядковый номер и попадает в кольцевой буфер
+истории; новый подписчик получает историю, а при переподключении
+(заголовок Last-Event-ID) - только пропущенные записи.
+- id события содержит эпоху процесса ("<время запуска>-<номер>"):
+после перезапуска сервера браузер с id прошлого процесса получает
+всю историю, а не пустой повтор.
+- У каждого подписчика своя ограниченная очередь: медленный клиент
+теряет старые записи (счетчик dropped), но не блокирует loguru и
+не отнимает сообщения у других клиентов.
+- Фильтрация по уровню и ключевому слову выполняется на сервере.
+"""
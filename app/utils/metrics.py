@@ -0,0 +1,197 @@
+from bisect import bisect_left
+from urllib.parse import urlsplit, urlunsplit
+import threading
+
+# Границы корзин гистограмм задержек, сек
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def stream_label(key):
+    """Метка потока для ключа источника (stream_type, url) без логина и пароля из url"""
+    if not isinstance(key, tuple):
+        return str(key)
+    stream_type, url = key
+    if not url:
+        return stream_type
+    parts = urlsplit(url)
+    if parts.username or parts.password:
+        netloc = parts.hostname + (f":{parts.port}" if parts.port else "")
+        url = urlunsplit(parts._replace(netloc=netloc))
+    return f"{stream_type}:{url}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Гистограмма одной серии (набора меток)
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float):
+        # Оценка по корзинам с линейной интерполяцией, как histogram_quantile
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+# Метрика с сериями по меткам
+class MetricFamily:
+    def __init__(self, registry, name: str, help: str, kind: str, label_names=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.series = {}  # кортеж значений меток -> значение или Histogram
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.registry.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.registry.lock:
+            histogram = self.series.get(key)
+            if histogram is None:
+                histogram = self.series[key] = Histogram()
+            histogram.observe(value)
+
+    def samples(self):
+        with self.registry.lock:
+            return [(dict(zip(self.label_names, key)), value) for key, value in self.series.items()]
+
+# Показатель, значение которого читается при запросе метрик
+class GaugeFamily(MetricFamily):
+    def __init__(self, registry, name, help, collect, label_names=()):
+        super().__init__(registry, name, help, "gauge", label_names)
+        self.collect = collect  # () -> [(labels, value), ...]
+
+    def samples(self):
+        return [(labels, value) for labels, value in self.collect()]
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        # При enabled=False inc/observe возвращаются сразу, без блокировки
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.families = {}
+
+    def _register(self, family):
+        self.families[family.name] = family
+        return family
+
+    def counter(self, name, help, label_names=()):
+        return self._register(MetricFamily(self, name, help, "counter", label_names))
+
+    def histogram(self, name, help, label_names=()):
+        return self._register(MetricFamily(self, name, help, "histogram", label_names))
+
+    def gauge(self, name, help, collect, label_names=()):
+        return self._register(GaugeFamily(self, name, help, collect, label_names))
+
+    def reset(self):
+        with self.lock:
+            for family in self.families.values():
+                family.series.clear()
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат Prometheus (version 0.0.4)"""
+        lines = []
+        for family in self.families.values():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for labels, value in family.samples():
+                label_items = list(labels.items())
+                if family.kind != "histogram":
+                    lines.append(f"{family.name}{_format_labels(label_items)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.buckets, value.counts):
+                    cumulative += count
+                    lines.append(f"{family.name}_bucket{_format_labels(label_items, ('le', bound))} {cumulative}")
+                lines.append(f"{family.name}_bucket{_format_labels(label_items, ('le', '+Inf'))} {value.count}")
+                lines.append(f"{family.name}_sum{_format_labels(label_items)} {_format_value(value.sum)}")
+                lines.append(f"{family.name}_count{_format_labels(label_items)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Снимок метрик для JSON: у гистограмм число замеров, среднее и оценки p50/p99 в мс"""
+        result = {}
+        for family in self.families.values():
+            series = []
+            for labels, value in family.samples():
+                if family.kind == "histogram":
+                    p50, p99 = value.quantile(0.5), value.quantile(0.99)
+                    value = {
+                        "count": value.count,
+                        "mean_ms": round(value.sum / value.count * 1000, 3) if value.count else None,
+                        "p50_ms": None if p50 is None else round(p50 * 1000, 3),
+                        "p99_ms": None if p99 is None else round(p99 * 1000, 3),
+                    }
+                series.append({"labels": labels, "value": value})
+            result[family.name] = {"type": family.kind, "help": family.help, "series": series}
+        return result
+
+# Общий реестр приложения и метрики конвейера
+metrics = MetricsRegistry()
+GRAB_SECONDS = metrics.histogram(
+    "capture_grab_seconds", "Время ожидания кадра от VideoStream", ("stream",))
+DETECT_SECONDS = metrics.histogram(
+    "detection_seconds", "Время обработки кадра детектором", ("stream",))
+ENCODE_SECONDS = metrics.histogram(
+    "encode_seconds", "Время кодирования JPEG-варианта кадра", ("stream",))
+SEND_SECONDS = metrics.histogram(
+    "send_seconds", "Время отправки кадра зрителю", ("stream",))
+FRAMES_PROCESSED = metrics.counter(
+    "frames_processed_total", "Кадров обработано детектором", ("stream",))
+FRAMES_DROPPED = metrics.counter(
+    "frames_dropped_total", "Кадров потеряно (reason: subscriber - медленный зритель)", ("stream", "reason"))
+DETECTIONS = metrics.counter(
+    "detections_total", "Уведомлений об обнаружении кругов", ("stream",))
+SAVES = metrics.counter(
+    "saves_total", "Сохраненных обнаружений (кадр и изображение в БД)", ("stream",))
+
+"""
+Встроенные метрики конвейера без внешних зависимостей.
+- Гистограммы задержек по потокам: ожидание кадра (grab), детекция,
+кодирование JPEG и отправка зрителю; счетчики обработанных и потерянных
+кадров, обнаружений и сохранений.
+- Показатели (gauge), например глубина очереди записи и число зрителей,
+вычисляются функциями collect в момент запроса.
+- render_prometheus() отдает текстовый формат Prometheus, snapshot() -
+JSON со средним и оценками p50/p99.
+- metrics.enabled = False отключает сбор: inc/observe возвращаются
+до блокировки и поиска серии.
+"""
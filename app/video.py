@@ -1,17 +1,125 @@
+from collections import deque
+from loguru import logger
+import asyncio
+import threading
 import cv2
 
 class VideoStream:
-    def __init__(self, source=0):
+    def __init__(self, source=0, threaded=False, buffer_size=1, read_timeout=10.0):
         self.source = source
         self.stream = cv2.VideoCapture(self.source)
         if not self.stream.isOpened():
             raise ValueError(f"Cannot open video source {self.source}")
 
+        # Фоновый захват: храним только последние buffer_size кадров
+        self.threaded = threaded
+        self.read_timeout = read_timeout
+        self.frames = deque(maxlen=buffer_size)
+        self.frames_grabbed = 0
+        self.dropped_frames = 0  # Кадры, вытесненные до того, как их забрали
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._released = False
+        self._waiters = []  # (loop, asyncio.Event) ожидающих get_frame_async
+        self._thread = None
+        if self.threaded:
+            self.start()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._grab_loop, daemon=True)
+            self._thread.start()
+
+    def _grab_loop(self):
+        try:
+            while not self._stopped:
+                ret, frame = self.stream.read()
+                with self._condition:
+                    if not ret:
+                        # Конец потока или обрыв соединения
+                        self._stopped = True
+                        self._notify()
+                        break
+                    if len(self.frames) == self.frames.maxlen:
+                        self.dropped_frames += 1
+                    self.frames.append(frame)
+                    self.frames_grabbed += 1
+                    self._notify()
+        finally:
+            # Захват освобождает поток чтения: release не вызывается во время read
+            self._release_capture()
+
+    def _notify(self):
+        # Вызывается под self._condition
+        self._condition.notify_all()
+        for loop, event in self._waiters:
+            loop.call_soon_threadsafe(event.set)
+        self._waiters = []
+
+    def _release_capture(self):
+        with self._condition:
+            if self._released:
+                return
+            self._released = True
+        self.stream.release()
+
     def get_frame(self):
-        ret, frame = self.stream.read()
-        if not ret:
-            return None
-        return frame
+        if not self.threaded:
+            ret, frame = self.stream.read()
+            if not ret:
+                return None
+            return frame
+
+        # Ждем новый кадр от фонового потока (выполняется вне event loop)
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.frames or self._stopped, timeout=self.read_timeout
+            )
+            if not self.frames:
+                return None
+            return self.frames.popleft()
+
+    async def get_frame_async(self):
+        """get_frame для event loop: в режиме фонового захвата ожидание
+        кадра не занимает поток пула"""
+        if not self.threaded:
+            return await asyncio.to_thread(self.get_frame)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.read_timeout
+        while True:
+            with self._condition:
+                if self.frames:
+                    return self.frames.popleft()
+                if self._stopped:
+                    return None
+                event = asyncio.Event()
+                waiter = (loop, event)
+                self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(event.wait(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                with self._condition:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    if not self.frames:
+                        return None
+
+    def stats(self):
+        return {
+            "frames_grabbed": self.frames_grabbed,
+            "dropped_frames": self.dropped_frames,
+        }
 
     def release(self):
-        self.stream.release()
\ No newline at end of file
+        with self._condition:
+            self._stopped = True
+            self._notify()
+        if self._thread is None:
+            self._release_capture()
+            return
+        self._thread.join(timeout=self.read_timeout)
+        if self._thread.is_alive():
+            # Чтение кадра зависло: захват освободит сам поток, когда read вернется
+            logger.warning(f"Video source {self.source} is still reading, capture will be released by the grab thread")
+        else:
+            logger.info(f"Video source {self.source} released, stats: {self.stats()}")
@@ -0,0 +1,34 @@
+import shutil
+import tempfile
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import app.main
+from app.container import StartupConfig
+from app.models import Base, configure_sqlite, migrate_images_table
+from app.repository.frame_archive import FrameArchiveConfig
+from app.repository.persistence_queue import PersistenceConfig
+
+# Приложение в тестах работает с временной БД и каталогами, а не с images.db
+# рабочего каталога. Настройка выполняется при импорте conftest, до того как
+# тестовые модули обратятся к app.main.global_repository
+TEST_ROOT = tempfile.mkdtemp(prefix="circle-detection-tests-")
+test_engine = create_engine(f"sqlite:///{TEST_ROOT}/images.db", connect_args={"check_same_thread": False})
+configure_sqlite(test_engine)
+Base.metadata.create_all(test_engine)
+migrate_images_table(test_engine)
+
+container = app.main.container
+container.session_factory = sessionmaker(bind=test_engine, autocommit=False, autoflush=False)
+container.frame_archive_config = FrameArchiveConfig(root=f"{TEST_ROOT}/frame_archive")
+container.persistence_config = PersistenceConfig(spill_dir=f"{TEST_ROOT}/persistence_spill")
+container.startup_config = StartupConfig(log_file=f"{TEST_ROOT}/movement_repository.log",
+                                         error_log_file=f"{TEST_ROOT}/app_errors.log")
+
+@pytest.fixture(scope="session", autouse=True)
+def application_container():
+    yield container
+    # Остановка до закрытия потоков вывода pytest
+    container.close()
+    test_engine.dispose()
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
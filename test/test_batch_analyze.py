@@ -0,0 +1,88 @@
+import io
+import json
+from datetime import datetime
+import cv2
+import pytest
+from app.detectors.circle_detector import CircleDetectorConfig
+from app.repository.movement_repository import InMemoryMovementRepository
+from unittest.mock import patch
+from app.tools.batch_analyze import analyze_videos, iter_detections, split_video
+from app.tools.synthetic import make_frame
+
+FPS = 10
+# Круг виден на кадрах 10-19 из 40
+CIRCLE_FRAMES = range(10, 20)
+
+@pytest.fixture(scope="module")
+def video_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("videos") / "recording.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (640, 480))
+    for index in range(40):
+        circles = [(320, 240, 120)] if index in CIRCLE_FRAMES else []
+        writer.write(make_frame(640, 480, circles, seed=1))
+    writer.release()
+    return path
+
+CONFIG = CircleDetectorConfig(param2=40)
+
+def test_batch_analysis_in_process(video_path):
+    chunks = split_video(video_path, chunk_seconds=1.5)
+    # Последний фрагмент читается до конца файла
+    assert [(chunk.start, chunk.end) for chunk in chunks] == [(0, 15), (15, 30), (30, None)]
+
+    stats = {}
+    detections = list(iter_detections([video_path], CONFIG, workers=0, chunk_seconds=1.5, stats=stats))
+    assert [d["frame"] for d in detections] == list(CIRCLE_FRAMES)
+    assert detections[0]["time"] == 1.0
+    assert stats["frames_read"] == 40
+
+    sampled = list(iter_detections([video_path], CONFIG, workers=0, chunk_seconds=1.5, sample_every=4))
+    assert [d["frame"] for d in sampled] == [12, 16]
+
+@pytest.mark.parametrize("frame_count", [0, 25])
+def test_batch_analysis_without_reliable_frame_count(video_path, frame_count):
+    # Контейнер без числа кадров (0) или с заниженной оценкой
+    with patch("app.tools.batch_analyze.probe_video", return_value=(frame_count, FPS)):
+        chunks = split_video(video_path, chunk_seconds=1.5)
+        stats = {}
+        detections = list(iter_detections([video_path], CONFIG, workers=0, chunk_seconds=1.5, stats=stats))
+    assert len(chunks) == (1 if frame_count == 0 else 2)
+    assert [d["frame"] for d in detections] == list(CIRCLE_FRAMES)
+    assert stats["frames_read"] == 40
+    assert stats["video_seconds"] == 40 / FPS
+
+def test_batch_analysis_in_worker_processes(video_path):
+    output = io.StringIO()
+    repository = InMemoryMovementRepository()
+    repository.save_image_to_db = lambda movement: None  # Только движения, без записи в images.db
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    summary = analyze_videos([video_path], CONFIG, workers=2, chunk_seconds=1.5,
+                             output=output, repository=repository, start_times={video_path: start})
+    assert summary["chunks"] == 3
+    assert summary["detections"] == len(CIRCLE_FRAMES)
+
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [line["frame"] for line in lines] == list(CIRCLE_FRAMES)
+    assert lines[0]["timestamp"] == "2024-01-01T12:00:01"
+    movements = repository.get_movements()
+    assert len(movements) == len(CIRCLE_FRAMES)
+    assert repository.get_frame(movements[0].movement_id) is not None
+
+"""
+Описание тестов:
+
+1. test_batch_analysis_in_process:
+- Видеофайл делится на фрагменты по времени; обнаружения совпадают
+  с кадрами, на которых есть круг, независимо от границ фрагментов.
+  С sample_every анализируется каждый N-й кадр от начала файла.
+
+1.1. test_batch_analysis_without_reliable_frame_count:
+- Если контейнер не сообщает число кадров, файл читается одним
+  фрагментом подряд; при заниженной оценке последний фрагмент
+  дочитывается до конца файла. Ни один кадр не пропускается.
+
+2. test_batch_analysis_in_worker_processes:
+- Фрагменты обрабатываются в процессах; обнаружения пишутся в JSONL
+  в порядке кадров с временем от начала записи и сохраняются
+  в репозиторий вместе с обрезанным кадром.
+"""
@@ -0,0 +1,43 @@
+import json
+from app.detectors.circle_detector import CircleDetectorConfig
+from app.tools.bench_pipeline import STAGES, benchmark_pipeline, compare_results, main
+
+def test_benchmark_reports_every_stage(tmp_path):
+    result = benchmark_pipeline("480p", frames=3, repeat=1,
+                                config=CircleDetectorConfig(param2=40), workdir=tmp_path)
+    assert list(result["stages"]) == STAGES
+    for stats in result["stages"].values():
+        assert stats["count"] == 3
+        assert 0 <= stats["p50_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+    assert result["accuracy"]["recall"] == 1.0
+    assert result["accuracy"]["precision"] == 1.0
+    json.dumps(result)
+    # Временные файлы и БД удалены после замеров
+    assert list(tmp_path.iterdir()) == []
+
+def test_compare_results_detects_regressions(tmp_path):
+    output = tmp_path / "bench.json"
+    assert main(["--resolutions", "480p", "--frames", "2", "--repeat", "1",
+                 "--stages", "flip", "sharpen", "--output", str(output)]) == 0
+    baseline = json.loads(output.read_text())["runs"][0]
+
+    slower = json.loads(json.dumps(baseline))
+    slower["stages"]["flip"]["p50_ms"] = baseline["stages"]["flip"]["p50_ms"] * 2 + 1
+    slower["accuracy"]["recall"] = baseline["accuracy"]["recall"] - 0.5
+    regressions = compare_results(slower, baseline)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("flip")
+    assert compare_results(baseline, baseline) == []
+
+"""
+Описание тестов:
+
+1. test_benchmark_reports_every_stage:
+- Бенчмарк на синтетических кадрах возвращает статистику (p50, p99,
+  максимум) для каждого этапа конвейера и полноту/точность детекции;
+  результат сериализуется в JSON, временные файлы удаляются.
+
+2. test_compare_results_detects_regressions:
+- CLI сохраняет результаты в файл; рост p50 этапа и падение полноты
+  относительно сохраненного запуска определяются как регрессии.
+"""
@@ -0,0 +1,184 @@
+import pytest
+import numpy as np
+from unittest.mock import patch, MagicMock
+from app.factory.video_factory import VideoStreamHandlerFactory
+from app.hub.capture_hub import CaptureHub
+from app.hub.frame_cache import EncodedFrameCache
+from app.hub.flow_control import FlowController, AdaptiveStreamConfig
+from app.hub.mosaic import MosaicHub, MosaicConfig, grid_shape
+import cv2
+import asyncio
+
+class FakeVideo:
+    def __init__(self, frames=3, value=0, shape=(48, 64, 3)):
+        self.frames = frames
+        self.value = value
+        self.shape = shape
+        self.released = False
+
+    def get_frame(self):
+        if self.frames == 0:
+            return None
+        self.frames -= 1
+        return np.full(self.shape, self.value, dtype=np.uint8)
+
+    def release(self):
+        self.released = True
+
+def make_detector(key=None):
+    detector = MagicMock()
+    detector.process_frame.side_effect = lambda frame: frame
+    return detector
+
+@pytest.mark.asyncio
+async def test_hub_shares_one_source_between_subscribers():
+    video = FakeVideo(frames=3)
+    hub = CaptureHub(detector_factory=make_detector)
+    with patch.object(VideoStreamHandlerFactory, 'create_handler') as mock_handler:
+        mock_handler.return_value.get_stream.return_value = video
+        first = await hub.subscribe("Webcam")
+        second = await hub.subscribe("Webcam")
+        assert mock_handler.call_count == 1
+        assert first.source is second.source
+
+        first_frames = [frame async for frame in first.frames()]
+        second_frames = [frame async for frame in second.frames()]
+    assert first_frames and second_frames
+    assert first_frames[-1] == second_frames[-1]
+    await first.source.released.wait()
+    assert video.released
+    assert hub.sources == {}
+
+@pytest.mark.asyncio
+async def test_hub_invalid_stream_type():
+    hub = CaptureHub(detector_factory=make_detector)
+    with pytest.raises(ValueError):
+        await hub.subscribe("InvalidType")
+    assert hub.sources == {}
+
+@pytest.mark.asyncio
+async def test_frame_cache_encodes_each_variant_once():
+    cache = EncodedFrameCache()
+    image = np.zeros((48, 64, 3), dtype=np.uint8)
+    first, second = await asyncio.gather(
+        cache.get(1, image, 80), cache.get(1, image, 80)
+    )
+    assert first is second
+    assert cache.encodes == 1
+
+    small = await cache.get(1, image, 80, max_width=32)
+    assert (small.width, small.height) == (32, 24)
+    assert small.multipart().startswith(b'--frame\r\n')
+    assert cache.encodes == 2
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_latest_frame():
+    video = FakeVideo(frames=5)
+    hub = CaptureHub(detector_factory=make_detector)
+    with patch.object(VideoStreamHandlerFactory, 'create_handler') as mock_handler:
+        mock_handler.return_value.get_stream.return_value = video
+        subscriber = await hub.subscribe("Webcam")
+        # Зритель не забирает кадры, пока источник не закончит поток
+        await asyncio.wait_for(subscriber.source.released.wait(), timeout=2)
+    # Источник обработал все кадры; у зрителя остался только последний
+    assert subscriber.source.sequence == 5
+    assert subscriber.skipped == 4
+    assert [frame.sequence async for frame in subscriber.frames()] == [5]
+
+def test_flow_controller_steps_down_and_recovers():
+    config = AdaptiveStreamConfig(min_quality=60, quality_step=20, cooldown_frames=1, smoothing=1)
+    flow = FlowController(quality=95, fps=None, config=config)
+    source_interval = 0.04  # 25 кадров/с
+
+    # Канал не успевает: сначала качество до минимума, затем частота
+    flow.report_send(0.1, source_interval)
+    assert (flow.quality, flow.fps) == (75, None)
+    flow.report_send(0.1, source_interval)
+    assert flow.quality == 60
+    flow.report_send(0.1, source_interval)
+    assert flow.fps == pytest.approx(8.0)  # 0.8 / 0.1 - сколько канал выдерживает
+
+    # Канал восстановился: частота возвращается к частоте источника, затем качество
+    while flow.fps is not None:
+        flow.report_send(0.001, source_interval)
+    flow.report_send(0.001, source_interval)
+    flow.report_send(0.001, source_interval)
+    assert (flow.quality, flow.fps) == (95, None)
+
+@pytest.mark.asyncio
+async def test_mosaic_composes_sources_once_for_all_viewers():
+    videos = {None: FakeVideo(frames=4, value=200), "rtsp://cam2": FakeVideo(frames=4, value=100, shape=(64, 64, 3))}
+    hub = CaptureHub(detector_factory=make_detector)
+    mosaics = MosaicHub(hub, MosaicConfig(fps=50, tile_width=64, tile_height=48, quality=95, labels=False))
+    with patch.object(VideoStreamHandlerFactory, 'create_handler') as mock_handler:
+        mock_handler.side_effect = lambda stream_type, url=None: MagicMock(
+            get_stream=MagicMock(return_value=videos[url]))
+        first = await mosaics.subscribe([("Webcam", None), ("RTSP", "rtsp://cam2")])
+        second = await mosaics.subscribe([("Webcam", None), ("RTSP", "rtsp://cam2")])
+        mosaic = first.source
+        assert second.source is mosaic
+        assert mock_handler.call_count == 2
+        first_frames = [frame async for frame in first.frames()]
+        second_frames = [frame async for frame in second.frames()]
+
+    # Зрители получают одни и те же закодированные кадры; кодирований не больше тактов
+    assert first_frames and first_frames[-1] is second_frames[-1]
+    assert mosaic.encodes == mosaic.sequence
+    image = cv2.imdecode(np.frombuffer(first_frames[-1].data, np.uint8), cv2.IMREAD_COLOR)
+    assert image.shape == (48, 128, 3)
+    assert abs(int(image[24, 32, 0]) - 200) < 5
+    # Квадратный кадр вписан в ячейку 64x48 с полями по бокам
+    assert abs(int(image[24, 96, 0]) - 100) < 5 and image[24, 66, 0] < 5
+    await mosaic.released.wait()
+    assert mosaics.mosaics == {} and hub.sources == {}
+    assert all(video.released for video in videos.values())
+
+@pytest.mark.asyncio
+async def test_mosaic_rejects_invalid_sources():
+    hub = CaptureHub(detector_factory=make_detector)
+    mosaics = MosaicHub(hub, MosaicConfig(max_sources=4))
+    with pytest.raises(ValueError):
+        await mosaics.subscribe([])
+    with pytest.raises(ValueError):
+        await mosaics.subscribe([("Webcam", None)] * 5)
+    with pytest.raises(ValueError):
+        await mosaics.subscribe([("InvalidType", None)])
+    assert mosaics.mosaics == {} and hub.sources == {}
+    assert grid_shape(9) == (3, 3) and grid_shape(10) == (3, 4) and grid_shape(3, columns=1) == (3, 1)
+
+"""
+Описание тестов:
+
+1. test_hub_shares_one_source_between_subscribers:
+- Два зрителя одного источника получают кадры от одного VideoStream,
+  обработчик потока создается один раз, а после окончания потока
+  источник освобождается и удаляется из хаба.
+
+2. test_hub_invalid_stream_type:
+- Неизвестный тип потока приводит к ValueError, источник не создается.
+
+3. test_frame_cache_encodes_each_variant_once:
+- Одновременные запросы одного варианта кадра кодируются один раз
+  и возвращают общий объект; другая ширина дает отдельный вариант
+  с пропорционально уменьшенной высотой.
+
+4. test_slow_subscriber_gets_latest_frame:
+- Зритель, который не забирает кадры, не задерживает источник: кадры
+  заменяются в почтовом ящике на один кадр и считаются пропущенными,
+  последний кадр доставляется до сигнала окончания.
+
+5. test_flow_controller_steps_down_and_recovers:
+- При медленной отправке FlowController снижает качество до минимума,
+  затем частоту до выдерживаемой каналом; на быстром канале
+  параметры возвращаются к запрошенным.
+
+6. test_mosaic_composes_sources_once_for_all_viewers:
+- Два зрителя одной мозаики получают общие закодированные кадры-сетки;
+  каждый источник открывается один раз, его кадр вписывается в свою
+  ячейку с сохранением пропорций. После окончания источников мозаика
+  и источники освобождаются.
+
+7. test_mosaic_rejects_invalid_sources:
+- Пустой список, слишком много источников и неизвестный тип потока
+  приводят к ValueError; размер сетки выбирается почти квадратным.
+"""
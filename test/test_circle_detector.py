@@ -0,0 +1,111 @@
+import pytest
+import cv2
+import numpy as np
+from unittest.mock import patch
+from pydantic import ValidationError
+from app.detectors.circle_detector import CircleDetector, CircleDetectorConfig
+from app.repository.movement_repository import InMemoryMovementRepository
+from app.tools.synthetic import make_frame, match_circles
+
+def make_detector(**kwargs):
+    config = CircleDetectorConfig(param2=40, **kwargs)
+    return CircleDetector(repository=InMemoryMovementRepository(), config=config)
+
+@pytest.mark.parametrize("scale, refine", [(1.0, False), (0.25, False), (0.25, True)])
+def test_detect_circles_in_original_coordinates(scale, refine):
+    truth = [(320, 240, 120)]
+    frame = make_frame(640, 480, truth)
+    circles = make_detector(detection_scale=scale, refine=refine).detect_circles(frame)
+    assert match_circles(circles, truth, tolerance=0.1) == (1, 0, 0)
+
+def test_detection_scale_validation():
+    with pytest.raises(ValidationError):
+        CircleDetectorConfig(detection_scale=0)
+    with pytest.raises(ValidationError):
+        CircleDetectorConfig(detection_scale=1.5)
+
+def test_detection_param2_applies_to_downscaled_pass():
+    frame = make_frame(640, 480, [(320, 240, 120)])
+    detector = make_detector(detection_scale=0.25, refine=True, detection_param2=25)
+    with patch('cv2.HoughCircles', wraps=cv2.HoughCircles) as hough:
+        detector.detect_circles(frame)
+    # Уменьшенный кадр - detection_param2, уточнение в полном разрешении - param2
+    assert [call.kwargs["param2"] for call in hough.call_args_list] == [25, 40]
+
+def test_motion_filter_skips_static_scene():
+    detector = make_detector(motion_filter=True, motion_scan_interval=1000)
+    background = make_frame(640, 480, [])
+    with patch('cv2.HoughCircles', return_value=None) as hough:
+        detector.process_frame(background.copy())
+        for _ in range(5):
+            detector.process_frame(background.copy())
+        assert hough.call_count == 1
+
+        # Появление объекта: поиск только в области изменений
+        detector.process_frame(make_frame(640, 480, [(320, 240, 120)]))
+        assert hough.call_count == 2
+        searched = hough.call_args[0][0]
+        assert searched.shape[0] < 480 or searched.shape[1] < 640
+
+def test_motion_filter_keeps_tracking_detected_object():
+    detector = make_detector(motion_filter=True, motion_scan_interval=1000)
+    frame = make_frame(640, 480, [(320, 240, 120)])
+    with patch('cv2.HoughCircles', return_value=np.array([[[320, 240, 120]]], dtype=np.float32)) as hough:
+        for _ in range(3):
+            detector.process_frame(frame.copy())
+        assert hough.call_count == 3
+
+def test_tracking_searches_near_last_circle_with_stable_id():
+    detector = make_detector(tracking=True, track_rescan_interval=1000, save_delay=1000)
+    frames = [make_frame(640, 480, [(250 + 4 * i, 240, 110)], seed=i) for i in range(4)]
+    detector.process_frame(frames[0])
+    assert detector.last_object_ids == [1]
+
+    with patch('cv2.HoughCircles', wraps=cv2.HoughCircles) as hough:
+        for frame in frames[1:]:
+            detector.process_frame(frame)
+            assert detector.last_object_ids == [1]
+        # Поиск выполняется только в окрестности трека
+        assert all(call[0][0].shape[1] < 640 for call in hough.call_args_list)
+    assert abs(detector.tracker.tracks[0].x - 262) < 10
+
+def test_tracking_falls_back_to_full_scan_when_lost():
+    detector = make_detector(tracking=True, track_max_misses=0, track_rescan_interval=1000)
+    detector.process_frame(make_frame(640, 480, [(320, 240, 120)]))
+    empty = make_frame(640, 480, [])
+    detector.process_frame(empty)
+    assert detector.tracker.tracks == []
+    with patch('cv2.HoughCircles', return_value=None) as hough:
+        detector.process_frame(empty)
+        assert hough.call_args[0][0].shape == (480, 640)
+
+"""
+Описание тестов:
+
+1. test_detect_circles_in_original_coordinates:
+- На синтетическом кадре с манометром круг находится в полном разрешении,
+  на уменьшенном кадре и с уточнением; координаты и радиус
+  пересчитываются в систему исходного кадра.
+
+2. test_detection_scale_validation:
+- detection_scale должен лежать в интервале (0, 1].
+
+2.1. test_detection_param2_applies_to_downscaled_pass:
+- Порог detection_param2 используется только для поиска на уменьшенном
+  кадре, уточнение в полном разрешении выполняется с param2.
+
+3. test_motion_filter_skips_static_scene:
+- На статичной сцене HoughCircles вызывается только для первого кадра;
+  при появлении объекта поиск выполняется в области изменений.
+
+4. test_motion_filter_keeps_tracking_detected_object:
+- Пока круг найден, поиск выполняется на каждом кадре даже без
+  изменений в сцене, чтобы сработала задержка сохранения.
+
+5. test_tracking_searches_near_last_circle_with_stable_id:
+- В режиме сопровождения движущийся круг сохраняет идентификатор трека,
+  а HoughCircles вызывается только для области вокруг прогноза.
+
+6. test_tracking_falls_back_to_full_scan_when_lost:
+- После потери трека следующий кадр обрабатывается полным поиском.
+"""
@@ -0,0 +1,67 @@
+from datetime import datetime
+import os
+import subprocess
+import sys
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.container import AppContainer, StartupConfig
+from app.detectors.engine import DetectionEngineConfig
+from app.models import Base, MovementRecord, configure_sqlite
+from app.repository.frame_archive import FrameArchiveConfig
+from app.repository.movement_repository import Movement
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_import_is_lazy_and_within_budget(tmp_path):
+    # Импорт в чистом каталоге: ни БД, ни журналов, ни архива кадров
+    code = ("import time; started = time.perf_counter(); import app.main; "
+            "print(time.perf_counter() - started)")
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert os.listdir(tmp_path) == []
+    assert float(result.stdout) < StartupConfig().budget_seconds
+
+def test_lifespan_starts_and_stops_resources(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'images.db'}")
+    configure_sqlite(engine)
+    Base.metadata.create_all(engine)
+    container = AppContainer(
+        startup=StartupConfig(prewarm=True, log_file=str(tmp_path / "app.log"),
+                              error_log_file=str(tmp_path / "errors.log")),
+        engine=DetectionEngineConfig(workers=0),
+        frame_archive=FrameArchiveConfig(root=str(tmp_path / "archive")),
+        session_factory=sessionmaker(bind=engine),
+    )
+    app = FastAPI(lifespan=container.lifespan())
+    assert container.peek("repository") is None
+    with TestClient(app):
+        # Прогрев создал репозиторий; хаб захвата создается только по запросу
+        assert container.peek("repository") is not None
+        assert container.peek("capture_hub") is None
+        assert container.startup_seconds is not None
+        container.repository.add_movement(Movement(timestamp=datetime(2024, 1, 1, 12, 0),
+                                                   description="Circle detected in frame"))
+    # После остановки очередь записи закрыта, журналы отключены
+    assert container.write_behind._closed
+    assert "Application resources stopped" in (tmp_path / "app.log").read_text()
+    db = sessionmaker(bind=engine)()
+    assert db.query(MovementRecord).count() == 1
+    db.close()
+    engine.dispose()
+
+"""
+Описание тестов:
+
+1. test_import_is_lazy_and_within_budget:
+- Импорт app.main в пустом каталоге не создает images.db, журналы
+  и архив кадров и укладывается в StartupConfig.budget_seconds.
+
+2. test_lifespan_starts_and_stops_resources:
+- Ресурсы контейнера создаются при старте только с prewarm, остальные -
+  при первом обращении; при остановке lifespan репозиторий дописывает
+  принятые обнаружения, журналы закрываются.
+"""
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Image, configure_sqlite
+from app.repository.dedup import DeduplicatingRepository, DedupConfig, dhash, ahash, hamming
+from app.repository.movement_repository import InMemoryMovementRepository, Movement
+from app.tools.synthetic import make_frame
+
+def gauge(seed, x=100):
+    return make_frame(220, 220, [(x, 110, 90)], noise=4.0, seed=seed)
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'images.db'}")
+    configure_sqlite(engine)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+def test_hashes_tolerate_noise():
+    first, second = gauge(seed=1), gauge(seed=1)
+    second = np.clip(second.astype(np.int16) + 6, 0, 255).astype(np.uint8)  # Другая освещенность
+    other = make_frame(220, 220, [], seed=5)
+    for hash_function in (dhash, ahash):
+        assert hamming(hash_function(first), hash_function(second)) <= 6
+        assert hamming(hash_function(first), hash_function(other)) > 6
+
+def test_duplicates_bump_existing_image(session_factory, tmp_path):
+    inner = InMemoryMovementRepository(session_factory=session_factory)
+    repository = DeduplicatingRepository(inner, DedupConfig(flush_every=2))
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    movements = [
+        Movement(timestamp=start + timedelta(seconds=2 * i), description="Circle detected in frame",
+                 frame=gauge(seed=1), stream_id="cam-1")
+        for i in range(5)
+    ]
+    # Тот же объект на другой камере сохраняется отдельно
+    movements.append(Movement(timestamp=start + timedelta(seconds=1), description="Circle detected in frame",
+                              frame=gauge(seed=1), stream_id="cam-2"))
+    for movement in movements:
+        repository.add_movement(movement)
+        repository.save_frame(movement, save_dir=str(tmp_path / "frames"))
+        repository.save_image_to_db(movement)
+    repository.flush()
+
+    assert repository.duplicates == 4
+    assert len(inner.get_movements()) == 2
+    assert len(list((tmp_path / "frames").iterdir())) == 4  # Цветной и серый кадр на запись
+    db = session_factory()
+    rows = db.query(Image).order_by(Image.id).all()
+    assert [row.seen_count for row in rows] == [5, 1]
+    assert rows[0].last_seen == start + timedelta(seconds=8)
+    db.close()
+
+def test_window_expires_old_hashes():
+    inner = InMemoryMovementRepository()
+    repository = DeduplicatingRepository(inner, DedupConfig(window=5))
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    for seconds in (0, 3, 20):
+        repository.add_movement(Movement(timestamp=start + timedelta(seconds=seconds),
+                                         description="Circle detected in frame", frame=gauge(seed=1)))
+    # Повтор через 3 с объединен, через 17 с после последнего - новая запись
+    assert repository.duplicates == 1
+    assert len(inner.get_movements()) == 2
+
+"""
+Описание тестов:
+
+1. test_hashes_tolerate_noise:
+- dHash и aHash одного объекта при другом шуме и освещенности
+  отличаются не больше чем на порог, а кадр без объекта - больше.
+
+2. test_duplicates_bump_existing_image:
+- Повторные обрезки одного объекта не создают движений, файлов
+  и строк images: у исходной строки растет seen_count и обновляется
+  last_seen. Индекс хешей раздельный для каждого потока.
+
+3. test_window_expires_old_hashes:
+- Хеш перестает участвовать в сравнении, если повторов не было
+  дольше window секунд.
+"""
@@ -0,0 +1,99 @@
+import time
+import pytest
+import numpy as np
+from app.detectors.circle_detector import CircleDetectorConfig
+from app.detectors.engine import DetectionEngine, DetectionEngineConfig, CollectingRepository, WorkerLostError
+from app.observer.observer import Observer
+from app.tools.synthetic import make_frame
+
+class RecordingObserver(Observer):
+    def __init__(self):
+        self.messages = []
+
+    def update(self, message: str):
+        self.messages.append(message)
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = DetectionEngine(
+        DetectionEngineConfig(workers=2),
+        CircleDetectorConfig(param2=40, save_delay=0)
+    )
+    yield engine
+    engine.shutdown()
+
+def test_engine_detects_in_worker_process(engine):
+    repository = CollectingRepository()
+    detector = engine.create_detector(("Webcam", None), repository)
+    observer = RecordingObserver()
+    detector.attach(observer)
+
+    frame = make_frame(640, 480, [(320, 240, 120)])
+    original = frame.copy()
+    processed = detector.process_frame(frame)
+    # Круги нарисованы на стороне сервера, движение и уведомление переданы из процесса
+    assert not np.array_equal(processed, original)
+    assert [str(message) for message in observer.messages] == ["Circle detected in frame"]
+    assert observer.messages[0].stream_id == ("Webcam", None)
+    assert len(observer.messages[0].circles) == 1
+    assert len(repository.movements) == 1
+    assert repository.movements[0].frame is not None
+    # Кадр передан через общую память, слот освобожден после результата
+    assert detector.pool is not None and detector.pool.matches(frame)
+    deadline = time.time() + 2
+    while detector.pool.in_use() and time.time() < deadline:
+        time.sleep(0.01)
+    assert detector.pool.in_use() == 0
+    detector.close()
+
+def test_engine_pins_streams_to_least_loaded_worker(engine):
+    repository = CollectingRepository()
+    first = engine.create_detector("camera-1", repository)
+    second = engine.create_detector("camera-2", repository)
+    assert first.worker is not second.worker
+    first.close()
+    second.close()
+
+def test_engine_restarts_dead_worker():
+    engine = DetectionEngine(
+        DetectionEngineConfig(workers=1, shared_memory=False, watchdog_interval=2),
+        CircleDetectorConfig(param2=40, save_delay=0)
+    )
+    try:
+        repository = CollectingRepository()
+        detector = engine.create_detector("camera-1", repository)
+        frame = make_frame(640, 480, [(320, 240, 120)])
+        detector.process_frame(frame.copy())
+        worker = detector.worker
+        worker.process.kill()
+        worker.process.join()
+        # Кадр, отправленный умершему процессу, завершается ошибкой, слот освобождается
+        future = engine.submit(worker, "camera-1", frame.copy())
+        assert isinstance(future.exception(timeout=10), WorkerLostError)
+        assert worker.restarts == 1 and worker.process.is_alive()
+        assert not worker.pending
+        # Поток продолжает обрабатываться новым процессом
+        assert detector.process_frame(frame.copy()) is not None
+        assert detector.drawn_circles is not None
+        detector.close()
+    finally:
+        engine.shutdown()
+    assert not worker.process.is_alive()
+
+"""
+Описание тестов:
+
+1. test_engine_detects_in_worker_process:
+- Кадр обрабатывается в процессе-обработчике; сервер рисует найденные
+  круги, уведомляет своих наблюдателей и сохраняет движение
+  в репозиторий. Кадр передается через SharedFramePool, слот
+  освобождается после получения результата.
+
+2. test_engine_pins_streams_to_least_loaded_worker:
+- Потоки закрепляются за наименее загруженными процессами.
+
+3. test_engine_restarts_dead_worker:
+- Если процесс-обработчик завершился, ожидающие кадры получают
+  WorkerLostError, процесс перезапускается и продолжает обрабатывать
+  закрепленный поток; shutdown останавливает процесс.
+"""
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+import os
+import cv2
+import numpy as np
+from app.repository.frame_archive import FrameArchive, FrameArchiveConfig
+from app.repository.movement_repository import InMemoryMovementRepository, Movement
+from app.tools.compact_frames import migrate_saved_frames
+from app.tools.synthetic import make_frame
+
+START = datetime(2024, 1, 1, 23, 59, 50)
+
+def test_archive_rotates_and_reads_after_reopen(tmp_path):
+    config = FrameArchiveConfig(root=str(tmp_path / "archive"), max_segment_bytes=64 * 1024)
+    archive = FrameArchive(config)
+    repository = InMemoryMovementRepository(frame_archive=archive)
+    timestamps = [START + timedelta(seconds=4 * i) for i in range(6)]
+    for index, timestamp in enumerate(timestamps):
+        frame = make_frame(320, 240, [(60 + 30 * index, 120, 40)], seed=index)
+        repository.save_frame(Movement(timestamp=timestamp, description="Circle detected in frame", frame=frame))
+    # Кадры после полуночи - в сегменте следующего дня
+    names = sorted(name for name in os.listdir(config.root) if name.endswith(".seg"))
+    assert names[0].startswith("2024-01-01_") and names[-1].startswith("2024-01-02_")
+    assert len(names) > 2
+    assert archive.stats()["frames"] == 12
+    expected = archive.load(timestamps[4])
+    archive.close()
+
+    # Сегмент с незаписанным кадром: индекс ссылается за конец файла
+    last = os.path.join(config.root, names[-1])
+    with open(last, "r+b") as file:
+        file.truncate(os.path.getsize(last) - 10)
+
+    reopened = FrameArchive(config)
+    assert reopened.timestamps(kind="gray") == timestamps[:5]
+    assert reopened.timestamps() == timestamps
+    frame = reopened.load(timestamps[4])
+    assert frame.shape == (240, 320, 3)
+    assert np.array_equal(frame, expected)
+    assert reopened.load(timestamps[4], "gray").ndim == 2
+    assert reopened.read(START - timedelta(seconds=1)) is None
+    assert reopened.timestamps(START + timedelta(seconds=4), START + timedelta(seconds=12)) == timestamps[1:3]
+    # Новые кадры после перезапуска пишутся в новый сегмент
+    reopened.append(timestamps[-1] + timedelta(seconds=1), b"jpeg")
+    assert reopened.read(timestamps[-1] + timedelta(seconds=1)) == b"jpeg"
+    assert reopened.stats()["segments"] == len(names) + 1
+    reopened.close()
+
+def test_retention_removes_old_segments(tmp_path):
+    root = str(tmp_path / "archive")
+    base = datetime.now().replace(microsecond=0) - timedelta(days=4, hours=-1)
+    archive = FrameArchive(FrameArchiveConfig(root=root))
+    for day in range(4):
+        archive.append(base + timedelta(days=day), b"frame %d" % day)
+    archive.close()
+    assert archive.stats()["segments"] == 4
+
+    # При открытии удаляются сегменты, все кадры которых старше двух дней
+    archive = FrameArchive(FrameArchiveConfig(root=root, retention_days=2))
+    assert archive.stats()["segments"] == 2
+    assert archive.read(base + timedelta(days=1)) is None
+    assert archive.read(base + timedelta(days=2)) == b"frame 2"
+    # Активный сегмент не удаляется, даже если все его кадры устарели
+    archive.append(base - timedelta(days=10), b"old")
+    assert archive.apply_retention() == 0
+    assert archive.read(base - timedelta(days=10)) == b"old"
+    archive.close()
+
+def test_migrate_saved_frames(tmp_path):
+    source = tmp_path / "saved_frames"
+    repository = InMemoryMovementRepository()
+    for index in range(3):
+        frame = make_frame(240, 180, [(120, 90, 40)], seed=index)
+        repository.save_frame(Movement(timestamp=START + timedelta(seconds=index),
+                                       description="Circle detected in frame", frame=frame),
+                              save_dir=str(source))
+    (source / "notes.txt").write_text("not a frame")
+    original = (source / f"frame_{START.isoformat()}.jpg").read_bytes()
+
+    archive = FrameArchive(FrameArchiveConfig(root=str(tmp_path / "archive")))
+    assert migrate_saved_frames(str(source), archive) == (6, 0, 0)
+    # Повторный запуск не дублирует кадры
+    assert migrate_saved_frames(str(source), archive, delete=True) == (0, 6, 0)
+    assert sorted(os.listdir(source)) == ["notes.txt"]
+    assert archive.read(START) == original
+    assert cv2.imdecode(np.frombuffer(archive.read(START, "gray"), np.uint8), cv2.IMREAD_UNCHANGED).ndim == 2
+    assert archive.stats()["frames"] == 6
+    archive.close()
+
+"""
+Описание тестов:
+
+1. test_archive_rotates_and_reads_after_reopen:
+- save_frame с архивом пишет цветной и серый кадр в сегменты: новый
+  сегмент начинается в новый день и при превышении размера.
+- После повторного открытия индекс загружается с диска, кадр с обрезанными
+  данными отбрасывается, остальные читаются по времени (mmap) и в
+  интервале; новые кадры пишутся в новый сегмент.
+
+2. test_retention_removes_old_segments:
+- При открытии архива (и при переходе на новый сегмент) удаляются
+  закрытые сегменты старше retention_days; активный сегмент остается.
+
+3. test_migrate_saved_frames:
+- Файлы saved_frames переносятся в архив без перекодирования, посторонние
+  файлы не трогаются, повторный запуск пропускает перенесенные кадры и с
+  delete удаляет исходные файлы.
+"""
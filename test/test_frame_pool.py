@@ -0,0 +1,58 @@
+import multiprocessing
+import numpy as np
+import pytest
+from app.detectors.frame_pool import SharedFramePool
+
+def _sum_in_child(handle, slots, results):
+    pool = SharedFramePool.attach(handle, slots)
+    view = pool.view(handle)
+    results.put(int(view.sum()))
+    view = None
+    pool.close()
+
+@pytest.fixture
+def pool():
+    pool = SharedFramePool((48, 64, 3), np.uint8, slots=2)
+    yield pool
+    pool.close()
+
+def test_pool_slots_are_reference_counted(pool):
+    first = pool.put(np.full((48, 64, 3), 1, np.uint8))
+    second = pool.put(np.full((48, 64, 3), 2, np.uint8))
+    assert (first.slot, second.slot) == (0, 1)
+    # Все слоты заняты, пока ссылки не освобождены
+    assert pool.put(np.zeros((48, 64, 3), np.uint8)) is None
+    assert pool.view(first)[0, 0, 0] == 1
+
+    pool.release(first)
+    third = pool.put(np.full((48, 64, 3), 3, np.uint8))
+    assert third.slot == 0
+    assert not pool.valid(first)
+    with pytest.raises(ValueError):
+        pool.view(first)
+    assert pool.view(third)[0, 0, 0] == 3
+    assert pool.in_use() == 2
+
+def test_pool_is_readable_from_another_process(pool):
+    frame = np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+    handle = pool.put(frame)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_sum_in_child, args=(handle, pool.slots, results))
+    process.start()
+    assert results.get(timeout=30) == int(frame.sum())
+    process.join(timeout=10)
+    assert process.exitcode == 0
+
+"""
+Описание тестов:
+
+1. test_pool_slots_are_reference_counted:
+- Слот занят, пока на него есть ссылка; при заполнении кольца put()
+  возвращает None. После освобождения слот переиспользуется, а старая
+  ссылка на него считается недействительной.
+
+2. test_pool_is_readable_from_another_process:
+- Другой процесс подключается к сегменту по FrameHandle и читает
+  кадр без передачи массива через очередь.
+"""
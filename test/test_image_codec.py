@@ -0,0 +1,61 @@
+from datetime import datetime
+import numpy as np
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from app.models import Image, migrate_images_table
+from app.repository.image_codec import encode_image, decode_image, RAW_CODEC
+from app.repository.movement_repository import Movement, make_image_row
+from app.tools import backfill_images
+
+def test_image_row_is_compressed_with_metadata():
+    frame = np.zeros((120, 100, 3), dtype=np.uint8)
+    frame[20:60, 30:70] = 200
+    row = make_image_row(Movement(datetime.now(), "Test", frame=frame))
+    assert (row.width, row.height, row.channels, row.codec) == (100, 120, 3, "jpeg")
+    assert len(row.image_data) < frame.nbytes
+    decoded = decode_image(row.image_data, row.codec, row.width, row.height, row.channels)
+    assert decoded.shape == frame.shape
+    assert row.thumbnail is not None
+
+def test_migration_and_backfill_of_raw_rows(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'images.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE images (id INTEGER PRIMARY KEY, timestamp DATETIME NOT NULL, "
+            "description VARCHAR NOT NULL, image_data BLOB NOT NULL)"
+        ))
+        connection.execute(
+            text("INSERT INTO images (timestamp, description, image_data) VALUES (:t, 'old', :d)"),
+            {"t": datetime(2024, 1, 1), "d": np.full((40, 40, 3), 128, dtype=np.uint8).tobytes()}
+        )
+    migrate_images_table(engine)
+    columns = {column["name"] for column in inspect(engine).get_columns("images")}
+    assert {"width", "height", "channels", "codec", "thumbnail"} <= columns
+
+    monkeypatch.setattr(backfill_images, "SessionLocal", sessionmaker(bind=engine))
+    assert backfill_images.backfill_images() == (1, 0)
+    db = sessionmaker(bind=engine)()
+    row = db.query(Image).one()
+    assert (row.width, row.height, row.codec) == (40, 40, "jpeg")
+    assert decode_image(row.image_data, row.codec).shape == (40, 40, 3)
+    db.close()
+
+def test_decode_raw_image():
+    frame = np.arange(24, dtype=np.uint8).reshape(2, 4, 3)
+    assert np.array_equal(decode_image(frame.tobytes(), RAW_CODEC, 4, 2, 3), frame)
+    assert len(encode_image(frame, "png")) > 0
+
+"""
+Описание тестов:
+
+1. test_image_row_is_compressed_with_metadata:
+- Строка таблицы images содержит сжатое изображение, размеры, число
+  каналов, кодек и миниатюру; изображение декодируется обратно.
+
+2. test_migration_and_backfill_of_raw_rows:
+- Миграция добавляет новые колонки в старую таблицу, а backfill
+  перекодирует строки с несжатыми пикселями.
+
+3. test_decode_raw_image:
+- Несжатые пиксели восстанавливаются по сохраненным размерам.
+"""
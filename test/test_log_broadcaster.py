@@ -0,0 +1,77 @@
+import pytest
+from app.utils.log_broadcaster import LogBroadcaster
+
+async def take(subscriber, count):
+    events = []
+    async for event in subscriber.events():
+        events.append(event)
+        if len(events) == count:
+            break
+    return events
+
+@pytest.mark.asyncio
+async def test_every_subscriber_gets_every_message():
+    broadcaster = LogBroadcaster()
+    first = broadcaster.subscribe()
+    second = broadcaster.subscribe()
+    for index in range(3):
+        broadcaster.publish("INFO", 20, f"message {index}")
+    assert [e.text for e in await take(first, 3)] == ["message 0", "message 1", "message 2"]
+    assert [e.text for e in await take(second, 3)] == ["message 0", "message 1", "message 2"]
+
+@pytest.mark.asyncio
+async def test_resume_after_last_event_id_with_filters():
+    broadcaster = LogBroadcaster(history_size=10)
+    broadcaster.publish("INFO", 20, "Circle detected in frame")
+    broadcaster.publish("ERROR", 40, "Error saving frame")
+    broadcaster.publish("INFO", 20, "Circle detected in frame")
+    resumed = broadcaster.subscribe(last_event_id=f"{broadcaster.epoch}-1")
+    assert [e.sequence for e in await take(resumed, 2)] == [2, 3]
+    errors = broadcaster.subscribe(min_level=40)
+    circles = broadcaster.subscribe(keyword="circle")
+    assert [e.sequence for e in await take(errors, 1)] == [2]
+    assert [e.sequence for e in await take(circles, 2)] == [1, 3]
+
+@pytest.mark.asyncio
+async def test_last_event_id_from_previous_process_replays_history():
+    broadcaster = LogBroadcaster(epoch="2000")
+    broadcaster.publish("INFO", 20, "message 0")
+    broadcaster.publish("INFO", 20, "message 1")
+    assert broadcaster.history[-1].event_id == "2000-2"
+    # id прошлого процесса (номер больше текущих), старый числовой id и мусор - вся история
+    for stale in ("1000-50", "50", "abc"):
+        subscriber = broadcaster.subscribe(last_event_id=stale)
+        assert [e.text for e in await take(subscriber, 2)] == ["message 0", "message 1"]
+    broadcaster.publish("INFO", 20, "message 2")
+    assert [e.text for e in await take(subscriber, 1)] == ["message 2"]
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_drops_oldest():
+    broadcaster = LogBroadcaster(queue_size=2)
+    subscriber = broadcaster.subscribe()
+    for index in range(5):
+        broadcaster.publish("INFO", 20, f"message {index}")
+    assert subscriber.dropped == 3
+    assert [e.text for e in await take(subscriber, 2)] == ["message 3", "message 4"]
+    assert subscriber.buffer.maxlen == 2
+    assert f"id: {broadcaster.epoch}-5\ndata: message 4\n\n" == broadcaster.history[-1].to_sse()
+
+"""
+Описание тестов:
+
+1. test_every_subscriber_gets_every_message:
+- Каждый подписчик получает все сообщения, второй клиент не отнимает
+  сообщения у первого.
+
+2. test_resume_after_last_event_id_with_filters:
+- При переподключении повторяются только записи после Last-Event-ID;
+  фильтры по уровню и ключевому слову применяются на сервере.
+
+2.1. test_last_event_id_from_previous_process_replays_history:
+- id событий содержат эпоху процесса; Last-Event-ID прошлого процесса
+  или в неизвестном формате дает повтор всей истории, новые записи
+  после этого доставляются.
+
+3. test_slow_subscriber_drops_oldest:
+- У медленного подписчика теряются старые записи, новые сохраняются.
+"""
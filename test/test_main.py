@@ -8,6 +8,8 @@ from unittest.mock import patch, MagicMock
 from datetime import datetime
 import cv2 
 import numpy as np
+import json
+import re
 
 client = TestClient(app)
 
@@ -50,6 +52,70 @@ def test_get_movements_with_data():
     assert len(response.json()) == 1
     assert response.json()[0]["description"] == "Test Movement"
 
+def add_test_movements(count):
+    for minute in range(count):
+        global_repository.add_movement(Movement(
+            timestamp=datetime.fromisoformat(f"2023-10-01T12:{minute:02d}:00"),
+            description=f"Test Movement {minute}"
+        ))
+
+def test_get_movements_ndjson_with_time_filter():
+    add_test_movements(5)
+    response = client.get("/movements?format=ndjson&start=2023-10-01T12:01:00&end=2023-10-01T12:04:00")
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["description"] for line in lines] == [
+        "Test Movement 1", "Test Movement 2", "Test Movement 3"
+    ]
+
+def test_get_movements_pages_by_cursor():
+    for index in range(5):
+        global_repository.add_movement(Movement(
+            timestamp=datetime.fromisoformat("2023-10-01T12:00:00"),
+            description=f"Same Time {index}"
+        ))
+    # Страницы по 2 записи: записи с одинаковым временем не теряются и не повторяются
+    with patch("app.main.MOVEMENTS_PAGE_SIZE", 2):
+        response = client.get("/movements?format=ndjson")
+        limited = client.get("/movements?limit=3")
+    descriptions = [json.loads(line)["description"] for line in response.text.splitlines()]
+    assert descriptions == [f"Same Time {index}" for index in range(5)]
+    assert [item["description"] for item in limited.json()] == descriptions[:3]
+
+def test_notifications_page_pagination():
+    add_test_movements(3)
+    response = client.get("/notifications_page?limit=2")
+    assert response.status_code == 200
+    assert "Test Movement 2" in response.text and "Test Movement 0" not in response.text
+    next_page = re.search(r'href="(/notifications_page\?[^"]+)"', response.text).group(1)
+    response = client.get(next_page.replace("&amp;", "&"))
+    assert "Test Movement 0" in response.text and "Test Movement 2" not in response.text
+
+def test_notifications_page_same_timestamp():
+    for index in range(3):
+        global_repository.add_movement(Movement(
+            timestamp=datetime.fromisoformat("2023-10-01T12:00:00"),
+            description=f"Same Time {index}"
+        ))
+    seen = []
+    page = "/notifications_page?limit=2"
+    while page:
+        response = client.get(page)
+        seen += re.findall(r"Same Time \d", response.text)
+        match = re.search(r'href="(/notifications_page\?[^"]+)"', response.text)
+        page = match.group(1).replace("&amp;", "&") if match else None
+    assert sorted(seen) == ["Same Time 0", "Same Time 1", "Same Time 2"]
+
+def test_metrics_endpoint():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE capture_grab_seconds histogram" in response.text
+    assert "persistence_queue_depth " in response.text
+
+    snapshot = client.get("/metrics", params={"format": "json"}).json()
+    assert snapshot["frames_processed_total"]["type"] == "counter"
+    assert snapshot["persistence_queue_depth"]["series"][0]["value"] >= 0
 
 @pytest.fixture
 def circle_detector():
@@ -148,6 +214,27 @@ def test_circle_detector_no_circles_detected(circle_detector):
 длина списка движений равна 1, и описание первого движения совпадает 
 с ожидаемым значением "Test Movement".
 
+5.1. test_get_movements_ndjson_with_time_filter:
+- Проверяет потоковую выдачу /movements в формате NDJSON с фильтром 
+по интервалу времени start/end.
+
+5.1.1. test_get_movements_pages_by_cursor:
+- /movements читает историю страницами по курсору (время, id) последней
+  записи: при размере страницы меньше числа записей с одинаковым
+  временем все записи выдаются по одному разу, limit соблюдается.
+
+5.2. test_notifications_page_pagination:
+- Проверяет, что /notifications_page выводит страницу из limit последних 
+уведомлений и ссылку на следующую страницу по курсору.
+
+5.3. test_notifications_page_same_timestamp:
+- Записи с одинаковым временем на границе страницы не пропускаются и 
+не повторяются: курсор содержит время и id последней записи.
+
+5.4. test_metrics_endpoint:
+- Проверяет, что /metrics отдает метрики в текстовом формате Prometheus, 
+а с format=json - JSON-снимок с глубиной очереди записи.
+
 6. circle_detector (фикстура):
 - Эта фикстура создает экземпляр CircleDetector с использованием 
 InMemoryMovementRepository как репозиторий для движения.
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+import numpy as np
+from app.repository.movement_repository import Movement, InMemoryMovementRepository
+
+def make_movement(timestamp, frame_size=0):
+    frame = np.zeros((frame_size, frame_size, 3), dtype=np.uint8) if frame_size else None
+    return Movement(timestamp=timestamp, description="Circle detected in frame", frame=frame)
+
+def test_in_memory_range_queries_keep_time_order():
+    repository = InMemoryMovementRepository()
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    # Записи приходят не по порядку
+    for minute in [0, 1, 2, 5, 3, 4]:
+        repository.add_movement(make_movement(start + timedelta(minutes=minute)))
+    timestamps = [m.timestamp.minute for m in repository.get_movements()]
+    assert timestamps == [0, 1, 2, 3, 4, 5]
+    assert [m.timestamp.minute for m in repository.get_range(start + timedelta(minutes=2),
+                                                             start + timedelta(minutes=4))] == [2, 3]
+    assert [m.timestamp.minute for m in repository.latest(2)] == [5, 4]
+    assert repository.count(start + timedelta(minutes=3)) == 3
+    assert [m.timestamp.minute for m in repository.get_range(limit=2, offset=1, descending=True)] == [4, 3]
+    # Курсор (время, id): записи с тем же временем и меньшим id входят в страницу
+    repository.add_movement(make_movement(start + timedelta(minutes=3)))
+    same = repository.get_range(start + timedelta(minutes=3), start + timedelta(minutes=4))
+    page = repository.get_range(end=same[1].timestamp, end_id=same[1].movement_id, limit=2, descending=True)
+    assert [m.movement_id for m in page] == [same[0].movement_id, repository.get_range(limit=3)[2].movement_id]
+    page = repository.get_range(start=same[0].timestamp, start_id=same[0].movement_id, limit=2)
+    assert [m.movement_id for m in page] == [same[1].movement_id, repository.get_range(limit=6)[5].movement_id]
+
+def test_in_memory_count_and_age_limits():
+    repository = InMemoryMovementRepository(max_count=3)
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    for minute in range(5):
+        repository.add_movement(make_movement(start + timedelta(minutes=minute)))
+    assert [m.timestamp.minute for m in repository.get_movements()] == [2, 3, 4]
+
+    aged = InMemoryMovementRepository(max_age=60)
+    aged.add_movement(make_movement(datetime.now() - timedelta(hours=1)))
+    aged.add_movement(make_movement(datetime.now()))
+    assert aged.count() == 1
+
+def test_in_memory_frames_evicted_before_metadata():
+    frame_bytes = 10 * 10 * 3
+    repository = InMemoryMovementRepository(max_frame_bytes=2 * frame_bytes)
+    movements = [make_movement(datetime(2024, 1, 1, 12, minute), frame_size=10) for minute in range(3)]
+    for movement in movements:
+        repository.add_movement(movement)
+    assert repository.count() == 3
+    assert repository.get_frame(movements[0].movement_id) is None
+    assert repository.get_frame(movements[2].movement_id) is not None
+    assert repository.stats()["frame_bytes"] == 2 * frame_bytes
+    # Кадр остается у вызывающего для сохранения на диск и в БД
+    assert movements[0].frame is not None
+
+"""
+Описание тестов:
+
+1. test_in_memory_range_queries_keep_time_order:
+- Индекс упорядочен по времени даже при добавлении не по порядку;
+  get_range, latest, count и offset работают по интервалам времени,
+  курсоры (end, end_id) и (start, start_id) не пропускают записи с
+  одинаковым временем.
+
+2. test_in_memory_count_and_age_limits:
+- Старые записи вытесняются при превышении числа записей и возраста.
+
+3. test_in_memory_frames_evicted_before_metadata:
+- При превышении объема кадры вытесняются, а метаданные остаются.
+"""
@@ -0,0 +1,114 @@
+import threading
+import time
+from datetime import datetime
+from app.observer.observer import Subject, Observer, DispatchConfig, DetectionEvent
+
+class SlowObserver(Observer):
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.messages = []
+        self.release = threading.Event()
+
+    def update(self, message):
+        if self.delay:
+            time.sleep(self.delay)
+        self.messages.append(message)
+
+class BlockingObserver(SlowObserver):
+    def update(self, message):
+        self.release.wait()
+        self.messages.append(message)
+
+class FailingObserver(Observer):
+    def update(self, message):
+        raise ValueError("observer failure")
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_async_observer_does_not_block_notify():
+    subject = Subject()
+    slow = SlowObserver(delay=0.2)
+    fast = SlowObserver()
+    subject.attach(slow, DispatchConfig())
+    subject.attach(fast)
+
+    started = time.time()
+    for index in range(3):
+        subject.notify(f"event {index}")
+    assert time.time() - started < 0.1
+    assert fast.messages == ["event 0", "event 1", "event 2"]
+    assert wait_until(lambda: len(slow.messages) == 3)
+    subject.close_observers()
+
+def test_overflow_policies():
+    subject = Subject()
+    oldest = BlockingObserver()
+    newest = BlockingObserver()
+    latest = BlockingObserver()
+    subject.attach(oldest, DispatchConfig(queue_size=2, policy="drop_oldest"))
+    subject.attach(newest, DispatchConfig(queue_size=2, policy="drop_newest"))
+    subject.attach(latest, DispatchConfig(policy="coalesce"))
+
+    subject.notify(0)
+    # Первое событие уже забрано рабочим потоком и ждет в update
+    assert wait_until(lambda: all(not subject._dispatchers[id(o)].queue
+                                  for o in (oldest, newest, latest)))
+    for index in range(1, 6):
+        subject.notify(index)
+    for observer in (oldest, newest, latest):
+        observer.release.set()
+    assert wait_until(lambda: len(oldest.messages) == 3 and len(newest.messages) == 3
+                      and len(latest.messages) == 2)
+    assert oldest.messages == [0, 4, 5]
+    assert newest.messages == [0, 1, 2]
+    assert latest.messages == [0, 5]
+    assert subject._dispatchers[id(latest)].dropped == 4
+    subject.close_observers()
+
+def test_observer_errors_and_timeouts_are_isolated():
+    subject = Subject()
+    failing = FailingObserver()
+    hanging = BlockingObserver()
+    healthy = SlowObserver()
+    subject.attach(failing, DispatchConfig())
+    subject.attach(hanging, DispatchConfig(timeout=0.1))
+    subject.attach(FailingObserver())  # Синхронный наблюдатель тоже изолирован
+    subject.attach(healthy)
+
+    event = DetectionEvent("Circle detected in frame", timestamp=datetime.now(),
+                           circles=[[10, 20, 5]], stream_id="cam", object_ids=[1])
+    subject.notify(event)
+    subject.notify(event)
+    assert healthy.messages == [event, event]
+    assert str(event) == "Circle detected in frame"
+    assert event.to_dict()["circles"] == [(10.0, 20.0, 5.0)]
+
+    hanging_dispatcher = subject._dispatchers[id(hanging)]
+    failing_dispatcher = subject._dispatchers[id(failing)]
+    assert wait_until(lambda: failing_dispatcher.errors == 2)
+    assert wait_until(lambda: hanging_dispatcher.timeouts == 2)
+    hanging.release.set()
+    subject.close_observers()
+
+"""
+Описание тестов:
+
+1. test_async_observer_does_not_block_notify:
+- Медленный наблюдатель с DispatchConfig получает события в своем
+  потоке, notify() возвращается сразу; синхронный наблюдатель
+  получает события как раньше.
+
+2. test_overflow_policies:
+- Пока наблюдатель занят, события копятся в его очереди: drop_oldest
+  сохраняет последние события, drop_newest - первые, coalesce - только
+  самое последнее.
+
+3. test_observer_errors_and_timeouts_are_isolated:
+- Исключения наблюдателей и зависший update() не мешают доставке
+  событий другим наблюдателям; ошибки и превышения таймаута
+  подсчитываются. DetectionEvent содержит круги и идентификатор потока.
+"""
@@ -0,0 +1,219 @@
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from app.repository.movement_repository import Movement
+from app.repository.persistence_queue import WriteBehindRepository, PersistenceConfig
+
+class RecordingRepository:
+    def __init__(self, gate=None, movement_gate=None):
+        self.movements = []
+        self.movement_batches = []
+        self.frames = []
+        self.db_batches = []
+        self.touches = []
+        self.gate = gate  # Позволяет задержать фоновую запись
+        self.frame_gates = {}  # object_id -> Event: задержка записи отдельного кадра
+        self.movement_gate = movement_gate
+        self.movement_errors = 0  # Сколько раз подряд add_movements завершится ошибкой
+
+    def add_movement(self, movement):
+        self.add_movements([movement])
+
+    def add_movements(self, movements):
+        if self.movement_gate is not None:
+            self.movement_gate.wait()
+        if self.movement_errors:
+            self.movement_errors -= 1
+            raise RuntimeError("database is locked")
+        self.movement_batches.append(list(movements))
+        self.movements.extend(movements)
+
+    def get_movements(self):
+        return self.movements
+
+    def save_frame(self, movement, save_dir="saved_frames"):
+        if self.gate is not None:
+            self.gate.wait()
+        if movement.object_id in self.frame_gates:
+            self.frame_gates[movement.object_id].wait()
+        self.frames.append(movement)
+
+    def save_images_to_db(self, movements):
+        self.db_batches.append(list(movements))
+        for movement in movements:
+            movement.image_id = 100 + movement.object_id
+
+    def touch_images(self, touches):
+        self.touches.extend((movement.image_id, count) for movement, _, count in touches)
+
+def make_movement(index=0):
+    return Movement(
+        timestamp=datetime.fromisoformat(f"2023-10-01T12:00:{index:02d}+03:00"),
+        description="Circle detected in frame",
+        frame=np.full((8, 8, 3), index, dtype=np.uint8),
+        object_id=index
+    )
+
+def save(repository, movement):
+    repository.add_movement(movement)
+    repository.save_frame(movement)
+    repository.save_image_to_db(movement)
+
+def test_write_behind_batches_db_inserts():
+    gate = threading.Event()
+    inner = RecordingRepository(gate)
+    repository = WriteBehindRepository(inner, PersistenceConfig(batch_size=32))
+    for index in range(5):
+        save(repository, make_movement(index))
+    # Движение доступно сразу, запись выполняется в фоне
+    assert len(repository.get_movements()) == 5
+    gate.set()
+    repository.close()
+    assert len(inner.frames) == 5
+    assert sum(len(batch) for batch in inner.db_batches) == 5
+    assert len(inner.db_batches) < 5
+
+def test_write_behind_batches_movements_off_the_caller_thread():
+    gate = threading.Event()
+    inner = RecordingRepository(movement_gate=gate)
+    repository = WriteBehindRepository(inner)
+    # Вставка ждет gate в фоновом потоке, add_movement возвращается сразу
+    for index in range(5):
+        repository.add_movement(make_movement(index))
+    assert inner.movements == []
+    gate.set()
+    repository.close()
+    assert [movement.object_id for movement in inner.movements] == [0, 1, 2, 3, 4]
+    assert len(inner.movement_batches) < 5
+
+def test_write_behind_spill_is_written_on_flush(tmp_path):
+    gate = threading.Event()
+    inner = RecordingRepository(gate)
+    config = PersistenceConfig(max_queue=1, overflow="spill", spill_dir=str(tmp_path))
+    repository = WriteBehindRepository(inner, config)
+    for index in range(4):
+        save(repository, make_movement(index))
+    assert repository.spilled > 0
+    gate.set()
+    repository.flush()
+    assert len(inner.frames) == 4
+    assert sorted(m.object_id for batch in inner.db_batches for m in batch) == [0, 1, 2, 3]
+    assert list(tmp_path.iterdir()) == []
+    repository.close()
+
+def test_write_behind_limits_buffered_movements():
+    gate = threading.Event()
+    inner = RecordingRepository(movement_gate=gate)
+    repository = WriteBehindRepository(inner, PersistenceConfig(max_queue=2, overflow="drop"))
+    # Запись в БД остановлена: в памяти остается не больше max_queue движений (и пакет в записи)
+    for index in range(10):
+        repository.add_movement(make_movement(index))
+    assert repository.dropped >= 6
+    gate.set()
+    repository.close()
+    assert len(inner.movements) + repository.dropped == 10
+
+def test_write_behind_retries_failed_movements():
+    inner = RecordingRepository()
+    inner.movement_errors = 1
+    repository = WriteBehindRepository(inner, PersistenceConfig(retry_interval=60))
+    for index in range(3):
+        repository.add_movement(make_movement(index))
+    repository.flush()
+    assert [m.object_id for m in repository.get_movements()] == [0, 1, 2]
+    repository.close()
+    assert len(inner.movement_batches) == 1
+
+def test_write_behind_spills_movements_on_close(tmp_path):
+    inner = RecordingRepository()
+    inner.movement_errors = 100
+    config = PersistenceConfig(overflow="spill", spill_dir=str(tmp_path), retry_interval=60)
+    repository = WriteBehindRepository(inner, config)
+    for index in range(3):
+        repository.add_movement(make_movement(index))
+    repository.close()
+    assert inner.movements == [] and len(list(tmp_path.iterdir())) == 3
+    # После перезапуска движения дописываются из spill_dir
+    restarted = RecordingRepository()
+    repository = WriteBehindRepository(restarted, config)
+    repository.flush()
+    assert sorted(m.object_id for m in restarted.movements) == [0, 1, 2]
+    assert list(tmp_path.iterdir()) == []
+    repository.close()
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_write_behind_spill_keeps_original_movement(tmp_path):
+    inner = RecordingRepository()
+    busy, filler = make_movement(0), make_movement(1)
+    inner.frame_gates = {0: threading.Event(), 1: threading.Event()}
+    config = PersistenceConfig(max_queue=1, overflow="spill", spill_dir=str(tmp_path))
+    repository = WriteBehindRepository(inner, config)
+    repository.save_frame(busy)
+    wait_until(repository.queue.empty)  # Фоновый поток занят кадром busy
+    repository.save_frame(filler)
+    spilled = make_movement(2)
+    repository.save_image_to_db(spilled)
+    assert repository.spilled == 1
+    inner.frame_gates[0].set()
+    wait_until(repository.queue.empty)  # Фоновый поток занят кадром filler
+    # Повтор приходит раньше, чем изображение записано с диска
+    repository.touch_images([(spilled, spilled.timestamp, 3)])
+    inner.frame_gates[1].set()
+    repository.flush()
+    assert spilled.image_id == 102
+    assert inner.db_batches == [[spilled]]
+    assert inner.touches == [(102, 3)]
+    repository.close()
+
+def test_write_behind_drop_policy():
+    gate = threading.Event()
+    inner = RecordingRepository(gate)
+    repository = WriteBehindRepository(inner, PersistenceConfig(max_queue=1, overflow="drop"))
+    for index in range(4):
+        save(repository, make_movement(index))
+    assert repository.dropped > 0
+    gate.set()
+    repository.close()
+
+"""
+Описание тестов:
+
+1. test_write_behind_batches_db_inserts:
+- Движения доступны сразу после add_movement, а кадры и изображения
+  записываются фоновым потоком; изображения в БД пишутся пакетами.
+
+2. test_write_behind_batches_movements_off_the_caller_thread:
+- add_movement не ждет вставки в репозиторий: движения пишутся
+  фоновым потоком пакетами add_movements в порядке добавления.
+
+3. test_write_behind_spill_is_written_on_flush:
+- При переполнении очереди с overflow="spill" задачи сохраняются
+  на диск и записываются при flush(), каталог после этого пуст.
+
+3.1. test_write_behind_limits_buffered_movements:
+- Пока запись в БД остановлена, буфер движений не растет больше
+  max_queue: лишние движения отбрасываются по политике overflow="drop"
+  и учитываются в dropped.
+
+3.2. test_write_behind_retries_failed_movements:
+- Пакет движений, запись которого завершилась ошибкой, не теряется:
+  он возвращается в буфер и записывается при следующей попытке.
+
+3.3. test_write_behind_spills_movements_on_close:
+- Если БД недоступна при остановке, движения с overflow="spill"
+  сохраняются на диск и записываются после перезапуска.
+
+4. test_write_behind_spill_keeps_original_movement:
+- Изображение, сохраненное на диск при переполнении, записывается для
+  исходного объекта движения: image_id доходит до него, а повтор,
+  поставленный в очередь до записи, применяется после нее.
+
+5. test_write_behind_drop_policy:
+- При overflow="drop" лишние задачи отбрасываются и учитываются.
+"""
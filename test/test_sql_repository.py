@@ -0,0 +1,76 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, configure_sqlite
+from app.repository.movement_repository import Movement
+from app.repository.sql_repository import SqlMovementRepository
+
+@pytest.fixture
+def sql_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'movements.db'}")
+    configure_sqlite(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def repository(sql_engine):
+    return SqlMovementRepository(session_factory=sessionmaker(bind=sql_engine))
+
+def fill(repository, count=10):
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    repository.add_movements([
+        Movement(timestamp=start + timedelta(minutes=i), description="Circle detected in frame", object_id=i)
+        for i in range(count)
+    ])
+    return start
+
+def test_sql_repository_time_range_queries(repository):
+    start = fill(repository)
+    assert repository.count() == 10
+    movements = repository.get_range(start + timedelta(minutes=2), start + timedelta(minutes=5))
+    assert [m.object_id for m in movements] == [2, 3, 4]
+    assert repository.count(start + timedelta(minutes=8)) == 2
+    assert [m.object_id for m in repository.latest(3)] == [9, 8, 7]
+    assert [m.object_id for m in repository.get_range(limit=2, offset=4)] == [4, 5]
+
+def test_sql_repository_assigns_movement_ids(repository):
+    movements = [Movement(timestamp=datetime(2024, 1, 1, 12, minute), description="Circle detected in frame")
+                 for minute in range(3)]
+    repository.add_movements(movements)
+    single = Movement(timestamp=datetime(2024, 1, 1, 12, 5), description="Circle detected in frame")
+    repository.add_movement(single)
+    ids = [m.movement_id for m in movements + [single]]
+    assert None not in ids
+    assert [m.movement_id for m in repository.get_movements()] == ids
+
+def test_sql_repository_survives_new_instance(sql_engine, repository):
+    fill(repository, 3)
+    reopened = SqlMovementRepository(session_factory=sessionmaker(bind=sql_engine))
+    assert len(reopened.get_movements()) == 3
+    reopened.clear_movements()
+    assert repository.count() == 0
+
+def test_sqlite_uses_wal(sql_engine):
+    with sql_engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+
+"""
+Описание тестов:
+
+1. test_sql_repository_time_range_queries:
+- Запросы по интервалу времени, подсчет, последние записи и
+  limit/offset выполняются на стороне SQLite.
+
+1.1. test_sql_repository_assigns_movement_ids:
+- Как и InMemoryMovementRepository, add_movements и add_movement
+  записывают идентификаторы вставленных строк в movement_id.
+
+2. test_sql_repository_survives_new_instance:
+- История доступна новому экземпляру репозитория (как после
+  перезапуска сервера).
+
+3. test_sqlite_uses_wal:
+- Соединения SQLite работают в режиме WAL.
+"""
@@ -0,0 +1,78 @@
+import json
+import cv2
+import numpy as np
+from app.detectors.circle_detector import CircleDetector, CircleDetectorConfig
+from app.repository.movement_repository import InMemoryMovementRepository
+from app.tools.synthetic import generate_dataset
+from app.tools.tune_detector import build_candidates, load_frames_dataset, pareto_front, tune
+
+def test_tune_picks_cheapest_config_meeting_recall():
+    dataset = generate_dataset("480p", 6, seed=3)
+    grid = {"param2": [40, 150], "detection_scale": [1.0, 0.5], "min_radius": [70, 20000]}
+    # min_radius=20000 больше max_radius и отбрасывается
+    assert len(build_candidates(grid, CircleDetectorConfig())) == 4
+
+    report = tune(dataset, grid, workers=0, min_recall=1.0)
+    assert report["candidates"] == 4
+    best = report["best"]
+    assert best["recall"] == 1.0
+    assert best["config"]["param2"] == 40
+    assert best["ms_per_frame"] == min(r["ms_per_frame"] for r in report["results"] if r["recall"] >= 1.0)
+    assert report["pareto"][0]["ms_per_frame"] <= report["pareto"][-1]["ms_per_frame"]
+
+    # Результат на кэшированных кадрах совпадает с detect_circles
+    config = CircleDetectorConfig(param2=40, detection_scale=0.5)
+    detector = CircleDetector(repository=InMemoryMovementRepository(), config=config)
+    found = sum(detector.detect_circles(frame) is not None for frame, _ in dataset)
+    assert found == sum(1 for _, truth in dataset if truth)
+
+def test_tune_accepts_mixed_resolutions():
+    # Кадры камер разного разрешения в одном наборе
+    dataset = generate_dataset("480p", 2, seed=3) + generate_dataset("720p", 2, seed=4)
+    report = tune(dataset, {"param2": [40], "detection_scale": [1.0, 0.5]}, workers=0)
+    assert report["candidates"] == 2 and report["frames"] == 4
+    assert all(result["recall"] > 0 for result in report["results"])
+
+def test_pareto_front_keeps_non_dominated_configs():
+    def result(name, recall, precision, ms):
+        return {"config": name, "recall": recall, "precision": precision, "ms_per_frame": ms}
+    results = [
+        result("fast", 0.5, 0.9, 1.0),
+        result("precise", 0.8, 1.0, 5.0),  # Медленнее и полнее fast, точнее accurate
+        result("accurate", 1.0, 0.6, 3.0),
+        result("dominated", 0.8, 0.9, 5.0),  # Хуже precise по точности при той же стоимости
+        result("slow", 0.5, 0.9, 2.0),  # Хуже fast по стоимости
+        result("duplicate", 0.5, 0.9, 1.0),  # Совпадает с fast: не доминируется
+    ]
+    front = [r["config"] for r in pareto_front(results)]
+    assert front == ["fast", "duplicate", "accurate", "precise"]
+
+def test_load_frames_dataset(tmp_path):
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    cv2.imwrite(str(tmp_path / "a.png"), frame)
+    (tmp_path / "labels.json").write_text(json.dumps({"a.png": [[10, 20, 5]]}))
+    dataset = load_frames_dataset(str(tmp_path))
+    assert len(dataset) == 1
+    assert dataset[0][0].shape == (48, 64, 3)
+    assert dataset[0][1] == [(10, 20, 5)]
+
+"""
+Описание тестов:
+
+1. test_tune_picks_cheapest_config_meeting_recall:
+- Перебор сетки параметров на синтетических кадрах: недопустимые
+  сочетания пропускаются, лучшей выбирается самая дешевая конфигурация
+  с требуемой полнотой, фронт Парето упорядочен по стоимости.
+
+1.1. test_tune_accepts_mixed_resolutions:
+- Набор с кадрами разного разрешения подготавливается по группам
+  одного размера и оценивается без ошибок.
+
+2. test_pareto_front_keeps_non_dominated_configs:
+- Во фронт Парето попадают конфигурации, которые не уступают никакой
+  другой одновременно по полноте, точности и стоимости, в том числе
+  более медленные, но более точные; доминируемые отбрасываются.
+
+3. test_load_frames_dataset:
+- Каталог кадров с labels.json загружается как набор (кадр, разметка).
+"""
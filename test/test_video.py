@@ -0,0 +1,85 @@
+import threading
+import time
+import pytest
+import numpy as np
+from unittest.mock import patch, MagicMock
+from app.video import VideoStream
+
+def make_capture(count):
+    capture = MagicMock()
+    capture.isOpened.return_value = True
+    frames = [(True, np.full((4, 4, 3), i, dtype=np.uint8)) for i in range(count)]
+    capture.read.side_effect = frames + [(False, None)] * 100
+    return capture
+
+def test_video_stream_threaded_latest_frame_wins():
+    with patch('cv2.VideoCapture', return_value=make_capture(5)):
+        video = VideoStream(0, threaded=True)
+        # Ждем, пока фоновый поток прочитает все кадры
+        deadline = time.time() + 2
+        while video.frames_grabbed < 5 and time.time() < deadline:
+            time.sleep(0.01)
+        frame = video.get_frame()
+        assert frame[0, 0, 0] == 4
+        assert video.stats() == {"frames_grabbed": 5, "dropped_frames": 4}
+        assert video.get_frame() is None
+        video.release()
+
+def test_video_stream_synchronous_read():
+    with patch('cv2.VideoCapture', return_value=make_capture(1)):
+        video = VideoStream(0)
+        assert video.get_frame() is not None
+        assert video.get_frame() is None
+        video.release()
+
+@pytest.mark.asyncio
+async def test_video_stream_async_get_frame():
+    with patch('cv2.VideoCapture', return_value=make_capture(3)):
+        video = VideoStream(0, threaded=True, read_timeout=1)
+        frames = []
+        while (frame := await video.get_frame_async()) is not None:
+            frames.append(frame)
+        assert frames and frames[-1][0, 0, 0] == 2
+        video.release()
+
+def test_video_stream_release_waits_for_grab_thread():
+    reading = threading.Event()
+    unblock = threading.Event()
+    capture = MagicMock()
+    capture.isOpened.return_value = True
+
+    def slow_read():
+        reading.set()
+        unblock.wait()
+        return True, np.zeros((4, 4, 3), dtype=np.uint8)
+    capture.read.side_effect = slow_read
+    with patch('cv2.VideoCapture', return_value=capture):
+        video = VideoStream(0, threaded=True, read_timeout=0.1)
+        reading.wait(1)
+        # read завис: release не освобождает захват одновременно с чтением
+        video.release()
+        capture.release.assert_not_called()
+        unblock.set()
+        video._thread.join(1)
+        capture.release.assert_called_once()
+
+"""
+Описание тестов:
+
+1. test_video_stream_threaded_latest_frame_wins:
+- В режиме фонового захвата get_frame возвращает самый свежий кадр,
+  а вытесненные кадры учитываются в dropped_frames.
+
+2. test_video_stream_synchronous_read:
+- Без фонового потока get_frame читает кадр напрямую и возвращает None
+  в конце потока.
+
+3. test_video_stream_async_get_frame:
+- get_frame_async в режиме фонового захвата возвращает кадры без
+  потока пула и None после конца потока.
+
+4. test_video_stream_release_waits_for_grab_thread:
+- Если чтение кадра зависло, release не вызывает cv2 release
+  параллельно с read: захват освобождает фоновый поток после
+  возврата из read.
+"""
@@ -0,0 +1,96 @@
+import pytest
+import cv2
+import numpy as np
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app.main import app
+from app.factory.video_factory import VideoStreamHandlerFactory
+from app.hub.capture_hub import ProcessedFrame
+from app.hub.frame_cache import EncodedFrameCache
+from app.hub.ws_transport import FrameSession, WebSocketStreamConfig, unpack_frame
+
+class StaticVideo:
+    def __init__(self, frames=6):
+        self.frames = frames
+        self.released = False
+
+    def get_frame(self):
+        if self.frames == 0:
+            return None
+        self.frames -= 1
+        return np.full((48, 64, 3), 90, dtype=np.uint8)
+
+    def release(self):
+        self.released = True
+
+@pytest.mark.asyncio
+async def test_session_skips_unchanged_frames_and_limits_in_flight():
+    session = FrameSession(WebSocketStreamConfig(window=2), quality=90)
+    cache = EncodedFrameCache()
+    image = np.full((48, 64, 3), 90, dtype=np.uint8)
+    first = await session.message(ProcessedFrame(1, image), cache)
+    header, data = unpack_frame(first)
+    assert (header["seq"], header["frame"], header["circles"]) == (1, 1, [])
+    assert data.startswith(b"\xff\xd8")  # JPEG
+    # То же содержимое не отправляется повторно
+    assert await session.message(ProcessedFrame(2, image.copy()), cache) is None
+    assert session.unchanged == 1
+
+    # Появились круги: кадр отправляется, число пропущенных передается в заголовке
+    circles = np.array([[[32, 24, 10]]], dtype=np.float32)
+    header, _ = unpack_frame(await session.message(ProcessedFrame(3, image, circles=circles), cache))
+    assert (header["seq"], header["unchanged"], header["overlay"]) == (2, 1, True)
+    assert not session.can_send()
+    session.ack(1)
+    assert session.in_flight == 1 and session.can_send()
+
+@pytest.mark.asyncio
+async def test_session_sends_raw_frames_with_scaled_circles():
+    session = FrameSession(quality=90, max_width=32, overlay=False)
+    raw = np.zeros((48, 64, 3), dtype=np.uint8)
+    drawn = raw.copy()
+    drawn[20:28, 28:36] = 255  # Отрисованный круг
+    circles = np.array([[[32, 24, 10]]], dtype=np.float32)
+    header, data = unpack_frame(await session.message(ProcessedFrame(1, drawn, raw, circles), EncodedFrameCache()))
+    assert (header["width"], header["height"], header["overlay"]) == (32, 24, False)
+    assert header["circles"] == [[16.0, 12.0, 5.0]]
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE).max() < 20
+
+def test_websocket_video_feed():
+    client = TestClient(app)
+    video = StaticVideo(frames=6)
+    with patch.object(VideoStreamHandlerFactory, 'create_handler') as mock_handler:
+        mock_handler.return_value.get_stream.return_value = video
+        with client.websocket_connect("/ws/video_feed?stream_type=Webcam&overlay=false") as websocket:
+            header, data = unpack_frame(websocket.receive_bytes())
+            assert header["seq"] == 1 and header["width"] == 64
+            websocket.send_json({"ack": header["seq"]})
+            # Остальные кадры статичной сцены не отправляются, после конца потока сервер закрывает сокет
+            with pytest.raises(WebSocketDisconnect):
+                websocket.receive_bytes()
+    assert video.released
+
+    with client.websocket_connect("/ws/video_feed?stream_type=InvalidType") as websocket:
+        with pytest.raises(WebSocketDisconnect) as error:
+            websocket.receive_bytes()
+    assert error.value.code == 1008
+
+"""
+Описание тестов:
+
+1. test_session_skips_unchanged_frames_and_limits_in_flight:
+- Кадр с тем же содержимым и кругами не отправляется; изменение кругов
+  дает новый кадр с числом пропущенных в заголовке. Без подтверждений
+  отправляется не больше window кадров.
+
+2. test_session_sends_raw_frames_with_scaled_circles:
+- С overlay=false отправляется копия кадра до отрисовки, а круги в
+  заголовке пересчитаны к ширине уменьшенного кадра.
+
+3. test_websocket_video_feed:
+- /ws/video_feed отправляет первый кадр статичной сцены, повторы
+  подавляются, после окончания потока соединение закрывается и
+  источник освобождается. Неизвестный тип потока закрывает
+  соединение с кодом 1008.
+"""